@@ -0,0 +1,110 @@
+"""Воспроизводимый нагрузочный прогон клиента DaData по кассете (без сети).
+
+Запросы подаются в том же порядке и с теми же интервалами, что в кассете
+(поле ``at``), ответы отдаёт ``transport.ReplaySession`` с записанной задержкой.
+Так изменения кэша, склейки одинаковых запросов и параллельности сравниваются
+на одной и той же нагрузке. Без кассеты генерируется синтетическая: популярность
+ИНН по закону Ципфа, как у реальных пользователей.
+
+Запуск из корня репозитория::
+
+    python benchmarks/dadata_replay.py                      # синтетическая нагрузка
+    python benchmarks/dadata_replay.py prod.json --error-rate 0.05
+
+Кассету с боевого трафика пишет сам бот: ``DADATA_HTTP_CASSETTE=prod.json``
+и ``DADATA_HTTP_CASSETTE_MODE=record``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("DADATA_API_KEY", "benchmark")
+# Лимит частоты DaData в прогоне не интересен — меряем кэш и параллельность.
+os.environ.setdefault("DADATA_RATE_LIMIT_RPS", "100000")
+os.environ.setdefault("DADATA_RATE_LIMIT_BURST", "100000")
+
+import dadata_direct  # noqa: E402
+import http_client  # noqa: E402
+from config import DADATA_FIND_URL  # noqa: E402
+from transport import Cassette, ReplaySession  # noqa: E402
+
+
+def _synthetic(ids: int, requests: int, interval: float, latency: float, seed: int) -> Cassette:
+    rng = random.Random(seed)
+    inns = [f"77{index:08d}" for index in range(ids)]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(ids)]
+    interactions = []
+    for index, inn in enumerate(rng.choices(inns, weights, k=requests)):
+        body = {"suggestions": [{"value": f'ООО "Компания {inn}"', "data": {"inn": inn, "ogrn": f"1{inn}00"}}]}
+        interactions.append(
+            {
+                "method": "POST",
+                "url": DADATA_FIND_URL,
+                "json": {"query": inn, "count": 1, "branch_type": "MAIN"},
+                "at": index * interval,
+                "status": 200,
+                "headers": {},
+                "body": json.dumps(body, ensure_ascii=False),
+                "elapsed": latency,
+            }
+        )
+    return Cassette(interactions)
+
+
+async def _run(cassette: Cassette, session: ReplaySession, time_scale: float) -> list[float]:
+    latencies: list[float] = []
+    started = time.perf_counter()
+
+    async def _lookup(interaction: dict) -> None:
+        await asyncio.sleep(max(0.0, interaction.get("at", 0.0) * time_scale - (time.perf_counter() - started)))
+        begin = time.perf_counter()
+        await dadata_direct.fetch_company(interaction["json"]["query"])
+        latencies.append(time.perf_counter() - begin)
+
+    await asyncio.gather(*(_lookup(item) for item in cassette.interactions if item.get("json", {}).get("query")))
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette", nargs="?", help="кассета (без неё — синтетическая нагрузка)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="множитель записанной задержки")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="множитель интервалов между запросами")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    # Повторы и подмешанные ошибки штатно пишутся в лог — в отчёте они не нужны.
+    logging.basicConfig(level=logging.ERROR)
+
+    cassette = Cassette.load(args.cassette) if args.cassette else _synthetic(200, 2000, 0.002, 0.05, args.seed)
+    session = ReplaySession(
+        cassette, latency_scale=args.latency_scale, error_rate=args.error_rate, seed=args.seed
+    )
+    http_client.set_transport(session)
+
+    started = time.perf_counter()
+    latencies = sorted(asyncio.run(_run(cassette, session, args.time_scale)))
+    wall = time.perf_counter() - started
+
+    party = dadata_direct.cache_stats()["party"]
+    print(f"Запросов: {len(latencies)}, за {wall:.2f} с")
+    print(f"  в DaData: {session.calls}, подмешано ошибок: {session.injected_errors}")
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"  задержка p50 {p50 * 1000:.1f} мс, p95 {p95 * 1000:.1f} мс")
+    print(f"  кэш карточек: hit ratio {party['hit_ratio']:.2f}, записей {party['size']}")
+
+
+if __name__ == "__main__":
+    main()
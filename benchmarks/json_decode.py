@@ -0,0 +1,86 @@
+"""Бенчмарк JSON-кодека на ответах DaData реалистичного размера.
+
+Сравнивает стандартный ``json`` с активным вариантом ``json_codec`` на разборе
+ответа из байтов (как в ``dadata_direct._post_dadata``) и на сериализации карточки в кэш.
+
+Запуск из корня репозитория::
+
+    python benchmarks/json_decode.py
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec  # noqa: E402
+
+
+def _party(index: int) -> dict:
+    inn = f"77{index:08d}"
+    return {
+        "value": f'ООО "Компания {index}"',
+        "unrestricted_value": f'ООО "Компания {index}"',
+        "data": {
+            "inn": inn,
+            "kpp": f"77{index % 100:02d}01001",
+            "ogrn": f"10277{index:08d}",
+            "ogrn_date": 1029456000000,
+            "type": "LEGAL",
+            "branch_type": "BRANCH" if index else "MAIN",
+            "branch_count": 300,
+            "name": {
+                "full_with_opf": f'ОБЩЕСТВО С ОГРАНИЧЕННОЙ ОТВЕТСТВЕННОСТЬЮ "КОМПАНИЯ {index}"',
+                "short_with_opf": f'ООО "Компания {index}"',
+            },
+            "state": {"status": "ACTIVE", "code": None, "registration_date": 1029456000000},
+            "address": {
+                "value": f"г Москва, ул Вавилова, д {index}",
+                "unrestricted_value": f"117312, г Москва, Академический р-н, ул Вавилова, д {index}",
+                "data": {"postal_code": "117312", "city": "Москва", "street": "Вавилова", "house": str(index)},
+            },
+            "management": {"name": "Иванов Иван Иванович", "post": "ГЕНЕРАЛЬНЫЙ ДИРЕКТОР"},
+            "founders": [{"name": f"Учредитель {i}", "share": {"type": "PERCENT", "value": 25}} for i in range(4)],
+            "okved": "64.19",
+            "okveds": [{"code": f"64.{i}", "name": f"Вид деятельности {i}", "main": i == 0} for i in range(20)],
+            "finance": {"tax_system": None, "income": 1e9, "revenue": 2e9, "expense": 1.5e9, "year": 2023},
+            "phones": [{"value": "+7 495 500-55-50"}],
+            "emails": [{"value": f"info{index}@example.ru"}],
+            "licenses": [{"series": "ЛО", "number": f"{index}-{i}", "issue_date": 1500000000000} for i in range(3)],
+        },
+    }
+
+
+def _bench(label: str, fn, number: int) -> float:
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<28} {seconds * 1000:8.3f} ms")
+    return seconds
+
+
+def main() -> None:
+    print(f"json_codec.BACKEND = {json_codec.BACKEND}")
+    single = json.dumps({"suggestions": [_party(0)]}, ensure_ascii=False).encode("utf-8")
+    branches = json.dumps({"suggestions": [_party(i) for i in range(300)]}, ensure_ascii=False).encode("utf-8")
+    card = _party(0)
+
+    for title, payload, number in (
+        (f"Карточка findById/party ({len(single) / 1024:.1f} КБ)", single, 2000),
+        (f"300 филиалов ({len(branches) / 1024:.0f} КБ)", branches, 20),
+    ):
+        print(title)
+        base = _bench("json.loads(bytes.decode())", lambda: json.loads(payload.decode("utf-8")), number)
+        fast = _bench("json_codec.loads(bytes)", lambda: json_codec.loads(payload), number)
+        print(f"  ускорение: x{base / fast:.1f}")
+
+    print("Сериализация карточки в кэш")
+    base = _bench("json.dumps", lambda: json.dumps(card, ensure_ascii=False), 2000)
+    fast = _bench("json_codec.dumps", lambda: json_codec.dumps(card), 2000)
+    print(f"  ускорение: x{base / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,22 +3,37 @@
 import asyncio
 import logging
 import sys
+from urllib.parse import urlsplit
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.exceptions import TelegramNetworkError
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BotCommand, BotCommandScopeDefault
 
+import json_codec
+from circuit_breaker import CLOSED as CIRCUIT_CLOSED
 from config import (
     BOT_STARTUP_MAX_RETRIES,
     BOT_STARTUP_RETRY_BASE_DELAY_SECONDS,
     BOT_STARTUP_RETRY_MAX_DELAY_SECONDS,
+    DADATA_CACHE_STATS_LOG_SECONDS,
+    DADATA_FIND_URL,
+    DADATA_HEALTH_LOG_SECONDS,
+    DADATA_KEEPALIVE_PING_SECONDS,
+    DADATA_PREWARM_CONNECTIONS,
+    DADATA_WARMUP_CONCURRENCY,
+    DADATA_WARMUP_FILE,
+    DADATA_WARMUP_LIMIT,
+    DADATA_WARMUP_SAVE_SECONDS,
     LOG_LEVEL,
     TELEGRAM_BOT_TOKEN,
 )
+from dadata_direct import cache_stats, dadata_health
 from handlers import router
-from http_client import close_session
+from http_client import close_session, keep_warm, prewarm
+from warmup import load_hot_ids, persist_hot_ids, save_hot_ids, warm_up
 
 
 def setup_logging() -> None:
@@ -48,9 +63,54 @@ async def setup_commands(bot: Bot) -> None:
     )
 
 
+async def log_cache_stats(interval: float) -> None:
+    """Периодически пишет в лог счётчики кэшей DaData."""
+    logger = logging.getLogger("cache.stats")
+    while True:
+        await asyncio.sleep(interval)
+        for name, stats in cache_stats().items():
+            logger.info("%s: %s", name, stats)
+
+
+async def log_dadata_health(interval: float) -> None:
+    """Периодически пишет в лог состояние клиента DaData (кэши пишет ``log_cache_stats``)."""
+    logger = logging.getLogger("dadata.health")
+    while True:
+        await asyncio.sleep(interval)
+        health = dadata_health()
+        health.pop("caches", None)
+        level = logging.INFO if health["circuit"]["state"] == CIRCUIT_CLOSED else logging.WARNING
+        logger.log(level, "%s", health)
+
+
 async def main() -> None:
     setup_logging()
     logger = logging.getLogger(__name__)
+    # Ссылки на фоновые задачи держим, чтобы их не собрал GC; при выходе asyncio.run их отменит.
+    background: list[asyncio.Task] = []
+    if DADATA_CACHE_STATS_LOG_SECONDS:
+        background.append(asyncio.create_task(log_cache_stats(DADATA_CACHE_STATS_LOG_SECONDS)))
+    if DADATA_HEALTH_LOG_SECONDS:
+        background.append(asyncio.create_task(log_dadata_health(DADATA_HEALTH_LOG_SECONDS)))
+    if DADATA_PREWARM_CONNECTIONS:
+        # Соединения открываются в фоне, polling их не ждёт.
+        origin = "{0.scheme}://{0.netloc}/".format(urlsplit(DADATA_FIND_URL))
+        background.append(asyncio.create_task(prewarm("dadata", origin, DADATA_PREWARM_CONNECTIONS)))
+        if DADATA_KEEPALIVE_PING_SECONDS:
+            background.append(
+                asyncio.create_task(
+                    keep_warm("dadata", origin, DADATA_PREWARM_CONNECTIONS, DADATA_KEEPALIVE_PING_SECONDS)
+                )
+            )
+    if DADATA_WARMUP_FILE:
+        # Прогрев идёт параллельно с polling: первые пользователи не ждут его окончания.
+        hot_ids = load_hot_ids(DADATA_WARMUP_FILE, DADATA_WARMUP_LIMIT)
+        background.append(asyncio.create_task(warm_up(hot_ids, concurrency=DADATA_WARMUP_CONCURRENCY)))
+        background.append(
+            asyncio.create_task(
+                persist_hot_ids(DADATA_WARMUP_FILE, DADATA_WARMUP_LIMIT, DADATA_WARMUP_SAVE_SECONDS)
+            )
+        )
 
     retries_left = BOT_STARTUP_MAX_RETRIES
     attempt = 1
@@ -59,6 +119,7 @@ async def main() -> None:
     while True:
         bot = Bot(
             token=TELEGRAM_BOT_TOKEN,
+            session=AiohttpSession(json_loads=json_codec.loads, json_dumps=json_codec.dumps),
             default=DefaultBotProperties(parse_mode="HTML"),
         )
         dp = Dispatcher(storage=MemoryStorage())
@@ -69,6 +130,8 @@ async def main() -> None:
             await bot.delete_webhook(drop_pending_updates=False)
             await setup_commands(bot)
             await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+            for task in background:
+                task.cancel()
             return
         except TelegramNetworkError as exc:
             if retries_left <= 0:
@@ -100,4 +163,6 @@ if __name__ == "__main__":
     try:
         asyncio.run(main())
     finally:
+        if DADATA_WARMUP_FILE:
+            save_hot_ids(DADATA_WARMUP_FILE, DADATA_WARMUP_LIMIT)
         asyncio.run(close_session())
@@ -1,51 +1,739 @@
-"""Простой TTL-кэш в памяти (без внешних зависимостей).
+"""TTL-кэш в памяти с LRU-вытеснением (без внешних зависимостей).
 
 Цель: не дергать API повторно по одному и тому же ИНН в рамках короткого окна.
+
+Устройство:
+- ``_data`` — OrderedDict в порядке давности обращения (LRU в начале);
+- ``_expiry`` — min-куча ``(stale_until, key)`` для удаления протухших записей;
+- время берётся из монотонных часов, поэтому перевод системных часов не влияет на TTL.
+
+Обе операции (``get``/``set``) работают за амортизированное O(log n): протухшие
+записи снимаются с вершины кучи, при переполнении вытесняется самый давний ключ.
+
+Опционально кэш может опираться на внешний уровень (``CacheStore``): записи
+дублируются туда, а промах в памяти проваливается во внешний уровень. ``SQLiteCacheStore``
+— локальный диск (кэш переживает рестарт процесса), ``RedisCacheStore`` — общий сервер
+для нескольких реплик (одна реплика оплатила запрос к DaData — остальные берут из кэша).
+Память при этом работает как near-cache, а чтение снаружи происходит лениво — только по
+запрошенным ключам; ``get_many`` забирает промахи списка одним запросом.
+
+Внешний уровень — сетевой или дисковый ввод-вывод, поэтому в асинхронном коде он
+не должен выполняться в цикле событий: ``aget``/``aget_stale``/``aget_many`` ходят
+в него через ``asyncio.to_thread``, а ``set``/``delete``/``clear`` при запущенном цикле
+пишут туда в фоне — отдельным потоком кэша, в порядке вызовов (память обновляется
+сразу). После ошибки внешнего уровня кэш ``store_cooldown`` секунд его не трогает
+и работает только из памяти: недоступный Redis не добавляет таймаут к каждому запросу.
+
+Для «известно отсутствующих» ключей (негативный кэш) используется сентинел
+``NOT_FOUND``: ``get()`` возвращает ``None`` только при настоящем промахе.
+
+При ``stale_seconds > 0`` протухшая запись ещё столько же держится в памяти:
+``get()`` её уже не видит, а ``get_stale()`` отдаёт с флагом ``is_stale`` — это
+основа для stale-while-revalidate у вызывающего кода.
+
+Каждый кэш ведёт счётчики (``CacheStats``): попадания, промахи, негативные
+попадания, протухания, вытеснения по причинам, примерный объём в байтах и время
+``get``/``set``. Снимок отдаёт ``stats()`` — по нему подбираются TTL и размеры кэшей.
+
+Кроме лимита по числу записей можно задать бюджет памяти ``max_bytes``: каждая
+запись несёт оценку своего размера, и давние записи вытесняются, пока суммарный
+объём не уложится в бюджет. Запись крупнее всего бюджета в память не кладётся
+(но пишется на диск, если он подключён). Оценка — длина JSON записи
+(``serialized_size``): это дёшево, а обход графа объектов (``approximate_size``)
+на списке из сотен филиалов занимал бы цикл событий на десятки миллисекунд.
+Без бюджета размер не считается вовсе.
+
+Одна и та же запись может быть доступна по нескольким ключам (например, по ИНН и
+по ОГРН): ``alias()`` заводит ключ-псевдоним, указывающий на основной ключ, без
+копии значения. Псевдонимы живут только в памяти и исчезают вместе с основной записью.
 """
 
 from __future__ import annotations
 
+import asyncio
+import heapq
+import logging
+import sqlite3
+import threading
+import sys
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Protocol
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+
+class _NotFound:
+    """Маркер «ключ проверен, данных нет» — отличается от промаха (``None``)."""
+
+    def __repr__(self) -> str:
+        return "NOT_FOUND"
+
+    def __bool__(self) -> bool:
+        return False
+
+
+NOT_FOUND = _NotFound()
+
+# Пустая строка не бывает результатом сериализации в JSON, поэтому служит маркером NOT_FOUND на диске.
+_NOT_FOUND_RAW = ""
 
 
 @dataclass
 class CacheItem:
     value: Any
     expires_at: float
+    # До какого момента запись можно отдавать как устаревшую (>= expires_at).
+    stale_until: float
+    # Оценка размера значения в байтах (см. ``serialized_size``); 0 — кэш без бюджета.
+    size: int = 0
+
+
+def serialized_size(value: Any) -> int:
+    """Оценка объёма значения — длина его JSON. У моделей с готовым представлением
+    (``to_json()``, например ``Company.raw_json``) повторной сериализации нет.
+    Объекты в памяти Python занимают в несколько раз больше — это учитывается бюджетом."""
+    to_json = getattr(value, "to_json", None)
+    try:
+        raw = to_json() if callable(to_json) else json_codec.dumps(value)
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+    return len(raw)
+
+
+def approximate_size(value: Any) -> int:
+    """Примерный объём значения в памяти: ``sys.getsizeof`` с обходом вложенных
+    dict/list/tuple и ``__slots__``-объектов. Общие объекты считаются один раз.
+
+    Точнее ``serialized_size``, но дорого: O(число объектов) на каждую запись."""
+    seen: set[int] = set()
+    stack = [value]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif not isinstance(obj, (str, bytes, int, float)):
+            for cls in type(obj).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+    return total
+
+
+@dataclass
+class CacheStats:
+    """Счётчики одного кэша. Попадания и промахи не пересекаются:
+    ``hits + negative_hits + stale_hits + misses`` — число обращений."""
+
+    hits: int = 0
+    # Попадания в NOT_FOUND (ключ известен как отсутствующий).
+    negative_hits: int = 0
+    # Отданные get_stale() устаревшие записи.
+    stale_hits: int = 0
+    misses: int = 0
+    # Из hits/negative_hits — сколько поднято из внешнего уровня (диск, Redis).
+    store_hits: int = 0
+    # Ошибки внешнего уровня; после каждой он пропускается на время store_cooldown.
+    store_errors: int = 0
+    sets: int = 0
+    # Записи, удалённые по истечении срока жизни (с учётом stale-окна).
+    expirations: int = 0
+    # Живые записи, удалённые досрочно: capacity (LRU по числу), bytes (LRU по объёму),
+    # oversize (запись больше всего бюджета), delete, clear.
+    evictions: Counter = field(default_factory=Counter)
+    get_seconds_total: float = 0.0
+    get_seconds_max: float = 0.0
+    set_seconds_total: float = 0.0
+    set_seconds_max: float = 0.0
+
+
+class CacheStoreError(Exception):
+    """Сбой внешнего уровня кэша (сеть, сервер) — кэш продолжает работать из памяти."""
+
+
+class CacheStore(Protocol):
+    """Уровень кэша за памятью ``TTLCache``: локальный диск или общий для реплик сервер."""
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]: ...
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]: ...
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class SQLiteCacheStore:
+    """Дисковый уровень кэша на SQLite.
+
+    Срок жизни хранится в «настенном» времени (``time.time``), потому что монотонные
+    часы обнуляются при рестарте. Значения сериализуются в JSON (или через свои
+    ``dumps``/``loads``, например для моделей с готовым JSON-представлением). Несколько кэшей
+    могут делить один файл — записи разделяются по ``namespace``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        *,
+        clock: Callable[[], float] = time.time,
+        dumps: Callable[[Any], str] = json_codec.dumps,
+        loads: Callable[[str], Any] = json_codec.loads,
+    ) -> None:
+        self.path = path
+        self.namespace = namespace
+        self._clock = clock
+        self._dumps = dumps
+        self._loads = loads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        # Протухшие записи прошлых запусков удаляем одним запросом по индексу —
+        # содержимое при этом не читается, старт остаётся быстрым.
+        self._conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires_at <= ?",
+            (namespace, self._clock()),
+        )
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        """Вернуть ``(value, оставшийся_ttl)`` или ``None``, если записи нет/она протухла."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        """То же, что ``get``, для списка ключей одним запросом; отсутствующих ключей в ответе нет."""
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value, expires_at FROM cache WHERE namespace = ? AND key IN ({placeholders})",
+                (self.namespace, *keys),
+            ).fetchall()
+        now = self._clock()
+        found = {}
+        for key, raw, expires_at in rows:
+            remaining = expires_at - now
+            if remaining <= 0:
+                self.delete(key)
+                continue
+            value = _decode(raw, self._loads, self.namespace, key)
+            if value is None:
+                self.delete(key)
+                continue
+            found[key] = (value, remaining)
+        return found
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        raw = _NOT_FOUND_RAW if value is NOT_FOUND else self._dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, raw, self._clock() + ttl_seconds),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisCacheStore:
+    """Общий для нескольких реплик бота уровень кэша на сервере с протоколом Redis.
+
+    Каждая реплика держит перед ним свой ``TTLCache`` в памяти (near-cache), поэтому
+    сетевой запрос нужен только при промахе в памяти. TTL хранит сам сервер
+    (``SET ... PX``), остаток срока читается через ``PTTL`` в том же конвейере.
+
+    ``client`` — синхронный клиент с интерфейсом ``redis.Redis`` (``get``/``set``/
+    ``pttl``/``delete``/``pipeline``/``scan_iter``); ``from_url`` создаёт его из
+    необязательного пакета ``redis``. Ошибки клиента (``errors``) превращаются в
+    ``CacheStoreError``.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        namespace: str,
+        *,
+        prefix: str = "dadata",
+        dumps: Callable[[Any], str] = json_codec.dumps,
+        loads: Callable[[str], Any] = json_codec.loads,
+        errors: tuple[type[BaseException], ...] = (OSError,),
+    ) -> None:
+        self.namespace = namespace
+        self._client = client
+        self._prefix = f"{prefix}:{namespace}:"
+        self._dumps = dumps
+        self._loads = loads
+        self._errors = errors
+
+    @classmethod
+    def from_url(cls, url: str, namespace: str, *, timeout: float = 0.5, **kwargs: Any) -> "RedisCacheStore":
+        import redis  # необязательная зависимость: нужна только для общего кэша
+
+        client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return cls(client, namespace, errors=(redis.RedisError, OSError), **kwargs)
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        """Значения и остаток TTL для списка ключей за один сетевой round-trip (pipeline)."""
+        if not keys:
+            return {}
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(self._prefix + key)
+                pipe.pttl(self._prefix + key)
+            replies = pipe.execute()
+        except self._errors as exc:
+            raise CacheStoreError(f"Redis get failed: {exc}") from exc
+
+        found = {}
+        for key, raw, pttl in zip(keys, replies[::2], replies[1::2]):
+            # PTTL < 0: ключа нет (-2) или он без срока (-1) — такого мы не пишем.
+            if raw is None or pttl is None or pttl <= 0:
+                continue
+            if isinstance(raw, bytes):
+                raw = raw.decode("utf-8")
+            value = _decode(raw, self._loads, self.namespace, key)
+            if value is not None:
+                found[key] = (value, pttl / 1000)
+        return found
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        raw = _NOT_FOUND_RAW if value is NOT_FOUND else self._dumps(value)
+        try:
+            self._client.set(self._prefix + key, raw, px=max(1, int(ttl_seconds * 1000)))
+        except self._errors as exc:
+            raise CacheStoreError(f"Redis set failed: {exc}") from exc
+
+    def delete(self, key: str) -> None:
+        try:
+            self._client.delete(self._prefix + key)
+        except self._errors as exc:
+            raise CacheStoreError(f"Redis delete failed: {exc}") from exc
+
+    def clear(self) -> None:
+        try:
+            keys = list(self._client.scan_iter(match=self._prefix + "*", count=500))
+            if keys:
+                self._client.delete(*keys)
+        except self._errors as exc:
+            raise CacheStoreError(f"Redis clear failed: {exc}") from exc
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def _decode(raw: str, loads: Callable[[str], Any], namespace: str, key: str) -> Optional[Any]:
+    """Разобрать сохранённое значение; ``None`` — запись повреждена (уже залогировано)."""
+    if raw == _NOT_FOUND_RAW:
+        return NOT_FOUND
+    try:
+        return loads(raw)
+    except ValueError:
+        logger.warning("Повреждённая запись кэша %s:%s", namespace, key)
+        return None
+
+
+_STORE_ERRORS = (sqlite3.Error, CacheStoreError)
 
 
 class TTLCache:
-    def __init__(self, ttl_seconds: int = 3600, max_items: int = 2000) -> None:
+    def __init__(
+        self,
+        ttl_seconds: int = 3600,
+        max_items: int = 2000,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        store: Optional[CacheStore] = None,
+        stale_seconds: float = 0,
+        name: str = "",
+        sizeof: Callable[[Any], int] = serialized_size,
+        max_bytes: int = 0,
+        store_cooldown: float = 5.0,
+    ) -> None:
         self.ttl_seconds = ttl_seconds
-        self.max_items = max_items
-        self._data: Dict[str, CacheItem] = {}
+        self.max_items = max(1, max_items)
+        # 0 — без ограничения по объёму.
+        self.max_bytes = max(0, max_bytes)
+        self.stale_seconds = max(0.0, stale_seconds)
+        self.name = name
+        self._clock = clock
+        self._store = store
+        self.store_cooldown = max(0.0, store_cooldown)
+        # До этого момента (по self._clock) внешний уровень не трогаем после ошибки.
+        self._store_down_until = float("-inf")
+        # Один поток на кэш: фоновые записи во внешний уровень идут в порядке вызовов.
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._sizeof = sizeof
+        self._data: OrderedDict[str, CacheItem] = OrderedDict()
+        # В куче могут оставаться «мёртвые» записи (ключ перезаписан или вытеснен) —
+        # они отбрасываются лениво при сравнении stale_until с актуальной записью.
+        self._expiry: list[tuple[float, str]] = []
+        # Псевдоним -> основной ключ. Псевдонимы на вытесненные записи снимаются лениво.
+        self._aliases: dict[str, str] = {}
+        self._bytes = 0
+        self._stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str, *, store: bool = True) -> Optional[Any]:
+        value, is_stale = self.get_stale(key, store=store)
+        return None if is_stale else value
+
+    def get_stale(self, key: str, *, store: bool = True) -> tuple[Optional[Any], bool]:
+        """Вернуть ``(value, is_stale)``; устаревшие записи отдаются в пределах ``stale_seconds``.
+
+        ``store=False`` — только память: внешний уровень вызывающий уже проверил.
+        """
+        started = time.perf_counter()
+        try:
+            key = self._resolve(key)
+            hit = self._lookup_memory(key)
+            if hit is not None:
+                return hit
+            value = self._get_many_from_store([key]).get(key) if store else None
+            self._count_store_result(value)
+            return value, False
+        finally:
+            self._count_get(started)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """``get`` для асинхронного кода: внешний уровень читается вне цикла событий."""
+        value, is_stale = await self.aget_stale(key)
+        return None if is_stale else value
+
+    async def aget_stale(self, key: str) -> tuple[Optional[Any], bool]:
+        """``get_stale`` для асинхронного кода: внешний уровень читается вне цикла событий."""
+        started = time.perf_counter()
+        try:
+            key = self._resolve(key)
+            hit = self._lookup_memory(key)
+            if hit is not None:
+                return hit
+            value = (await self._aget_many_from_store([key])).get(key)
+            self._count_store_result(value)
+            return value, False
+        finally:
+            self._count_get(started)
+
+    def set(self, key: str, value: Any, ttl_seconds: float | None = None) -> None:
+        started = time.perf_counter()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._set_memory(key, value, ttl)
+        if self._store is not None:
+            self._write_store(self._store.set, key, value, ttl)
+        elapsed = time.perf_counter() - started
+        self._stats.sets += 1
+        self._stats.set_seconds_total += elapsed
+        self._stats.set_seconds_max = max(self._stats.set_seconds_max, elapsed)
+
+    def alias(self, alias_key: str, key: str) -> None:
+        """Сделать ``alias_key`` ещё одним ключом записи ``key`` (если она есть в памяти)."""
+        if alias_key == key or key not in self._data:
+            return
+        # Отдельная запись под псевдонимом — дубликат той же сущности, она больше не нужна.
+        self._remove(alias_key)
+        self._aliases[alias_key] = key
+        self._compact_aliases()
+
+    def stats(self) -> dict:
+        """Снимок счётчиков для мониторинга/экспорта (plain dict, пригоден для JSON)."""
+        st = self._stats
+        lookups = st.hits + st.negative_hits + st.stale_hits + st.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "max_items": self.max_items,
+            "aliases": len(self._aliases),
+            "approx_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": st.hits,
+            "negative_hits": st.negative_hits,
+            "stale_hits": st.stale_hits,
+            "misses": st.misses,
+            "store_hits": st.store_hits,
+            "store_errors": st.store_errors,
+            "hit_ratio": (lookups - st.misses) / lookups if lookups else 0.0,
+            "sets": st.sets,
+            "expirations": st.expirations,
+            "evictions": dict(st.evictions),
+            "get_avg_ms": st.get_seconds_total / lookups * 1000 if lookups else 0.0,
+            "get_max_ms": st.get_seconds_max * 1000,
+            "set_avg_ms": st.set_seconds_total / st.sets * 1000 if st.sets else 0.0,
+            "set_max_ms": st.set_seconds_max * 1000,
+        }
+
+    def reset_stats(self) -> None:
+        self._stats = CacheStats()
+
+    def _resolve(self, key: str) -> str:
+        target = self._aliases.get(key)
+        if target is None:
+            return key
+        if target in self._data:
+            return target
+        del self._aliases[key]
+        return key
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Свежие значения по списку ключей (как ``get``); промахи в ответ не попадают.
+
+        Промахи в памяти запрашиваются у внешнего уровня одним вызовом ``store.get_many``
+        (для Redis — один конвейер), а не по ключу на запрос.
+        """
+        started = time.perf_counter()
+        found, missing = self._get_many_memory(keys)
+        if missing:
+            self._merge_store_result(found, missing, self._get_many_from_store(list(missing)))
+        self._count_get(started)
+        return found
 
-    def get(self, key: str) -> Optional[Any]:
+    async def aget_many(self, keys: list[str]) -> dict[str, Any]:
+        """``get_many`` для асинхронного кода: внешний уровень читается вне цикла событий."""
+        started = time.perf_counter()
+        found, missing = self._get_many_memory(keys)
+        if missing:
+            self._merge_store_result(found, missing, await self._aget_many_from_store(list(missing)))
+        self._count_get(started)
+        return found
+
+    def _get_many_memory(self, keys: list[str]) -> tuple[dict[str, Any], dict[str, list[str]]]:
+        """Свежие значения из памяти и промахи: основной ключ -> запрошенные ключи."""
+        found: dict[str, Any] = {}
+        missing: dict[str, list[str]] = {}
+        for key in dict.fromkeys(keys):
+            resolved = self._resolve(key)
+            hit = self._lookup_memory(resolved)
+            if hit is None:
+                missing.setdefault(resolved, []).append(key)
+            elif not hit[1]:
+                found[key] = hit[0]
+        return found, missing
+
+    def _merge_store_result(
+        self, found: dict[str, Any], missing: dict[str, list[str]], from_store: dict[str, Any]
+    ) -> None:
+        for resolved, requested in missing.items():
+            value = from_store.get(resolved)
+            self._count_store_result(value)
+            if value is not None:
+                for key in requested:
+                    found[key] = value
+
+    def _count_get(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self._stats.get_seconds_total += elapsed
+        self._stats.get_seconds_max = max(self._stats.get_seconds_max, elapsed)
+
+    def _lookup_memory(self, key: str) -> Optional[tuple[Any, bool]]:
+        """``(value, is_stale)`` из памяти или ``None``, если нужно идти во внешний уровень."""
         item = self._data.get(key)
-        if not item:
+        if item is None:
             return None
-        if item.expires_at < time.time():
-            self._data.pop(key, None)
-            return None
-        return item.value
-
-    def set(self, key: str, value: Any) -> None:
-        # Простая защита от бесконечного роста: при переполнении удаляем часть протухших/старых.
-        if len(self._data) >= self.max_items:
-            self._gc()
-
-        self._data[key] = CacheItem(value=value, expires_at=time.time() + self.ttl_seconds)
-
-    def _gc(self) -> None:
-        now = time.time()
-        # 1) удалить протухшие
-        expired = [k for k, v in self._data.items() if v.expires_at < now]
-        for k in expired:
-            self._data.pop(k, None)
-
-        # 2) если всё ещё слишком много — удалить произвольные (LRU не нужен для задачи)
-        if len(self._data) >= self.max_items:
-            for k in list(self._data.keys())[: max(1, self.max_items // 10)]:
-                self._data.pop(k, None)
+        now = self._clock()
+        if item.expires_at <= now:
+            if item.stale_until <= now:
+                self._remove(key)
+                self._stats.expirations += 1
+                return None
+            self._stats.stale_hits += 1
+            return item.value, True
+        self._data.move_to_end(key)
+        self._count_hit(item.value)
+        return item.value, False
+
+    def _count_hit(self, value: Any) -> None:
+        if value is NOT_FOUND:
+            self._stats.negative_hits += 1
+        else:
+            self._stats.hits += 1
+
+    def _count_store_result(self, value: Any) -> None:
+        if value is None:
+            self._stats.misses += 1
+        else:
+            self._stats.store_hits += 1
+            self._count_hit(value)
+
+    def _store_ready(self) -> bool:
+        return self._store is not None and self._clock() >= self._store_down_until
+
+    def _store_failed(self, exc: Exception) -> None:
+        self._stats.store_errors += 1
+        now = self._clock()
+        if now >= self._store_down_until:
+            logger.warning(
+                "Внешний кэш %s недоступен, %.0f с работаем только из памяти: %s",
+                self.name or "", self.store_cooldown, exc,
+            )
+        self._store_down_until = now + self.store_cooldown
+
+    def _get_many_from_store(self, keys: list[str]) -> dict[str, Any]:
+        if not keys or not self._store_ready():
+            return {}
+        try:
+            found = self._store.get_many(keys)
+        except _STORE_ERRORS as exc:
+            self._store_failed(exc)
+            return {}
+        return self._promote(found)
+
+    async def _aget_many_from_store(self, keys: list[str]) -> dict[str, Any]:
+        if not keys or not self._store_ready():
+            return {}
+        try:
+            found = await asyncio.to_thread(self._store.get_many, keys)
+        except _STORE_ERRORS as exc:
+            self._store_failed(exc)
+            return {}
+        return self._promote(found)
+
+    def _promote(self, found: dict[str, tuple[Any, float]]) -> dict[str, Any]:
+        values = {}
+        for key, (value, remaining) in found.items():
+            # Поднимаем запись в память с остатком TTL, чтобы не продлевать срок жизни.
+            self._set_memory(key, value, remaining)
+            values[key] = value
+        return values
+
+    def _write_store(self, method: Callable[..., None], *args: Any) -> None:
+        """Изменить внешний уровень: при запущенном цикле событий — в фоновом потоке
+        кэша (в порядке вызовов), без цикла — сразу."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._run_store_write(method, *args)
+            return
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cache-{self.name or 'store'}")
+        self._writer.submit(self._run_store_write, method, *args)
+
+    def _run_store_write(self, method: Callable[..., None], *args: Any) -> None:
+        if not self._store_ready():
+            return
+        try:
+            method(*args)
+        except _STORE_ERRORS as exc:
+            self._store_failed(exc)
+        except (TypeError, ValueError) as exc:
+            logger.warning("Не удалось записать %s во внешний кэш: %s", args[0] if args else "", exc)
+
+    def flush(self) -> None:
+        """Дождаться фоновых записей во внешний уровень (перед остановкой, в тестах)."""
+        if self._writer is not None:
+            self._writer.submit(lambda: None).result()
+
+    def _set_memory(self, key: str, value: Any, ttl: float) -> None:
+        now = self._clock()
+        self._purge_expired(now)
+
+        expires_at = now + ttl
+        stale_until = expires_at + self.stale_seconds
+        # Размер нужен только бюджету по объёму — без него запись не оценивается.
+        size = self._sizeof(value) if self.max_bytes and value is not NOT_FOUND else 0
+        self._aliases.pop(key, None)
+        self._remove(key)
+        if self.max_bytes and size > self.max_bytes:
+            # Такая запись вытеснила бы весь кэш и всё равно не поместилась бы.
+            self._stats.evictions["oversize"] += 1
+            return
+        self._data[key] = CacheItem(value=value, expires_at=expires_at, stale_until=stale_until, size=size)
+        self._bytes += size
+        heapq.heappush(self._expiry, (stale_until, key))
+
+        while len(self._data) > self.max_items:
+            self._remove(next(iter(self._data)))
+            self._stats.evictions["capacity"] += 1
+        if self.max_bytes:
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self._stats.evictions["bytes"] += 1
+
+        self._compact_expiry()
+
+    def _remove(self, key: str) -> Optional[CacheItem]:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item.size
+        return item
+
+    def delete(self, key: str) -> None:
+        self._aliases.pop(key, None)
+        if self._remove(key) is not None:
+            self._stats.evictions["delete"] += 1
+        if self._store is not None:
+            self._write_store(self._store.delete, key)
+
+    def clear(self) -> None:
+        if self._data:
+            self._stats.evictions["clear"] += len(self._data)
+        self._data.clear()
+        self._expiry.clear()
+        self._aliases.clear()
+        self._bytes = 0
+        if self._store is not None:
+            self._write_store(self._store.clear)
+
+    def _purge_expired(self, now: float) -> None:
+        heap = self._expiry
+        while heap and heap[0][0] <= now:
+            stale_until, key = heapq.heappop(heap)
+            item = self._data.get(key)
+            if item is not None and item.stale_until == stale_until:
+                self._remove(key)
+                self._stats.expirations += 1
+
+    def _compact_expiry(self) -> None:
+        # Перестраиваем кучу, когда мёртвых записей становится больше живых:
+        # O(n) раз в ~n операций => амортизированно O(1) на вызов set().
+        if len(self._expiry) <= 2 * len(self._data) + 64:
+            return
+        self._expiry = [(item.stale_until, key) for key, item in self._data.items()]
+        heapq.heapify(self._expiry)
+
+    def _compact_aliases(self) -> None:
+        # Как и для кучи: чистим псевдонимы на вытесненные записи раз в ~n вызовов.
+        if len(self._aliases) <= 2 * len(self._data) + 64:
+            return
+        self._aliases = {alias: key for alias, key in self._aliases.items() if key in self._data}
@@ -0,0 +1,105 @@
+"""Circuit breaker для внешних API.
+
+Пока доля ошибок в скользящем окне последних ``window`` вызовов ниже ``failure_rate``,
+цепь замкнута (``closed``) и запросы идут как обычно. Когда порог превышен (и в окне
+набралось хотя бы ``min_calls`` вызовов), цепь размыкается (``open``): запросы сразу
+отклоняются, не дожидаясь сетевого таймаута. Через ``reset_timeout`` секунд цепь
+переходит в ``half_open`` и пропускает один пробный запрос — его успех замыкает
+цепь, ошибка снова размыкает.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Callable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        *,
+        failure_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 10,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._outcomes: deque[bool] = deque(maxlen=max(self.min_calls, window))
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.opened_count = 0
+        self.rejected_count = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Можно ли сейчас идти в upstream. В ``half_open`` пропускает один пробный запрос."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected_count += 1
+        return False
+
+    def record_success(self) -> None:
+        if self._state != CLOSED:
+            self._state = CLOSED
+            self._outcomes.clear()
+        self._probe_in_flight = False
+        self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        if self._state == HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(False)
+        if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def release(self) -> None:
+        """Разрешённый запрос так и не ушёл в upstream: пробный запрос ``half_open`` не
+        засчитывается ни успехом, ни сбоем, следующий может пройти."""
+        self._probe_in_flight = False
+
+    def reset(self) -> None:
+        self._state = CLOSED
+        self._outcomes.clear()
+        self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        """Состояние для мониторинга/логов."""
+        total = len(self._outcomes)
+        failures = self._outcomes.count(False)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_failures": failures,
+            "failure_rate": failures / total if total else 0.0,
+            "opened_count": self.opened_count,
+            "rejected_count": self.rejected_count,
+        }
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self.opened_count += 1
@@ -0,0 +1,232 @@
+"""Компактная модель карточки компании из ответа DaData findById/party.
+
+Сырой ответ DaData — глубоко вложенный dict на сотни полей, из которых бот
+показывает несколько десятков. ``Company`` разбирается один раз при получении
+ответа: нужные поля раскладываются по ``__slots__``-датаклассам, а весь ответ
+хранится одной JSON-строкой (заметно компактнее вложенных dict) и разбирается
+заново только для дампа «Все поля DaData».
+
+Форматтеры принимают и ``Company``, и сырой dict (через ``Company.coerce``),
+поэтому старые вызовы с dict продолжают работать.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import json_codec
+
+
+def _dict(value: Any) -> dict:
+    return value if isinstance(value, dict) else {}
+
+
+def _list(value: Any) -> list:
+    return value if isinstance(value, list) else []
+
+
+def _values(items: Any) -> tuple[str, ...]:
+    return tuple(item["value"] for item in _list(items) if isinstance(item, dict) and item.get("value"))
+
+
+@dataclass(frozen=True, slots=True)
+class Person:
+    """Руководитель или учредитель."""
+
+    name: Any = None
+    post: Any = None
+    start_date: Optional[int] = None
+    share_value: Any = None
+    share_type: Any = None
+
+    @classmethod
+    def from_dict(cls, item: dict) -> "Person":
+        share = _dict(item.get("share"))
+        return cls(
+            name=item.get("name") or item.get("fio") or item.get("value"),
+            post=item.get("post"),
+            start_date=item.get("start_date"),
+            share_value=share.get("value"),
+            share_type=share.get("type"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Document:
+    """Лицензия (``kind`` — серия) или документ (``kind`` — тип)."""
+
+    kind: Any = None
+    number: Any = None
+    issue_date: Optional[int] = None
+
+
+@dataclass(frozen=True, slots=True)
+class Company:
+    value: Any = None
+    short_name: Any = None
+    full_name: Any = None
+    entity_type: Optional[str] = None
+    branch_type: Optional[str] = None
+    branch_count: Any = None
+
+    inn: Any = None
+    kpp: Any = None
+    ogrn: Any = None
+    ogrn_date: Optional[int] = None
+    okpo: Any = None
+    okato: Any = None
+    oktmo: Any = None
+    okfs: Any = None
+    okogu: Any = None
+    okopf: Any = None
+
+    status: Any = None
+    status_code: Any = None
+    has_state: bool = False
+    registration_date: Optional[int] = None
+    liquidation_date: Optional[int] = None
+
+    address: Any = None
+    address_full: Any = None
+
+    manager: Optional[Person] = None
+    managers: tuple[Person, ...] = ()
+    founders: tuple[Person, ...] = ()
+    successors: tuple[Any, ...] = ()
+
+    okved: Any = None
+    okved_type: Any = None
+    okved_name: Any = None
+    okveds_count: int = 0
+
+    employee_count: Any = None
+    finance_year: Any = None
+    salary: Any = None
+    revenue: Any = None
+    profit: Any = None
+    finance_value: Any = None
+    capital_value: Any = None
+    capital_type: Any = None
+
+    tax_authority_name: Any = None
+    tax_authority_date: Optional[int] = None
+    pf_name: Any = None
+    sif_name: Any = None
+    rosstat_name: Any = None
+    tax_system: Any = None
+    fns_debt: Any = None
+
+    phones: tuple[str, ...] = ()
+    emails: tuple[str, ...] = ()
+    websites: tuple[str, ...] = ()
+    licenses: tuple[Document, ...] = ()
+    documents: tuple[Document, ...] = ()
+
+    raw_json: str = field(default="{}", repr=False)
+
+    @classmethod
+    def from_suggestion(cls, item: Any, *, raw_json: Optional[str] = None) -> "Company":
+        """Разобрать один элемент ``suggestions`` ответа DaData."""
+        item = _dict(item)
+        d = _dict(item.get("data"))
+        name = _dict(d.get("name"))
+        state = _dict(d.get("state"))
+        address = _dict(d.get("address"))
+        management = _dict(d.get("management"))
+        finance = _dict(d.get("finance"))
+        capital = _dict(d.get("capital"))
+        authorities = _dict(d.get("authorities"))
+        fts = _dict(authorities.get("fts_registration"))
+        okveds = _list(d.get("okveds"))
+        tax_system = _dict(d.get("tax_system"))
+
+        return cls(
+            value=item.get("value"),
+            short_name=name.get("short_with_opf"),
+            full_name=name.get("full_with_opf"),
+            entity_type=d.get("type"),
+            branch_type=d.get("branch_type"),
+            branch_count=d.get("branch_count"),
+            inn=d.get("inn"),
+            kpp=d.get("kpp"),
+            ogrn=d.get("ogrn"),
+            ogrn_date=d.get("ogrn_date"),
+            okpo=d.get("okpo"),
+            okato=d.get("okato"),
+            oktmo=d.get("oktmo"),
+            okfs=d.get("okfs"),
+            okogu=d.get("okogu"),
+            okopf=d.get("okopf"),
+            status=state.get("status"),
+            status_code=state.get("code"),
+            has_state=bool(state),
+            registration_date=state.get("registration_date"),
+            liquidation_date=state.get("liquidation_date"),
+            address=address.get("value"),
+            address_full=address.get("unrestricted_value"),
+            manager=Person.from_dict(management) if management else None,
+            managers=tuple(Person.from_dict(p) for p in _list(d.get("managers")) if isinstance(p, dict)),
+            founders=tuple(Person.from_dict(p) for p in _list(d.get("founders")) if isinstance(p, dict)),
+            successors=tuple(s.get("value") for s in _list(d.get("successors")) if isinstance(s, dict)),
+            okved=d.get("okved"),
+            okved_type=d.get("okved_type"),
+            okved_name=okveds[0].get("name") if okveds and isinstance(okveds[0], dict) else None,
+            okveds_count=len(okveds),
+            employee_count=d.get("employee_count"),
+            finance_year=finance.get("year"),
+            salary=finance.get("salary"),
+            revenue=finance.get("revenue"),
+            profit=finance.get("profit"),
+            finance_value=finance.get("value"),
+            capital_value=capital.get("value"),
+            capital_type=capital.get("type"),
+            tax_authority_name=fts.get("name"),
+            tax_authority_date=fts.get("date"),
+            pf_name=_dict(authorities.get("pf")).get("name"),
+            sif_name=_dict(authorities.get("sif")).get("name"),
+            rosstat_name=_dict(authorities.get("rosstat")).get("name"),
+            tax_system=tax_system.get("name") or tax_system.get("code"),
+            fns_debt=_dict(d.get("fns_debt")).get("debt"),
+            phones=_values(d.get("phones")),
+            emails=_values(d.get("emails")),
+            websites=_values(d.get("websites")),
+            licenses=tuple(
+                Document(kind=x.get("series"), number=x.get("number"), issue_date=x.get("issue_date"))
+                for x in _list(d.get("licenses"))
+                if isinstance(x, dict)
+            ),
+            documents=tuple(
+                Document(kind=x.get("type"), number=x.get("number"), issue_date=x.get("issue_date"))
+                for x in _list(d.get("documents"))
+                if isinstance(x, dict)
+            ),
+            raw_json=raw_json if raw_json is not None else json_codec.dumps(item),
+        )
+
+    @classmethod
+    def from_json(cls, raw_json: str) -> "Company":
+        return cls.from_suggestion(json_codec.loads(raw_json), raw_json=raw_json)
+
+    @classmethod
+    def coerce(cls, company: "Company | dict | None") -> "Company":
+        return company if isinstance(company, Company) else cls.from_suggestion(company)
+
+    def to_json(self) -> str:
+        return self.raw_json
+
+    @property
+    def raw(self) -> dict:
+        """Исходный элемент ответа DaData (разбирается из JSON при каждом обращении)."""
+        return json_codec.loads(self.raw_json)
+
+    @property
+    def data(self) -> dict:
+        return _dict(self.raw.get("data"))
+
+    @property
+    def state(self) -> dict:
+        """Статус в форме, которую ожидает ``party_state.format_company_state``."""
+        if not self.has_state:
+            return {}
+        return {"status": self.status, "code": self.status_code}
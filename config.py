@@ -13,7 +13,14 @@ load_dotenv()
 # - DADATA_API_KEY / DADATA_TOKEN
 # - DADATA_SECRET_KEY / DADATA_SECRET
 TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN") or os.getenv("BOT_TOKEN", "")
-DADATA_API_KEY: str = os.getenv("DADATA_API_KEY") or os.getenv("DADATA_TOKEN", "")
+# Пул ключей DaData через запятую (у каждого ключа свой лимит частоты и суточная квота);
+# без него — единственный DADATA_API_KEY.
+DADATA_API_KEYS: list[str] = list(
+    dict.fromkeys(key.strip() for key in os.getenv("DADATA_API_KEYS", "").split(",") if key.strip())
+)
+DADATA_API_KEY: str = os.getenv("DADATA_API_KEY") or os.getenv("DADATA_TOKEN", "") or next(iter(DADATA_API_KEYS), "")
+if not DADATA_API_KEYS and DADATA_API_KEY:
+    DADATA_API_KEYS = [DADATA_API_KEY]
 DADATA_SECRET_KEY: str = os.getenv("DADATA_SECRET_KEY") or os.getenv("DADATA_SECRET", "")
 OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
 
@@ -39,6 +46,7 @@ if not DADATA_API_KEY:
 
 # DaData endpoints
 DADATA_FIND_URL = "https://suggestions.dadata.ru/suggestions/api/4_1/rs/findById/party"
+DADATA_SUGGEST_URL = "https://suggestions.dadata.ru/suggestions/api/4_1/rs/suggest/party"
 
 # OpenAI
 OPENAI_BASE_URL = "https://api.openai.com/v1"
@@ -89,3 +97,112 @@ BOT_STARTUP_RETRY_BASE_DELAY_SECONDS = _get_float_env(
 BOT_STARTUP_RETRY_MAX_DELAY_SECONDS = _get_float_env(
     "BOT_STARTUP_RETRY_MAX_DELAY_SECONDS", 30.0, minimum=0.1
 )
+# Срок обработки апдейта Telegram (deadline.py): запросы к DaData, которые к нему не
+# успевают, бросаются, а не копятся в очереди. Проверка списка ИНН/ОГРН получает
+# свой, более длинный срок. 0 — без срока.
+BOT_HANDLER_DEADLINE_SECONDS = _get_float_env("BOT_HANDLER_DEADLINE_SECONDS", 20.0, minimum=0.0)
+BOT_BATCH_DEADLINE_SECONDS = _get_float_env("BOT_BATCH_DEADLINE_SECONDS", 60.0, minimum=0.0)
+
+# Кэш ответов DaData (экономия лимитов).
+DADATA_CACHE_TTL_SECONDS = _get_int_env("DADATA_CACHE_TTL_SECONDS", 30 * 60, minimum=1)
+DADATA_PARTY_CACHE_MAX_ITEMS = _get_int_env("DADATA_PARTY_CACHE_MAX_ITEMS", 5000, minimum=1)
+DADATA_BRANCHES_CACHE_MAX_ITEMS = _get_int_env("DADATA_BRANCHES_CACHE_MAX_ITEMS", 2000, minimum=1)
+# Бюджет памяти кэшей в мегабайтах по длине JSON записей (дешёвая оценка); 0 — только лимит по числу.
+DADATA_PARTY_CACHE_MAX_MB = _get_int_env("DADATA_PARTY_CACHE_MAX_MB", 0, minimum=0)
+DADATA_BRANCHES_CACHE_MAX_MB = _get_int_env("DADATA_BRANCHES_CACHE_MAX_MB", 0, minimum=0)
+# Кэш поиска по названию (suggest/party): число запомненных запросов.
+DADATA_SUGGEST_CACHE_MAX_ITEMS = _get_int_env("DADATA_SUGGEST_CACHE_MAX_ITEMS", 2000, minimum=1)
+# Негативный кэш: сколько помнить, что DaData не знает ИНН/ОГРН (или филиалов нет).
+DADATA_NEGATIVE_CACHE_TTL_SECONDS = _get_int_env("DADATA_NEGATIVE_CACHE_TTL_SECONDS", 5 * 60, minimum=1)
+# Сколько запросов к DaData выполняется одновременно (слоты делятся между чатами).
+DADATA_MAX_CONCURRENCY = _get_int_env("DADATA_MAX_CONCURRENCY", 5, minimum=1)
+# Ограничение частоты запросов к DaData на один ключ (token bucket + AIMD при ответах 429).
+DADATA_RATE_LIMIT_RPS = _get_float_env("DADATA_RATE_LIMIT_RPS", 20.0, minimum=0.1)
+DADATA_RATE_LIMIT_BURST = _get_int_env("DADATA_RATE_LIMIT_BURST", 20, minimum=1)
+DADATA_RATE_LIMIT_MIN_RPS = _get_float_env("DADATA_RATE_LIMIT_MIN_RPS", 1.0, minimum=0.1)
+# На сколько выводится из ротации ключ, отвергнутый DaData (HTTP 401/403).
+DADATA_KEY_SIDELINE_SECONDS = _get_float_env("DADATA_KEY_SIDELINE_SECONDS", 3600.0, minimum=1.0)
+# Дольше этого запрос не ждёт своей очереди — сразу считается «лимит DaData».
+DADATA_RATE_LIMIT_MAX_WAIT_SECONDS = _get_float_env("DADATA_RATE_LIMIT_MAX_WAIT_SECONDS", 10.0, minimum=0.0)
+# Повторы временных ошибок DaData (сеть, таймаут, 5xx) с экспоненциальной задержкой.
+DADATA_RETRY_ATTEMPTS = _get_int_env("DADATA_RETRY_ATTEMPTS", 3, minimum=1)
+DADATA_RETRY_BASE_DELAY_SECONDS = _get_float_env("DADATA_RETRY_BASE_DELAY_SECONDS", 0.3, minimum=0.0)
+DADATA_RETRY_MAX_DELAY_SECONDS = _get_float_env("DADATA_RETRY_MAX_DELAY_SECONDS", 2.0, minimum=0.0)
+# Circuit breaker: при доле ошибок >= порога в окне последних вызовов запросы
+# к DaData отклоняются сразу на DADATA_CIRCUIT_RESET_SECONDS.
+DADATA_CIRCUIT_FAILURE_RATE = _get_float_env("DADATA_CIRCUIT_FAILURE_RATE", 0.5, minimum=0.01)
+DADATA_CIRCUIT_WINDOW = _get_int_env("DADATA_CIRCUIT_WINDOW", 20, minimum=1)
+DADATA_CIRCUIT_MIN_CALLS = _get_int_env("DADATA_CIRCUIT_MIN_CALLS", 10, minimum=1)
+DADATA_CIRCUIT_RESET_SECONDS = _get_float_env("DADATA_CIRCUIT_RESET_SECONDS", 30.0, minimum=0.1)
+# Пакетная проверка списка ИНН/ОГРН: параллельность и таймаут на один идентификатор
+# (0 — без отдельного таймаута: ожидание ограничено сроком обработки и таймаутами HTTP с повторами).
+DADATA_BATCH_CONCURRENCY = _get_int_env("DADATA_BATCH_CONCURRENCY", 5, minimum=1)
+DADATA_BATCH_ITEM_TIMEOUT_SECONDS = _get_float_env("DADATA_BATCH_ITEM_TIMEOUT_SECONDS", 0.0, minimum=0.0)
+# Stale-while-revalidate для карточек: сколько секунд после TTL отдавать устаревшую
+# запись, обновляя её в фоне (0 — выключено).
+DADATA_STALE_GRACE_SECONDS = _get_int_env("DADATA_STALE_GRACE_SECONDS", 0, minimum=0)
+# Необязательный дисковый уровень кэша (SQLite): пусто — кэш только в памяти.
+DADATA_CACHE_DB_PATH: str = os.getenv("DADATA_CACHE_DB_PATH", "").strip()
+# Общий для нескольких реплик кэш (redis://host:6379/0); приоритетнее SQLite-файла.
+DADATA_CACHE_REDIS_URL: str = os.getenv("DADATA_CACHE_REDIS_URL", "").strip()
+# Сколько секунд не обращаться к внешнему уровню кэша (Redis/SQLite) после его ошибки.
+DADATA_CACHE_STORE_COOLDOWN_SECONDS = _get_float_env("DADATA_CACHE_STORE_COOLDOWN_SECONDS", 5.0, minimum=0.0)
+# Суточный бюджет запросов на один ключ DaData (0 — без ограничения) и порог «мягкого» режима:
+# после него квоту тратят только одиночные проверки пользователей, когда бюджет исчерпан
+# у всех ключей — бот работает только из кэша. Счётчики хранятся в SQLite (по умолчанию — в файле кэша).
+DADATA_DAILY_BUDGET = _get_int_env("DADATA_DAILY_BUDGET", 0, minimum=0)
+DADATA_QUOTA_SOFT_RATIO = _get_float_env("DADATA_QUOTA_SOFT_RATIO", 0.9, minimum=0.0)
+DADATA_QUOTA_DB_PATH: str = os.getenv("DADATA_QUOTA_DB_PATH", "").strip() or DADATA_CACHE_DB_PATH
+# Офлайн-индекс ЕГРЮЛ/ЕГРИП (egrul_index.py): карточки из него отдаются без запроса
+# к DaData, пока выгрузка, из которой взята запись, не старше DADATA_EGRUL_MAX_AGE_DAYS.
+# Пусто — выключено.
+DADATA_EGRUL_INDEX_PATH: str = os.getenv("DADATA_EGRUL_INDEX_PATH", "").strip()
+DADATA_EGRUL_MAX_AGE_DAYS = _get_int_env("DADATA_EGRUL_MAX_AGE_DAYS", 30, minimum=1)
+# Запись/воспроизведение обменов с DaData (transport.py): путь к кассете и режим
+# record|replay. В режиме replay бот не ходит в сеть. Пусто — обычная работа.
+DADATA_HTTP_CASSETTE: str = os.getenv("DADATA_HTTP_CASSETTE", "").strip()
+DADATA_HTTP_CASSETTE_MODE: str = os.getenv("DADATA_HTTP_CASSETTE_MODE", "replay").strip().lower()
+
+
+def _http_pool_env(name: str, *, limit: int, total_timeout: float, read_timeout: float) -> dict:
+    """Настройки именованного пула соединений (http_client.py) из HTTP_POOL_<NAME>_*."""
+    prefix = f"HTTP_POOL_{name.upper()}_"
+    return {
+        "limit": _get_int_env(prefix + "LIMIT", limit, minimum=1),
+        # 0 — без отдельного ограничения на хост.
+        "limit_per_host": _get_int_env(prefix + "LIMIT_PER_HOST", 0, minimum=0),
+        "keepalive_seconds": _get_float_env(prefix + "KEEPALIVE_SECONDS", 15.0, minimum=0.0),
+        "connect_timeout": _get_float_env(prefix + "CONNECT_TIMEOUT_SECONDS", 5.0, minimum=0.1),
+        "read_timeout": _get_float_env(prefix + "READ_TIMEOUT_SECONDS", read_timeout, minimum=0.1),
+        "total_timeout": _get_float_env(prefix + "TOTAL_TIMEOUT_SECONDS", total_timeout, minimum=0.1),
+        # 0 — не кэшировать DNS.
+        "dns_ttl_seconds": _get_int_env(prefix + "DNS_TTL_SECONDS", 300, minimum=0),
+    }
+
+
+# Пулы соединений по upstream-ам: медленный источник выбирает только свой лимит
+# соединений и не задерживает запросы к DaData. default — для остальных источников.
+HTTP_POOLS: dict[str, dict] = {
+    "dadata": _http_pool_env("dadata", limit=20, total_timeout=15.0, read_timeout=10.0),
+    "default": _http_pool_env("default", limit=10, total_timeout=15.0, read_timeout=15.0),
+}
+# OpenAI SDK держит свой пул соединений; из настроек берём только таймаут запроса.
+OPENAI_TIMEOUT_SECONDS = _get_float_env("OPENAI_TIMEOUT_SECONDS", 60.0, minimum=1.0)
+# Прогрев кэша карточек при старте из файла «горячих» ИНН/ОГРН (пусто — выключено).
+# Бот сам пополняет файл самыми частыми запросами раз в DADATA_WARMUP_SAVE_SECONDS.
+DADATA_WARMUP_FILE: str = os.getenv("DADATA_WARMUP_FILE", "").strip()
+DADATA_WARMUP_LIMIT = _get_int_env("DADATA_WARMUP_LIMIT", 300, minimum=1)
+DADATA_WARMUP_CONCURRENCY = _get_int_env("DADATA_WARMUP_CONCURRENCY", 2, minimum=1)
+DADATA_WARMUP_SAVE_SECONDS = _get_int_env("DADATA_WARMUP_SAVE_SECONDS", 600, minimum=10)
+# Период полураспада сохранённых счётчиков обращений (по времени, а не по числу сохранений).
+DADATA_WARMUP_HALF_LIFE_HOURS = _get_float_env("DADATA_WARMUP_HALF_LIFE_HOURS", 24.0, minimum=1.0)
+# Прогрев соединений с DaData при старте: столько keepalive-соединений открывается
+# в фоне до первого запроса (0 — выключено), и раз в DADATA_KEEPALIVE_PING_SECONDS
+# простаивающий пул пингуется, чтобы соединения не закрылись (0 — без пинга).
+# Период должен быть меньше HTTP_POOL_DADATA_KEEPALIVE_SECONDS.
+DADATA_PREWARM_CONNECTIONS = _get_int_env("DADATA_PREWARM_CONNECTIONS", 0, minimum=0)
+DADATA_KEEPALIVE_PING_SECONDS = _get_float_env("DADATA_KEEPALIVE_PING_SECONDS", 10.0, minimum=0.0)
+# Как часто писать в лог счётчики кэшей DaData (0 — не писать).
+DADATA_CACHE_STATS_LOG_SECONDS = _get_int_env("DADATA_CACHE_STATS_LOG_SECONDS", 0, minimum=0)
+# Как часто писать в лог состояние клиента DaData: цепь, ключи, квота, очередь (0 — не писать).
+DADATA_HEALTH_LOG_SECONDS = _get_int_env("DADATA_HEALTH_LOG_SECONDS", 300, minimum=0)
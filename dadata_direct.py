@@ -7,24 +7,255 @@ from __future__ import annotations
 import asyncio
 import html
 import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from typing import AsyncIterator, Hashable, Iterator
 
-from cache import TTLCache
-from config import DADATA_API_KEY, DADATA_FIND_URL
-from http_client import get_session
+import aiohttp
+
+import deadline
+import json_codec
+from cache import NOT_FOUND, CacheStore, RedisCacheStore, SQLiteCacheStore, TTLCache
+from company import Company, Person
+from circuit_breaker import OPEN as CIRCUIT_OPEN, CircuitBreaker
+from config import (
+    DADATA_API_KEY,
+    DADATA_API_KEYS,
+    DADATA_BATCH_CONCURRENCY,
+    DADATA_BATCH_ITEM_TIMEOUT_SECONDS,
+    DADATA_BRANCHES_CACHE_MAX_ITEMS,
+    DADATA_BRANCHES_CACHE_MAX_MB,
+    DADATA_CACHE_DB_PATH,
+    DADATA_CACHE_REDIS_URL,
+    DADATA_CACHE_STORE_COOLDOWN_SECONDS,
+    DADATA_CACHE_TTL_SECONDS,
+    DADATA_CIRCUIT_FAILURE_RATE,
+    DADATA_CIRCUIT_MIN_CALLS,
+    DADATA_CIRCUIT_RESET_SECONDS,
+    DADATA_CIRCUIT_WINDOW,
+    DADATA_DAILY_BUDGET,
+    DADATA_EGRUL_INDEX_PATH,
+    DADATA_EGRUL_MAX_AGE_DAYS,
+    DADATA_FIND_URL,
+    DADATA_KEY_SIDELINE_SECONDS,
+    DADATA_MAX_CONCURRENCY,
+    DADATA_NEGATIVE_CACHE_TTL_SECONDS,
+    DADATA_PARTY_CACHE_MAX_ITEMS,
+    DADATA_PARTY_CACHE_MAX_MB,
+    DADATA_QUOTA_DB_PATH,
+    DADATA_QUOTA_SOFT_RATIO,
+    DADATA_RATE_LIMIT_BURST,
+    DADATA_RATE_LIMIT_MAX_WAIT_SECONDS,
+    DADATA_RATE_LIMIT_MIN_RPS,
+    DADATA_RATE_LIMIT_RPS,
+    DADATA_RETRY_ATTEMPTS,
+    DADATA_RETRY_BASE_DELAY_SECONDS,
+    DADATA_RETRY_MAX_DELAY_SECONDS,
+    DADATA_STALE_GRACE_SECONDS,
+    DADATA_SUGGEST_CACHE_MAX_ITEMS,
+    DADATA_SUGGEST_URL,
+)
+from egrul_index import EgrulIndex
+from fair_scheduler import BULK, INTERACTIVE, FairScheduler
+from http_client import get_session, pool_stats, request_timeout
+from key_pool import ApiKey, KeyPool
 from party_state import format_company_state
+from quota import QUOTA_OK, QUOTA_SOFT, QuotaLedger
+from rate_limit import parse_retry_after
 
 logger = logging.getLogger(__name__)
 
-# Чтобы экономить лимиты DaData: кэш ответов на 30 минут.
-_PARTY_CACHE = TTLCache(ttl_seconds=30 * 60, max_items=5000)
-_BRANCHES_CACHE = TTLCache(ttl_seconds=30 * 60, max_items=2000)
-_DADATA_SEM = asyncio.Semaphore(5)
+
+class DadataThrottledError(Exception):
+    """DaData ограничила частоту запросов (429) — это не «не найдено», а «повторите позже»."""
+
+    def __init__(self, retry_after: float | None = None) -> None:
+        super().__init__(f"DaData rate limit, retry after {retry_after}")
+        self.retry_after = retry_after
+
+
+class DadataQuotaExceededError(DadataThrottledError):
+    """Суточный бюджет запросов израсходован (или почти — для фоновых/пакетных запросов)."""
+
+    def __init__(self) -> None:
+        super().__init__(None)
+
+
+class DadataDeadlineExceededError(DadataThrottledError):
+    """Срок обработки запроса (``deadline``) истёк раньше, чем DaData успела ответить:
+    запрос брошен, чтобы не занимать слот и квоту впустую."""
+
+    def __init__(self) -> None:
+        super().__init__(None)
+
+
+class DadataUnavailableError(Exception):
+    """DaData не ответила: цепь разомкнута, повторы исчерпаны или ответ не разобран.
+    Это не «не найдено», а «повторите позже»; результат не кэшируется."""
+
+
+# Результат пакетной проверки для идентификаторов, упёршихся в лимит DaData.
+THROTTLED = object()
+# Результат пакетной проверки для идентификаторов, по которым DaData не ответила.
+UNAVAILABLE = object()
+
+
+def _cache_store(namespace: str, **codec) -> CacheStore | None:
+    """Внешний уровень кэша: общий Redis (DADATA_CACHE_REDIS_URL) или SQLite-файл
+    (DADATA_CACHE_DB_PATH). Без настроек — только память."""
+    if DADATA_CACHE_REDIS_URL:
+        try:
+            return RedisCacheStore.from_url(DADATA_CACHE_REDIS_URL, namespace, **codec)
+        except Exception as exc:
+            logger.warning("Общий кэш Redis недоступен, работаем без него: %s", exc)
+    if not DADATA_CACHE_DB_PATH:
+        return None
+    try:
+        return SQLiteCacheStore(DADATA_CACHE_DB_PATH, namespace, **codec)
+    except Exception as exc:
+        logger.warning("Дисковый кэш %s недоступен, работаем только в памяти: %s", DADATA_CACHE_DB_PATH, exc)
+        return None
+
+
+def _quota_ledger(key_pool: KeyPool) -> QuotaLedger:
+    settings = {
+        "daily_budget": DADATA_DAILY_BUDGET,
+        "soft_ratio": DADATA_QUOTA_SOFT_RATIO,
+        "key_ids": [key.key_id for key in key_pool.keys],
+    }
+    try:
+        return QuotaLedger(DADATA_QUOTA_DB_PATH, **settings)
+    except Exception as exc:
+        logger.warning("Счётчик квоты DaData не сохраняется между рестартами (%s): %s", DADATA_QUOTA_DB_PATH, exc)
+        return QuotaLedger(**settings)
+
+
+def _egrul_index() -> EgrulIndex | None:
+    if not DADATA_EGRUL_INDEX_PATH:
+        return None
+    try:
+        return EgrulIndex(DADATA_EGRUL_INDEX_PATH)
+    except (OSError, ValueError) as exc:
+        logger.warning("Офлайн-индекс ЕГРЮЛ %s недоступен, карточки только из DaData: %s", DADATA_EGRUL_INDEX_PATH, exc)
+        return None
+
+
+# Чтобы экономить лимиты DaData: кэш ответов (по умолчанию на 30 минут).
+# Карточки хранятся разобранными (Company); на диск пишется исходный JSON ответа.
+_PARTY_CACHE = TTLCache(
+    ttl_seconds=DADATA_CACHE_TTL_SECONDS,
+    max_items=DADATA_PARTY_CACHE_MAX_ITEMS,
+    store=_cache_store("party", dumps=Company.to_json, loads=Company.from_json),
+    stale_seconds=DADATA_STALE_GRACE_SECONDS,
+    name="party",
+    store_cooldown=DADATA_CACHE_STORE_COOLDOWN_SECONDS,
+    max_bytes=DADATA_PARTY_CACHE_MAX_MB * 1024 * 1024,
+)
+_BRANCHES_CACHE = TTLCache(
+    ttl_seconds=DADATA_CACHE_TTL_SECONDS,
+    max_items=DADATA_BRANCHES_CACHE_MAX_ITEMS,
+    store=_cache_store("branches"),
+    name="branches",
+    store_cooldown=DADATA_CACHE_STORE_COOLDOWN_SECONDS,
+    max_bytes=DADATA_BRANCHES_CACHE_MAX_MB * 1024 * 1024,
+)
+# Поиск по названию: нормализованный запрос -> {"items": подсказки, "complete": bool}.
+_SUGGEST_CACHE = TTLCache(
+    ttl_seconds=DADATA_CACHE_TTL_SECONDS,
+    max_items=DADATA_SUGGEST_CACHE_MAX_ITEMS,
+    store=_cache_store("suggest"),
+    name="suggest",
+    store_cooldown=DADATA_CACHE_STORE_COOLDOWN_SECONDS,
+)
+# Слоты одновременных запросов делятся между чатами по кругу, одиночные проверки — вне очереди.
+_DADATA_SCHEDULER = FairScheduler(DADATA_MAX_CONCURRENCY)
+# Кто и с каким приоритетом запрашивает DaData: (chat_id, INTERACTIVE|BULK).
+# Через contextvars значение доходит до HTTP-вызова, в том числе в задачи single-flight.
+_REQUEST_SCOPE: ContextVar[tuple[Hashable, int]] = ContextVar("dadata_request_scope", default=(None, INTERACTIVE))
+# Ключи DaData: у каждого свой лимит частоты и квота, запрос идёт с наименее загруженным.
+_KEY_POOL = KeyPool.from_tokens(
+    DADATA_API_KEYS,
+    rate=DADATA_RATE_LIMIT_RPS,
+    burst=DADATA_RATE_LIMIT_BURST,
+    min_rate=DADATA_RATE_LIMIT_MIN_RPS,
+    sideline_seconds=DADATA_KEY_SIDELINE_SECONDS,
+)
+_CIRCUIT = CircuitBreaker(
+    failure_rate=DADATA_CIRCUIT_FAILURE_RATE,
+    window=DADATA_CIRCUIT_WINDOW,
+    min_calls=DADATA_CIRCUIT_MIN_CALLS,
+    reset_timeout=DADATA_CIRCUIT_RESET_SECONDS,
+)
+_QUOTA = _quota_ledger(_KEY_POOL)
+_EGRUL = _egrul_index()
+# Попадания в офлайн-индекс: hits (свежая запись), stale (устарела), misses.
+_EGRUL_STATS: Counter[str] = Counter()
+# Фоновые обновления устаревших карточек: не больше одного на ключ.
+_REFRESH_TASKS: dict[str, asyncio.Task] = {}
+# Single-flight: одинаковые одновременные запросы (по _cache_key) ждут одну задачу.
+_INFLIGHT: dict[str, asyncio.Task] = {}
+
+# findById/party отдаёт не больше 300 записей и не поддерживает смещение.
+_DADATA_MAX_COUNT = 300
+# Сколько филиалов бот может показать: дальше 300-й записи DaData список не отдаёт.
+BRANCHES_MAX_COUNT = _DADATA_MAX_COUNT
+# Филиалов на одном экране бота.
+BRANCHES_PAGE_SIZE = 10
+# suggest/party отдаёт не больше 20 подсказок.
+_SUGGEST_MAX_COUNT = 20
+# Результатов поиска на одном экране и минимальная длина запроса (короче — слишком
+# много совпадений, квоту не тратим).
+SEARCH_PAGE_SIZE = 5
+SEARCH_MIN_LENGTH = 3
+
+
+async def _join(task: asyncio.Future):
+    """Дождаться общей задачи single-flight, но не дольше своего срока.
+
+    ``shield()`` не даёт отмене одного ожидающего оборвать запрос для остальных.
+    Сама задача работает со сроком того, кто её запустил.
+    """
+    timeout = deadline.clamp(None)
+    if timeout is None:
+        return await asyncio.shield(task)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        raise DadataDeadlineExceededError() from None
+
+
+@contextmanager
+def request_scope(client_id: Hashable, priority: int = INTERACTIVE) -> Iterator[None]:
+    """Запросы к DaData внутри блока идут от имени ``client_id`` (обычно chat_id)
+    с приоритетом ``priority`` — по ним планировщик делит слоты между чатами."""
+    token = _REQUEST_SCOPE.set((client_id, priority))
+    try:
+        yield
+    finally:
+        _REQUEST_SCOPE.reset(token)
+
+
+def _mark_retrieved(task: asyncio.Future) -> None:
+    """Забрать исключение общей задачи: все ожидающие могли уйти по своему сроку,
+    и тогда asyncio пишет в лог «Task exception was never retrieved»."""
+    if not task.cancelled():
+        task.exception()
+
 
 def _cache_key(query: str, branch_type: str | None = None) -> str:
     return f"{query}:{branch_type or 'ALL'}"
 
 
+def _entity_ids(*ids: object) -> list[str]:
+    """ИНН/ОГРН из ответа DaData, под которыми ту же запись можно найти повторно."""
+    return [str(value) for value in ids if value]
+
+
 async def fetch_companies(query: str, branch_type: str | None = None, count: int = 20) -> list[dict]:
     """Запрашивает список компаний/филиалов по ИНН/ОГРН через DaData API."""
     if not DADATA_API_KEY:
@@ -37,71 +268,426 @@ async def fetch_companies(query: str, branch_type: str | None = None, count: int
     # - для филиалов (BRANCH) — _BRANCHES_CACHE по cache_key
     # - для головной организации (MAIN) — _PARTY_CACHE по простому ключу query (совместимо с fetch_company)
     # - прочие случаи — сохраняем в _BRANCHES_CACHE по cache_key
-    if branch_type == "BRANCH":
-        cached = _BRANCHES_CACHE.get(cache_key)
-        if cached is not None:
-            return cached
-    elif branch_type == "MAIN":
-        cached = _PARTY_CACHE.get(query)
+    # NOT_FOUND в кэше означает «DaData уже ответила пусто» — повторно не спрашиваем.
+    if branch_type == "MAIN":
+        cached = await _PARTY_CACHE.aget(query)
+        if cached is NOT_FOUND:
+            return []
         if cached is not None:
-            # fetch_company ожидает единичный элемент, но здесь возвращаем список
-            # если в кэше хранится одиночный элемент — приводим его к списку
-            return [cached] if cached is not None and not isinstance(cached, list) else (cached or [])
+            # В _PARTY_CACHE лежит разобранная карточка; списочный API отдаёт сырой ответ.
+            return [cached.raw]
     else:
-        cached = _BRANCHES_CACHE.get(cache_key)
+        cached = await _BRANCHES_CACHE.aget(cache_key)
+        if cached is NOT_FOUND:
+            return []
         if cached is not None:
             return cached
+    return await _fetch_from_dadata(query, branch_type, count)
+
+
+async def _fetch_from_dadata(query: str, branch_type: str | None, count: int) -> list[dict]:
+    """Запрос к DaData в обход кэша (кэш вызывающий уже проверил) с записью результата."""
+    cache_key = _cache_key(query, branch_type)
+    # Первый вызывающий запускает запрос, остальные ждут ту же задачу.
+    task = _INFLIGHT.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_load_companies(query, branch_type, count, cache_key))
+        task.add_done_callback(_mark_retrieved)
+        _INFLIGHT[cache_key] = task
+    return await _join(task)
+
+
+async def _load_companies(query: str, branch_type: str | None, count: int, cache_key: str) -> list[dict]:
+    """Запрос к DaData и запись результата в кэш (выполняется одной задачей на ключ)."""
+    try:
+        return await _request_companies(query, branch_type, count, cache_key)
+    finally:
+        _INFLIGHT.pop(cache_key, None)
+
+
+async def _request_companies(query: str, branch_type: str | None, count: int, cache_key: str) -> list[dict]:
+    suggestions = await _request_suggestions(query, branch_type, count)
+    if suggestions is None:
+        return []
 
+    # Записываем в соответствующий кэш; пустой ответ — в негативный кэш с коротким TTL.
+    # Ошибки (не-200, сеть) сюда не доходят и не кэшируются.
+    if branch_type == "MAIN":
+        # Для MAIN сохраняем конкретно первый элемент в _PARTY_CACHE — совместимо с fetch_company
+        if suggestions:
+            company = Company.from_suggestion(suggestions[0])
+            _PARTY_CACHE.set(query, company)
+            for alias in _entity_ids(company.inn, company.ogrn):
+                _PARTY_CACHE.alias(alias, query)
+        else:
+            _PARTY_CACHE.set(query, NOT_FOUND, ttl_seconds=DADATA_NEGATIVE_CACHE_TTL_SECONDS)
+    elif suggestions:
+        _BRANCHES_CACHE.set(cache_key, suggestions)
+        # У всех филиалов ИНН и ОГРН головной организации — список один и тот же.
+        first = suggestions[0] if isinstance(suggestions[0], dict) else {}
+        data = first.get("data") or {}
+        for alias in _entity_ids(data.get("inn"), data.get("ogrn")):
+            _BRANCHES_CACHE.alias(_cache_key(alias, branch_type), cache_key)
+    else:
+        _BRANCHES_CACHE.set(cache_key, NOT_FOUND, ttl_seconds=DADATA_NEGATIVE_CACHE_TTL_SECONDS)
+
+    return suggestions
+
+
+def _quota_allows(key: ApiKey, bulk: bool) -> bool:
+    state = _QUOTA.state(key.key_id)
+    return state == QUOTA_OK or (state == QUOTA_SOFT and not bulk)
+
+
+def _quota_state() -> str:
+    """Режим квоты по самому свободному ключу пула."""
+    return _QUOTA.pool_state(key.key_id for key in _KEY_POOL.keys)
+
+
+async def _request_suggestions(
+    query: str, branch_type: str | None, count: int, *, url: str = DADATA_FIND_URL
+) -> list[dict] | None:
+    """Запрос в findById/party (или suggest/party) с лимитами, повторами и circuit breaker.
+
+    ``None`` — DaData отклонила запрос (результат нельзя кэшировать). После 429
+    запрос сразу повторяется с другим ключом; ``DadataThrottledError`` — лимит
+    частоты у всех подходящих ключей; разомкнутая цепь или исчерпанные повторы —
+    ``DadataUnavailableError``. Срок обработки (``deadline``) ограничивает ожидание
+    лимита частоты, очереди слотов, паузы между повторами и таймаут HTTP; если
+    запрос к сроку не успевает — ``DadataDeadlineExceededError``.
+    """
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json",
-        "Authorization": f"Token {DADATA_API_KEY}",
     }
-    payload: dict[str, str | int] = {"query": query, "count": max(1, min(count, 300))}
+    payload: dict[str, str | int] = {"query": query, "count": max(1, min(count, _DADATA_MAX_COUNT))}
     if branch_type:
         payload["branch_type"] = branch_type
 
+    bulk = _REQUEST_SCOPE.get()[1] == BULK
+    attempts = max(1, DADATA_RETRY_ATTEMPTS)
+    attempt = 1
+    # Ключи, получившие 429 в этом запросе, и последний Retry-After.
+    throttled: set[ApiKey] = set()
+    retry_after: float | None = None
+    while True:
+        if deadline.expired():
+            logger.warning("Запрос к DaData для %s брошен: истёк срок обработки", query)
+            raise DadataDeadlineExceededError()
+        key = _KEY_POOL.pick(lambda key: key not in throttled and _quota_allows(key, bulk))
+        if key is None:
+            if throttled:
+                logger.warning("Запрос к DaData для %s отклонён: лимит частоты по всем ключам", query)
+                raise DadataThrottledError(retry_after)
+            if not _KEY_POOL.available():
+                # Все ключи выведены из ротации после 401/403 — квота тут ни при чём.
+                reasons = sorted({key.sideline_reason for key in _KEY_POOL.keys})
+                logger.error("Запрос к DaData для %s не выполнен: DaData отклонила все ключи (%s)", query, reasons)
+                raise DadataUnavailableError("all keys rejected")
+            logger.warning("Запрос к DaData для %s пропущен: квота (%s)", query, _quota_state())
+            raise DadataQuotaExceededError()
+        # Ждём очереди до захвата семафора, чтобы не занимать слот впустую.
+        # Выбран ключ с самой короткой очередью — если и он не успевает, не успеют все.
+        max_wait = deadline.clamp(DADATA_RATE_LIMIT_MAX_WAIT_SECONDS)
+        if not await key.limiter.acquire(max_wait=max_wait):
+            if max_wait < DADATA_RATE_LIMIT_MAX_WAIT_SECONDS:
+                logger.warning("Запрос к DaData для %s брошен: очередь лимита длиннее срока обработки", query)
+                raise DadataDeadlineExceededError()
+            logger.warning("Запрос к DaData для %s отклонён: превышен лимит частоты", query)
+            raise DadataThrottledError()
+        if not _CIRCUIT.allow_request():
+            logger.warning("DaData недоступна (circuit %s), запрос %s пропущен", _CIRCUIT.state, query)
+            raise DadataUnavailableError(f"circuit {_CIRCUIT.state}")
+
+        try:
+            data = await _post_dadata(url, payload, {**headers, "Authorization": key.auth_header}, key)
+        except DadataDeadlineExceededError:
+            # Не дождались слота или ответа до своего срока — оценивать upstream не по чему:
+            # иначе при всплеске нагрузки наши же сроки разомкнули бы цепь для всех.
+            _CIRCUIT.release()
+            logger.warning("Запрос к DaData для %s брошен: не уложился в срок обработки", query)
+            raise
+        except DadataThrottledError as exc:
+            # Upstream жив, просто ограничивает частоту — это не сбой для circuit breaker.
+            # Ключ уже на паузе в своём лимитере — сразу повторяем с другим, попытка не тратится.
+            _CIRCUIT.record_success()
+            throttled.add(key)
+            retry_after = exc.retry_after
+            continue
+        except _DadataKeyRejectedError:
+            # Ключ выведен из ротации — сразу повторяем с другим, попытка не тратится.
+            _CIRCUIT.record_success()
+            continue
+        except _RETRYABLE_ERRORS as exc:
+            _CIRCUIT.record_failure()
+            if attempt >= attempts:
+                logger.error("DaData недоступна после %s попыток: %r", attempts, exc)
+                raise DadataUnavailableError(f"{attempts} attempts failed: {exc!r}") from exc
+            delay = _retry_delay(attempt)
+            left = deadline.remaining()
+            if left is not None and delay >= left:
+                logger.warning("Временная ошибка DaData (%r), на повтор не хватает срока обработки", exc)
+                raise DadataDeadlineExceededError() from exc
+            attempt += 1
+            logger.warning("Временная ошибка DaData (%r), попытка %s/%s через %.2f с", exc, attempt, attempts, delay)
+            await asyncio.sleep(delay)
+            continue
+        except Exception as exc:
+            _CIRCUIT.record_failure()
+            logger.exception("Ошибка запроса к DaData: %s", exc)
+            raise DadataUnavailableError(repr(exc)) from exc
+
+        _CIRCUIT.record_success()
+        if data is None:
+            return None
+        return data.get("suggestions", []) or []
+
+
+class _DadataServerError(Exception):
+    """HTTP 5xx от DaData — временная ошибка, запрос можно повторить."""
+
+
+class _DadataKeyRejectedError(Exception):
+    """DaData не приняла ключ (401/403), и он выведен из ротации — запрос можно повторить с другим."""
+
+
+_RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, _DadataServerError)
+_ERROR_BODY_LIMIT = 500
+_KEY_REJECTED_STATUSES = (401, 403)
+_DEADLINE_TIMER_SLACK = 0.01
+
+
+def _deadline_hit() -> bool:
+    """Срок обработки истёк (с запасом: таймер может сработать чуть раньше срока)."""
+    left = deadline.remaining()
+    return left is not None and left <= _DEADLINE_TIMER_SLACK
+
+
+async def _post_dadata(url: str, payload: dict, headers: dict, key: ApiKey) -> dict | None:
+    """Один POST в DaData. ``None`` — неповторяемая ошибка HTTP (уже залогирована)."""
+    client_id, priority = _REQUEST_SCOPE.get()
+    acquired = False
     try:
-        async with _DADATA_SEM:
-            session = get_session()
-            async with session.post(DADATA_FIND_URL, json=payload, headers=headers) as resp:
-                if resp.status != 200:
-                    body = await resp.text()
-                    logger.error("DaData HTTP %s: %s", resp.status, body[:500])
-                    return []
-                data = await resp.json()
-    except Exception as exc:
-        logger.exception("Ошибка запроса к DaData: %s", exc)
-        return []
+        async with _DADATA_SCHEDULER.slot(client_id, priority, timeout=deadline.clamp(None)):
+            acquired = True
+            body = await _send_dadata(url, payload, headers, key)
+    except asyncio.TimeoutError:
+        # Не дождались слота или сработал таймаут HTTP, урезанный до срока обработки, —
+        # это наш срок, а не сбой DaData.
+        if not acquired or _deadline_hit():
+            raise DadataDeadlineExceededError() from None
+        raise
+    if body is None:
+        return None
+    key.limiter.on_success()
+    # Разбираем из байтов уже после освобождения слота планировщика.
+    return json_codec.loads(body)
 
-    suggestions = data.get("suggestions", []) or []
 
-    # Записываем в соответствующий кэш
-    if branch_type == "BRANCH":
-        _BRANCHES_CACHE.set(cache_key, suggestions)
-    elif branch_type == "MAIN":
-        # Для MAIN сохраняем конкретно первый элемент в _PARTY_CACHE — совместимо с fetch_company
-        _PARTY_CACHE.set(query, suggestions[0] if suggestions else None)
-    else:
-        _BRANCHES_CACHE.set(cache_key, suggestions)
+async def _send_dadata(url: str, payload: dict, headers: dict, key: ApiKey) -> bytes | None:
+    """HTTP-часть ``_post_dadata``: тело ответа 200 или ``None`` (ошибка уже залогирована)."""
+    session = get_session("dadata")
+    # Таймаут HTTP не дольше оставшегося срока обработки.
+    timeout = request_timeout("dadata", deadline.remaining())
+    options = {"timeout": timeout} if timeout is not None else {}
+    # DaData списывает квоту за каждый запрос, в том числе неудачный.
+    _QUOTA.record(key.key_id)
+    with _KEY_POOL.use(key):
+        async with session.post(url, json=payload, headers=headers, **options) as resp:
+            if resp.status == 429:
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                _KEY_POOL.on_throttled(key, retry_after)
+                logger.warning(
+                    "DaData HTTP 429 по ключу %s, Retry-After=%s, лимит снижен до %.2f rps",
+                    key.key_id,
+                    retry_after,
+                    key.limiter.rate,
+                )
+                raise DadataThrottledError(retry_after)
+            if resp.status != 200:
+                # Для лога хватает начала тела — не читаем целиком большой ответ с ошибкой.
+                body = await resp.content.read(_ERROR_BODY_LIMIT)
+                logger.error("DaData HTTP %s: %s", resp.status, body.decode("utf-8", "replace"))
+                if resp.status >= 500:
+                    raise _DadataServerError(f"HTTP {resp.status}")
+                if resp.status in _KEY_REJECTED_STATUSES and _KEY_POOL.sideline(key, f"HTTP {resp.status}"):
+                    raise _DadataKeyRejectedError(f"HTTP {resp.status}")
+                return None
+            return await resp.read()
 
-    return suggestions
+
+def _retry_delay(attempt: int) -> float:
+    """Экспоненциальная задержка с полным джиттером (attempt начинается с 1)."""
+    ceiling = min(DADATA_RETRY_MAX_DELAY_SECONDS, DADATA_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def cache_stats() -> dict:
+    """Счётчики кэшей DaData (попадания, вытеснения, объём) по имени кэша."""
+    return {cache.name: cache.stats() for cache in (_PARTY_CACHE, _BRANCHES_CACHE, _SUGGEST_CACHE)}
 
 
-async def fetch_company(query: str) -> dict | None:
+def dadata_health() -> dict:
+    """Состояние клиента DaData для мониторинга: circuit breaker, лимиты и квота по ключам,
+    очереди, кэши, пул соединений."""
+    keys = _KEY_POOL.snapshot()
+    for key in keys:
+        key["quota_used"] = _QUOTA.used(key["key_id"])
+        key["quota_state"] = _QUOTA.state(key["key_id"])
+    return {
+        "circuit": _CIRCUIT.snapshot(),
+        "rate_limit_rps": sum(key["rate_limit_rps"] for key in keys),
+        "keys": keys,
+        "scheduler": _DADATA_SCHEDULER.snapshot(),
+        "caches": cache_stats(),
+        "quota": _QUOTA.snapshot(),
+        "egrul": _egrul_snapshot(),
+        "http_pool": pool_stats().get("dadata"),
+    }
+
+
+def _egrul_snapshot() -> dict | None:
+    if _EGRUL is None:
+        return None
+    return {"entries": len(_EGRUL), "built_at": _EGRUL.built_at, **_EGRUL_STATS}
+
+
+async def fetch_company(query: str, *, store: bool = True) -> Company | None:
     """Запрашивает одну компанию по ИНН/ОГРН через DaData API.
 
     По умолчанию запрашивает только головную организацию (branch_type=MAIN),
-    чтобы пользователь сразу получал одну карточку.
+    чтобы пользователь сразу получал одну карточку. При лимите DaData
+    поднимает ``DadataThrottledError``, если DaData не отвечает и устаревшей
+    карточки в кэше нет — ``DadataUnavailableError``.
+
+    ``store=False`` — внешний уровень кэша вызывающий уже проверил (пакетная
+    проверка): смотрим только память и при промахе сразу идём в DaData.
     """
-    cached = _PARTY_CACHE.get(query)
+    if store:
+        cached, is_stale = await _PARTY_CACHE.aget_stale(query)
+    else:
+        cached, is_stale = _PARTY_CACHE.get_stale(query, store=False)
+    if is_stale and _CIRCUIT.state != CIRCUIT_OPEN and _quota_state() == QUOTA_OK:
+        # Stale-while-revalidate: отдаём устаревшую карточку сразу, обновляем в фоне.
+        # При разомкнутой цепи или на исходе квоты просто отдаём устаревшую запись.
+        _schedule_refresh(query)
+    if cached is NOT_FOUND:
+        return None
     if cached is not None:
         return cached
 
-    suggestions = await fetch_companies(query=query, branch_type="MAIN", count=1)
-    item = suggestions[0] if suggestions else None
-    _PARTY_CACHE.set(query, item)
-    return item
+    if not DADATA_API_KEY:
+        logger.warning("Запрос к DaData пропущен: не задан DADATA_API_KEY|DADATA_TOKEN")
+        return None
+    # Запрос сам заполняет _PARTY_CACHE (включая негативный результат).
+    suggestions = await _fetch_from_dadata(query, "MAIN", 1)
+    if not suggestions:
+        return None
+    company = _PARTY_CACHE.get(query, store=False)
+    return company if isinstance(company, Company) else Company.from_suggestion(suggestions[0])
+
+
+async def resolve_company(query: str, *, store: bool = True) -> Company | None:
+    """Карточка по ИНН/ОГРН: из офлайн-индекса ЕГРЮЛ, если запись там есть и не
+    устарела, иначе — ``fetch_company()`` (``store`` передаётся ему).
+
+    Устаревшая запись индекса отдаётся, если DaData не ответила (лимит, квота, сбой).
+    """
+    entry = _EGRUL.get(query) if _EGRUL is not None else None
+    if entry is None:
+        _EGRUL_STATS["misses"] += 1
+        return await fetch_company(query, store=store)
+    suggestion, captured_at = entry
+    indexed = Company.from_suggestion(suggestion)
+    # Свежесть — по дате выгрузки, а не по дате последнего изменения в реестре.
+    if time.time() - captured_at <= DADATA_EGRUL_MAX_AGE_DAYS * 86400:
+        _EGRUL_STATS["hits"] += 1
+        return indexed
+    _EGRUL_STATS["stale"] += 1
+    try:
+        company = await fetch_company(query, store=store)
+    except (DadataThrottledError, DadataUnavailableError):
+        return indexed
+    return company if company is not None else indexed
+
+
+async def fetch_companies_many(
+    queries: list[str],
+    *,
+    concurrency: int = DADATA_BATCH_CONCURRENCY,
+    item_timeout: float = DADATA_BATCH_ITEM_TIMEOUT_SECONDS,
+    client_id: Hashable = None,
+    priority: int | None = None,
+) -> list[Company | object | None]:
+    """Параллельно запрашивает карточки по списку ИНН/ОГРН.
+
+    Повторяющиеся идентификаторы запрашиваются один раз, результаты возвращаются
+    в порядке входного списка. ``None`` — DaData ответила, что такой организации
+    нет. Лимит DaData или истёкший срок обработки (``deadline``) дают ``THROTTLED``;
+    недоступность DaData, таймаут ``item_timeout`` и прочие ошибки — ``UNAVAILABLE``.
+    Сбой по одному элементу не прерывает остальные.
+    ``item_timeout`` 0 — без отдельного таймаута (хватает срока обработки и таймаутов HTTP).
+    Карточки из офлайн-индекса ЕГРЮЛ (если он настроен) DaData не стоят.
+
+    ``client_id`` (обычно chat_id) нужен для справедливого распределения запросов
+    между чатами; одиночная проверка идёт с интерактивным приоритетом, список — с пакетным
+    (``priority`` задаёт его явно).
+    """
+    unique = list(dict.fromkeys(queries))
+    # Сначала весь список одним запросом к кэшу (для общего Redis — один round-trip),
+    # промахи идут в DaData без повторных обращений к внешнему уровню.
+    cached = await _PARTY_CACHE.aget_many(unique)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    if priority is None:
+        priority = INTERACTIVE if len(unique) == 1 else BULK
+
+    async def _one(query: str) -> Company | object | None:
+        hit = cached.get(query)
+        if hit is not None:
+            return hit if isinstance(hit, Company) else None
+        async with sem:
+            try:
+                return await asyncio.wait_for(
+                    resolve_company(query, store=False), timeout=deadline.clamp(item_timeout or None)
+                )
+            except DadataThrottledError:
+                return THROTTLED
+            except DadataUnavailableError:
+                return UNAVAILABLE
+            except asyncio.TimeoutError:
+                if deadline.expired():
+                    # Не успели к сроку обработки — это перегрузка, а не «не найдено».
+                    return THROTTLED
+                logger.warning("Таймаут запроса к DaData для %s (%.1f с)", query, item_timeout)
+            except Exception as exc:
+                logger.exception("Ошибка пакетного запроса к DaData для %s: %s", query, exc)
+            # Ответа DaData нет — это не «не найдено».
+            return UNAVAILABLE
+
+    with request_scope(client_id, priority):
+        results = await asyncio.gather(*(_one(query) for query in unique))
+    by_query = dict(zip(unique, results))
+    return [by_query[query] for query in queries]
+
+
+def _schedule_refresh(query: str) -> None:
+    task = _REFRESH_TASKS.get(query)
+    if task is not None and not task.done():
+        return
+    task = asyncio.create_task(_refresh_company(query))
+    _REFRESH_TASKS[query] = task
+    task.add_done_callback(lambda _t: _REFRESH_TASKS.pop(query, None))
+
+
+async def _refresh_company(query: str) -> None:
+    # Запрос в обход кэша перезапишет устаревшую запись. При ошибке она остаётся
+    # до конца окна. Срок обработчика, запустившего обновление, на фоновую задачу
+    # не распространяется.
+    try:
+        with deadline.detached():
+            await _fetch_from_dadata(query, "MAIN", 1)
+    except Exception as exc:
+        logger.warning("Фоновое обновление карточки %s не удалось: %s", query, exc)
 
 
 async def fetch_branches(query: str, count: int = 20) -> list[dict]:
@@ -109,6 +695,197 @@ async def fetch_branches(query: str, count: int = 20) -> list[dict]:
     return await fetch_companies(query=query, branch_type="BRANCH", count=count)
 
 
+def _branches_page_key(query: str, page: int, page_size: int) -> str:
+    return f"{query}:BRANCH:{page_size}x{page}"
+
+
+async def fetch_branches_page(
+    query: str, page: int = 0, page_size: int = BRANCHES_PAGE_SIZE
+) -> tuple[list[dict], bool]:
+    """Страница филиалов (с нуля) и признак, что за ней есть ещё.
+
+    Каждая страница кэшируется отдельно, поэтому экран N не требует загрузки
+    филиалов после него. Дальше ``BRANCHES_MAX_COUNT`` записей DaData не отдаёт:
+    на этой границе ``has_more`` ложно, даже если филиалов больше, — сколько их на
+    самом деле, знает ``branch_count`` карточки (см. ``format_branches_list``).
+    """
+    if not DADATA_API_KEY:
+        logger.warning("Запрос к DaData пропущен: не задан DADATA_API_KEY|DADATA_TOKEN")
+        return [], False
+
+    key = _branches_page_key(query, page, page_size)
+    cached = await _BRANCHES_CACHE.aget(key)
+    if cached is NOT_FOUND:
+        return [], False
+    if cached is not None:
+        return cached["items"], cached["has_more"]
+
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_branches_page(query, page, page_size, key))
+        task.add_done_callback(_mark_retrieved)
+        _INFLIGHT[key] = task
+    return await _join(task)
+
+
+async def _load_branches_page(query: str, page: int, page_size: int, key: str) -> tuple[list[dict], bool]:
+    try:
+        # Смещения в findById нет: запрашиваем первые (page + 1) страниц и ещё одну
+        # запись — по ней видно, есть ли следующая страница. Попутно кэшируем и
+        # предыдущие страницы, чтобы «назад» не ходил в DaData.
+        end = (page + 1) * page_size
+        suggestions = await _request_suggestions(query, "BRANCH", end + 1)
+        if suggestions is None:
+            return [], False
+        for index in range(page + 1):
+            items = suggestions[index * page_size : (index + 1) * page_size]
+            if not items:
+                break
+            has_more = len(suggestions) > (index + 1) * page_size
+            _BRANCHES_CACHE.set(_branches_page_key(query, index, page_size), {"items": items, "has_more": has_more})
+        items = suggestions[page * page_size : end]
+        if not items:
+            _BRANCHES_CACHE.set(key, NOT_FOUND, ttl_seconds=DADATA_NEGATIVE_CACHE_TTL_SECONDS)
+        return items, len(suggestions) > end
+    finally:
+        _INFLIGHT.pop(key, None)
+
+
+async def iter_branches(query: str, page_size: int = BRANCHES_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+    """Лениво перебирает филиалы постранично: следующая страница запрашивается,
+    только когда потребитель до неё дошёл."""
+    page = 0
+    while True:
+        items, has_more = await fetch_branches_page(query, page, page_size)
+        if items:
+            yield items
+        if not has_more:
+            return
+        page += 1
+
+
+def normalize_search_query(text: str) -> str:
+    """Запрос поиска без регистра, пунктуации и лишних пробелов — ключ кэша."""
+    return " ".join(re.sub(r"[^\w]+", " ", text.casefold().replace("ё", "е")).split())
+
+
+def _search_words(item: dict) -> list[str]:
+    data = item.get("data") or {}
+    name = data.get("name") or {}
+    fields = (
+        item.get("value"),
+        name.get("full_with_opf"),
+        name.get("short_with_opf"),
+        data.get("inn"),
+        data.get("ogrn"),
+        (data.get("address") or {}).get("value"),
+        (data.get("management") or {}).get("name"),
+    )
+    return normalize_search_query(" ".join(str(value) for value in fields if value)).split()
+
+
+def _matches_search(item: dict, words: list[str]) -> bool:
+    """Каждое слово запроса — начало какого-то слова в названии, реквизитах или адресе."""
+    haystack = _search_words(item)
+    return all(any(candidate.startswith(word) for candidate in haystack) for word in words)
+
+
+def _search_prefixes(query: str) -> list[str]:
+    """Более короткие запросы, ответ на которые может покрыть ``query`` (от длинных к коротким)."""
+    prefixes = []
+    for end in range(len(query) - 1, SEARCH_MIN_LENGTH - 1, -1):
+        prefix = query[:end].rstrip()
+        if prefix != query and prefix not in prefixes:
+            prefixes.append(prefix)
+    return prefixes
+
+
+def _search_from_prefix(query: str, cached: dict[str, object]) -> list[dict] | None:
+    """Результаты для ``query`` из кэша более короткого запроса, если тот полный.
+
+    ``cached`` — ответ ``get_many`` по ``_search_prefixes(query)``.
+    Всё, что находится по «ромашка м», находится и по «ромашка», поэтому полный
+    (меньше лимита подсказок) ответ на префикс достаточно отфильтровать. Ответ,
+    упёршийся в лимит, мог потерять нужные записи — тогда ``None`` и запрос в DaData.
+    Фильтр приближает поиск DaData (без исправления опечаток).
+    """
+    words = query.split()
+    for prefix in _search_prefixes(query):
+        hit = cached.get(prefix)
+        if hit is None:
+            continue
+        if hit is NOT_FOUND:
+            return []
+        if not hit["complete"]:
+            # У ещё более коротких префиксов совпадений не меньше — они тоже неполные.
+            return None
+        return [item for item in hit["items"] if _matches_search(item, words)]
+    return None
+
+
+def _store_search(query: str, items: list[dict], complete: bool) -> None:
+    if items:
+        _SUGGEST_CACHE.set(query, {"items": items, "complete": complete})
+    else:
+        _SUGGEST_CACHE.set(query, NOT_FOUND, ttl_seconds=DADATA_NEGATIVE_CACHE_TTL_SECONDS)
+
+
+async def search_companies(text: str) -> list[dict]:
+    """Организации и ИП по названию (а также ИНН, адресу, ФИО руководителя) через
+    suggest/party — до 20 подсказок в формате ``suggestions``.
+
+    Ответы кэшируются по нормализованному запросу; уточнение уже найденного
+    запроса («ромаш» → «ромашка») по возможности отвечается из кэша без DaData.
+    Лимиты частоты и квоты — те же, что у поиска по ИНН.
+    """
+    query = normalize_search_query(text)
+    if len(query) < SEARCH_MIN_LENGTH:
+        return []
+    if not DADATA_API_KEY:
+        logger.warning("Запрос к DaData пропущен: не задан DADATA_API_KEY|DADATA_TOKEN")
+        return []
+
+    # Сам запрос и все его префиксы — одним обращением к кэшу.
+    found = await _SUGGEST_CACHE.aget_many([query, *_search_prefixes(query)])
+    cached = found.get(query)
+    if cached is NOT_FOUND:
+        return []
+    if cached is not None:
+        return cached["items"]
+    derived = _search_from_prefix(query, found)
+    if derived is not None:
+        _store_search(query, derived, complete=True)
+        return derived
+
+    key = f"suggest:{query}"
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_search(query, key))
+        task.add_done_callback(_mark_retrieved)
+        _INFLIGHT[key] = task
+    return await _join(task)
+
+
+async def _load_search(query: str, key: str) -> list[dict]:
+    try:
+        suggestions = await _request_suggestions(query, None, _SUGGEST_MAX_COUNT, url=DADATA_SUGGEST_URL)
+        if suggestions is None:
+            return []
+        _store_search(query, suggestions, complete=len(suggestions) < _SUGGEST_MAX_COUNT)
+        return suggestions
+    finally:
+        _INFLIGHT.pop(key, None)
+
+
+async def search_companies_page(
+    text: str, page: int = 0, page_size: int = SEARCH_PAGE_SIZE
+) -> tuple[list[dict], bool]:
+    """Страница результатов поиска по названию (с нуля) и признак, что есть ещё."""
+    items = await search_companies(text)
+    start = page * page_size
+    return items[start : start + page_size], len(items) > start + page_size
+
+
 def _v(val: str | None, default: str = "—") -> str:
     """Вернуть значение или прочерк (безопасно для HTML)."""
     if val is None or str(val).strip() == "":
@@ -139,29 +916,26 @@ def _entity_type_label(entity_type: str | None) -> str:
     return "Юридическое лицо"
 
 
-def format_company_short_card(item: dict) -> str:
+def format_company_short_card(item: Company | dict) -> str:
     """Короткая карточка для первого экрана менеджеру."""
-    d = item.get("data", {})
-    name_short = _v(d.get("name", {}).get("short_with_opf") or item.get("value"))
-    inn = _v(d.get("inn"))
-    ogrn = _v(d.get("ogrn"))
-    kpp = _v(d.get("kpp"))
+    c = Company.coerce(item)
+    mgmt = c.manager or Person()
+    name_short = _v(c.short_name or c.value)
+    inn = _v(c.inn)
+    ogrn = _v(c.ogrn)
+    kpp = _v(c.kpp)
 
-    state = d.get("state", {})
-    status = _v(state.get("status"))
+    status = _v(c.status)
 
-    address_obj = d.get("address", {})
-    address = _v(address_obj.get("value") or address_obj.get("unrestricted_value"))
+    address = _v(c.address or c.address_full)
 
-    mgmt = d.get("management", {})
-    manager_name = _v(mgmt.get("name"))
-    manager_post = _v(mgmt.get("post"))
+    manager_name = _v(mgmt.name)
+    manager_post = _v(mgmt.post)
 
-    okved = _v(d.get("okved"))
-    employee_count = _v(d.get("employee_count"))
+    okved = _v(c.okved)
+    employee_count = _v(c.employee_count)
 
-    finance = d.get("finance", {})
-    revenue = _format_money(finance.get("revenue"), finance.get("year"))
+    revenue = _format_money(c.revenue, c.finance_year)
 
     return "\n".join(
         [
@@ -176,49 +950,44 @@ def format_company_short_card(item: dict) -> str:
         ]
     )
 
-def format_company_details(item: dict) -> str:
+def format_company_details(item: Company | dict) -> str:
     """Формирует расширенную HTML-карточку компании для Telegram."""
-    d = item.get("data", {})
-    name_full = _v(d.get("name", {}).get("full_with_opf"))
-    name_short = _v(d.get("name", {}).get("short_with_opf"))
-    inn = _v(d.get("inn"))
-    kpp = _v(d.get("kpp"))
-    ogrn = _v(d.get("ogrn"))
-    okpo = _v(d.get("okpo"))
-    oktmo = _v(d.get("oktmo"))
-    okato = _v(d.get("okato"))
-
-    address_obj = d.get("address", {})
-    address = _v(address_obj.get("unrestricted_value") or address_obj.get("value"))
-
-    mgmt = d.get("management", {})
-    manager_name = _v(mgmt.get("name"))
-    manager_post = _v(mgmt.get("post"))
-
-    capital = d.get("capital", {})
-    cap_value = capital.get("value")
-    cap_type = _v(capital.get("type"), default="")
+    c = Company.coerce(item)
+    mgmt = c.manager or Person()
+    name_full = _v(c.full_name)
+    name_short = _v(c.short_name)
+    inn = _v(c.inn)
+    kpp = _v(c.kpp)
+    ogrn = _v(c.ogrn)
+    okpo = _v(c.okpo)
+    oktmo = _v(c.oktmo)
+    okato = _v(c.okato)
+
+    address = _v(c.address_full or c.address)
+
+    manager_name = _v(mgmt.name)
+    manager_post = _v(mgmt.post)
+
+    cap_value = c.capital_value
+    cap_type = _v(c.capital_type, default="")
     capital_str = _format_money(cap_value)
     if cap_value is not None and cap_type:
         capital_str += f" ({cap_type})"
 
-    okved = _v(d.get("okved"))
-    okved_type = _v(d.get("okved_type"))
+    okved = _v(c.okved)
+    okved_type = _v(c.okved_type)
 
-    phones_raw = d.get("phones") or []
-    phones = _v(", ".join(p.get("value", "") for p in phones_raw if p.get("value")), default="—")
-    emails_raw = d.get("emails") or []
-    emails = _v(", ".join(e.get("value", "") for e in emails_raw if e.get("value")), default="—")
+    phones = _v(", ".join(c.phones), default="—")
+    emails = _v(", ".join(c.emails), default="—")
 
-    entity_type = d.get("type")
-    state = d.get("state", {})
-    status = _v(format_company_state(state, entity_type))
+    entity_type = c.entity_type
+    status = _v(format_company_state(c.state, entity_type))
 
-    reg_date = _format_date(state.get("registration_date")) or "—"
-    liq_date = _format_date(state.get("liquidation_date"))
+    reg_date = _format_date(c.registration_date) or "—"
+    liq_date = _format_date(c.liquidation_date)
 
-    branch_type = d.get("branch_type")
-    branch_count = d.get("branch_count")
+    branch_type = c.branch_type
+    branch_count = c.branch_count
     if branch_type == "MAIN" and branch_count:
         branches_str = f"Головная организация, филиалов: {branch_count}"
     elif branch_type == "BRANCH":
@@ -273,14 +1042,14 @@ def format_company_details(item: dict) -> str:
     return "\n".join(lines)
 
 
-def format_company_requisites(item: dict) -> str:
+def format_company_requisites(item: Company | dict) -> str:
     """Текст для копирования реквизитов в CRM."""
-    d = item.get("data", {})
-    name_full = _v(d.get("name", {}).get("full_with_opf"))
-    inn = _v(d.get("inn"))
-    kpp = _v(d.get("kpp"))
-    ogrn = _v(d.get("ogrn"))
-    address = _v((d.get("address") or {}).get("unrestricted_value"))
+    c = Company.coerce(item)
+    name_full = _v(c.full_name)
+    inn = _v(c.inn)
+    kpp = _v(c.kpp)
+    ogrn = _v(c.ogrn)
+    address = _v(c.address_full)
 
     return "\n".join(
         [
@@ -294,19 +1063,42 @@ def format_company_requisites(item: dict) -> str:
     )
 
 
-def format_branches_list(items: list[dict]) -> str:
-    """Список филиалов в компактном виде."""
+def format_search_results(items: list[Company | dict], start: int = 1) -> str:
+    """Результаты поиска по названию (``start`` — номер первого на странице)."""
+    if not items:
+        return "По запросу ничего не найдено. Уточните название или введите ИНН/ОГРН."
+
+    lines = ["<b>🔎 Результаты поиска</b>"]
+    for idx, item in enumerate(items, start=start):
+        c = Company.coerce(item)
+        lines.append(f"{idx}. {_v(c.short_name or c.value)}")
+        lines.append(f"   ИНН: <code>{_v(c.inn)}</code>, {_v(format_company_state(c.state, c.entity_type))}")
+        lines.append(f"   Адрес: {_v(c.address)}")
+
+    return "\n".join(lines)
+
+
+def format_branches_list(items: list[Company | dict], start: int = 1, total: int | None = None) -> str:
+    """Список филиалов в компактном виде (``start`` — номер первого на странице).
+
+    ``total`` — число филиалов по карточке (``branch_count``): если страница упирается
+    в ``BRANCHES_MAX_COUNT``, а филиалов больше, список помечается как неполный.
+    """
     if not items:
         return "Филиалы не найдены."
 
     lines = ["<b>🏢 Филиалы</b>"]
-    for idx, item in enumerate(items, start=1):
-        d = item.get("data", {})
-        name = _v(d.get("name", {}).get("short_with_opf") or item.get("value"))
-        kpp = _v(d.get("kpp"))
-        address = _v((d.get("address") or {}).get("value"))
+    for idx, item in enumerate(items, start=start):
+        c = Company.coerce(item)
+        name = _v(c.short_name or c.value)
+        kpp = _v(c.kpp)
+        address = _v(c.address)
         lines.append(f"{idx}. {name}")
         lines.append(f"   КПП: <code>{kpp}</code>")
         lines.append(f"   Адрес: {address}")
 
+    shown = start - 1 + len(items)
+    if isinstance(total, int) and shown >= BRANCHES_MAX_COUNT and total > shown:
+        lines.append("")
+        lines.append(f"Показаны первые {shown} из {total} филиалов: больше DaData не отдаёт.")
     return "\n".join(lines)
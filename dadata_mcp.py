@@ -17,6 +17,7 @@ from config import (
     OPENAI_API_KEY,
     OPENAI_BASE_URL,
     OPENAI_MODEL,
+    OPENAI_TIMEOUT_SECONDS,
 )
 
 logger = logging.getLogger(__name__)
@@ -68,7 +69,7 @@ async def fetch_company_via_mcp(inn: str) -> str:
         return config_error
 
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+        client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, timeout=OPENAI_TIMEOUT_SECONDS)
 
         response = client.responses.create(
             model=OPENAI_MODEL,
@@ -0,0 +1,67 @@
+"""Срок обработки запроса (deadline), сквозной от обработчика до HTTP-вызова.
+
+Обработчик апдейта Telegram задаёт срок (``deadline_scope``), а клиент DaData
+сверяется с ним на каждом шаге, где можно ждать: очередь слотов, лимит частоты,
+паузы между повторами, таймаут HTTP. Работа, которая к сроку уже не успеет,
+бросается сразу, а не занимает слот и квоту ради ответа, которого пользователь
+не дождётся: при всплеске нагрузки очередь не копится бесконечно.
+
+Срок хранится в ``contextvars`` как момент по ``time.monotonic()`` и поэтому
+доходит до задач, созданных внутри обработчика (например, single-flight).
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Срок ``seconds`` секунд от текущего момента на время блока.
+
+    Вложенный срок не бывает позже внешнего; ``None`` или ``0`` — срок не меняется.
+    """
+    current = _DEADLINE.get()
+    if seconds:
+        at = time.monotonic() + seconds
+        current = at if current is None else min(current, at)
+    token = _DEADLINE.set(current)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+@contextmanager
+def detached() -> Iterator[None]:
+    """Блок без срока: фоновая работа не наследует срок запустившего её обработчика."""
+    token = _DEADLINE.set(None)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Сколько секунд осталось до срока (может быть отрицательным); ``None`` — срока нет."""
+    at = _DEADLINE.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def clamp(timeout: Optional[float]) -> Optional[float]:
+    """Таймаут, урезанный до оставшегося срока (не меньше нуля); ``None`` — без ограничений."""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(0.0, left)
+    return left if timeout is None else min(timeout, left)
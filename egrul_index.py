@@ -0,0 +1,224 @@
+"""Локальный офлайн-индекс ЕГРЮЛ/ЕГРИП для карточек без запроса к DaData.
+
+Большая часть трафика бота — одни и те же компании, чьи регистрационные данные
+годами не меняются, а каждая карточка стоит запроса к DaData. Индекс строится
+из выгрузки реестра и читается через ``mmap``: поиск — двоичный по отсортированной
+таблице ключей, без загрузки файла в память и без квоты.
+
+Формат файла (little-endian)::
+
+    заголовок   magic "EGRI", версия, длина ключа, число ключей, время сборки
+    ключи       count × (ключ 16 байт, смещение u64, длина u32, captured_at u32),
+                отсортированы по ключу; ИНН и ОГРН записи — два ключа на одни данные
+    данные      JSON-элемент в формате ``suggestions`` DaData (для ``Company.from_suggestion``)
+
+Сборка из выгрузки — JSON lines (элементы ответа DaData или плоские записи) или
+CSV с колонками ``inn, ogrn, kpp, name, full_name, type, status, address, okved,
+updated``::
+
+    python egrul_index.py dump.jsonl [ещё.csv ...] -o egrul.idx [--as-of 2024-06-01]
+
+При повторе ИНН/ОГРН побеждает последняя запись, поэтому свежие выгрузки
+указываются последними.
+
+Свежесть записи — момент выгрузки (``captured_at``): ``--as-of`` или время
+изменения самого старого файла выгрузки. ``state.actuality_date`` — дата
+последнего изменения в реестре, а не выгрузки: компания, годами не менявшая
+данных, по ней выглядела бы устаревшей. Дата остаётся только в данных карточки.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator, Optional
+
+import json_codec
+
+MAGIC = b"EGRI"
+VERSION = 2
+KEY_SIZE = 16
+_HEADER = struct.Struct("<4sHHIQ")
+_ENTRY = struct.Struct(f"<{KEY_SIZE}sQII")
+_COPY_CHUNK = 1 << 20
+
+
+def _key(value: Any) -> Optional[bytes]:
+    """ИНН (10/12 цифр) или ОГРН (13/15 цифр) в виде ключа индекса."""
+    text = str(value or "").strip()
+    if not text.isdigit() or len(text) not in (10, 12, 13, 15):
+        return None
+    return text.encode("ascii").ljust(KEY_SIZE, b"\0")
+
+
+def _timestamp(value: Any) -> Optional[int]:
+    """Дата актуальности: ISO-дата, секунды или миллисекунды (как в DaData)."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        number = int(value)
+        return number // 1000 if number > 10**11 else number
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def to_suggestion(record: dict) -> dict:
+    """Запись выгрузки в формате элемента ``suggestions`` DaData."""
+    if isinstance(record.get("data"), dict):
+        return record
+    name = record.get("name") or record.get("short_name") or record.get("full_name")
+    data: dict[str, Any] = {
+        "inn": record.get("inn") or None,
+        "ogrn": record.get("ogrn") or None,
+        "kpp": record.get("kpp") or None,
+        "type": (record.get("type") or "").upper() or None,
+        "okved": record.get("okved") or None,
+        "name": {"short_with_opf": name, "full_with_opf": record.get("full_name") or name},
+        "state": {"status": (record.get("status") or "").upper() or None},
+        "address": {"value": record.get("address") or None},
+    }
+    updated = _timestamp(record.get("updated"))
+    if updated is not None:
+        data["state"]["actuality_date"] = updated * 1000
+    return {"value": name, "data": data}
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """Записи выгрузки: ``.csv`` — CSV с заголовком, иначе JSON lines."""
+    with open(path, encoding="utf-8", newline="") as fh:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(fh)
+            return
+        for line in fh:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def build_index(
+    records: Iterable[dict], path: str, *, now: Optional[float] = None, as_of: Optional[float] = None
+) -> int:
+    """Собрать индекс из записей выгрузки, вернуть число ключей.
+
+    ``as_of`` — момент выгрузки (по умолчанию — время сборки), он сохраняется
+    у каждой записи как её свежесть. Данные пишутся во временный файл по мере
+    чтения, в памяти остаётся только таблица ключей; итоговый файл заменяется атомарно.
+    """
+    built_at = int(now if now is not None else time.time())
+    captured_at = int(as_of) if as_of is not None else built_at
+    entries: list[tuple[bytes, int, int, int]] = []
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.TemporaryFile(dir=directory) as blobs:
+        offset = 0
+        for record in records:
+            suggestion = to_suggestion(record)
+            data = suggestion.get("data") or {}
+            keys = [key for key in (_key(data.get("inn")), _key(data.get("ogrn"))) if key]
+            if not keys:
+                continue
+            blob = json_codec.dumps(suggestion).encode("utf-8")
+            blobs.write(blob)
+            for key in keys:
+                entries.append((key, offset, len(blob), captured_at))
+            offset += len(blob)
+
+        # Сортировка устойчивая: из повторов ключа оставляем последний.
+        entries.sort(key=lambda entry: entry[0])
+        unique = [entry for i, entry in enumerate(entries) if i + 1 == len(entries) or entries[i + 1][0] != entry[0]]
+
+        base = _HEADER.size + _ENTRY.size * len(unique)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(_HEADER.pack(MAGIC, VERSION, KEY_SIZE, len(unique), built_at))
+            for key, blob_offset, length, captured in unique:
+                out.write(_ENTRY.pack(key, base + blob_offset, length, captured))
+            blobs.seek(0)
+            while chunk := blobs.read(_COPY_CHUNK):
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    return len(unique)
+
+
+class EgrulIndex:
+    """Индекс, открытый только на чтение. ``ValueError`` — файл не является индексом."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError(f"{path}: слишком короткий файл индекса")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        magic, version, key_size, self.count, self.built_at = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or key_size != KEY_SIZE:
+            self.close()
+            raise ValueError(f"{path}: неизвестный формат индекса")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, query: str) -> Optional[tuple[dict, int]]:
+        """Элемент ``suggestions`` и момент выгрузки записи по ИНН/ОГРН; ``None`` — нет в индексе."""
+        key = _key(query)
+        if key is None:
+            return None
+        mm = self._mm
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = _HEADER.size + mid * _ENTRY.size
+            probe = mm[start : start + KEY_SIZE]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                _key_bytes, offset, length, captured_at = _ENTRY.unpack_from(mm, start)
+                return json_codec.loads(mm[offset : offset + length]), captured_at
+        return None
+
+    def close(self) -> None:
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Сборка офлайн-индекса ЕГРЮЛ/ЕГРИП для бота.")
+    parser.add_argument("dumps", nargs="+", help="выгрузки: JSON lines или .csv")
+    parser.add_argument("-o", "--output", required=True, help="файл индекса (DADATA_EGRUL_INDEX_PATH)")
+    parser.add_argument(
+        "--as-of", help="дата выгрузки (ISO или секунды); по умолчанию — время изменения самого старого файла"
+    )
+    args = parser.parse_args(argv)
+    as_of = _timestamp(args.as_of) if args.as_of else min(os.path.getmtime(path) for path in args.dumps)
+    if as_of is None:
+        parser.error(f"некорректная дата --as-of: {args.as_of}")
+
+    def _all_records() -> Iterator[dict]:
+        for path in args.dumps:
+            yield from read_records(path)
+
+    started = time.monotonic()
+    count = build_index(_all_records(), args.output, as_of=as_of)
+    print(f"{args.output}: {count} ключей ИНН/ОГРН за {time.monotonic() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
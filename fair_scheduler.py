@@ -0,0 +1,115 @@
+"""Справедливое распределение слотов параллельных запросов между чатами.
+
+Глобальный ``asyncio.Semaphore`` обслуживает ожидающих строго по FIFO: один чат,
+вставивший сотни ИНН, занимает все слоты, и одиночные проверки остальных ждут
+за ним. ``FairScheduler`` вместо этого держит отдельную очередь на каждого
+клиента (чат) и отдаёт освободившийся слот по кругу (round-robin) между
+клиентами. Есть два класса приоритета: интерактивные одиночные проверки
+(``INTERACTIVE``) всегда обслуживаются раньше пакетных (``BULK``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable, Optional
+
+INTERACTIVE = 0
+BULK = 1
+
+
+class FairScheduler:
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = max(1, concurrency)
+        self._active = 0
+        # По OrderedDict на приоритет: клиент -> очередь ожидающих его запросов.
+        # Порядок ключей задаёт очередь round-robin между клиентами.
+        self._queues: tuple[OrderedDict[Hashable, deque[asyncio.Future]], ...] = (OrderedDict(), OrderedDict())
+        self._queued = 0
+        self.max_queue_depth = 0
+
+    @asynccontextmanager
+    async def slot(
+        self, client_id: Hashable = None, priority: int = INTERACTIVE, timeout: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """Слот на время блока. ``timeout`` ограничивает ожидание в очереди:
+        не дождавшийся слота уходит из очереди с ``asyncio.TimeoutError``."""
+        await self._acquire(client_id, priority, timeout)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def queued(self) -> int:
+        return self._queued
+
+    def snapshot(self) -> dict:
+        """Состояние очередей для мониторинга."""
+        interactive, bulk = self._queues
+        return {
+            "active": self._active,
+            "concurrency": self.concurrency,
+            "queued_interactive": sum(len(q) for q in interactive.values()),
+            "queued_bulk": sum(len(q) for q in bulk.values()),
+            "queued_clients": len(set(interactive) | set(bulk)),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+    async def _acquire(self, client_id: Hashable, priority: int, timeout: Optional[float] = None) -> None:
+        if self._active < self.concurrency and not self._queued:
+            self._active += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        queues = self._queues[priority]
+        queues.setdefault(client_id, deque()).append(fut)
+        self._queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queued)
+        try:
+            if timeout is None:
+                await fut
+            else:
+                await asyncio.wait_for(fut, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if fut.done() and not fut.cancelled():
+                # Слот уже выдан, но ожидающий отменён или не дождался — возвращаем слот следующему.
+                self._release()
+            else:
+                self._discard(queues, client_id, fut)
+            raise
+
+    def _release(self) -> None:
+        self._active -= 1
+        while self._active < self.concurrency:
+            fut = self._pop_next()
+            if fut is None:
+                return
+            self._active += 1
+            fut.set_result(None)
+
+    def _pop_next(self) -> asyncio.Future | None:
+        for queues in self._queues:
+            while queues:
+                client_id, waiters = next(iter(queues.items()))
+                fut = waiters.popleft()
+                self._queued -= 1
+                if waiters:
+                    queues.move_to_end(client_id)
+                else:
+                    del queues[client_id]
+                if not fut.done():
+                    return fut
+        return None
+
+    def _discard(self, queues: OrderedDict, client_id: Hashable, fut: asyncio.Future) -> None:
+        waiters = queues.get(client_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(fut)
+        except ValueError:
+            return
+        self._queued -= 1
+        if not waiters:
+            del queues[client_id]
@@ -3,24 +3,46 @@
 import html
 import logging
 from datetime import datetime
+from typing import Any, Awaitable, Callable
 
-from aiogram import F, Router
+from aiogram import BaseMiddleware, F, Router
+from aiogram.dispatcher.flags import get_flag
 from aiogram.filters import Command
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import CallbackQuery, Message
-
-from dadata_direct import fetch_company
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+
+from company import Company, Person
+from config import BOT_BATCH_DEADLINE_SECONDS, BOT_HANDLER_DEADLINE_SECONDS
+from dadata_direct import (
+    BRANCHES_PAGE_SIZE,
+    SEARCH_MIN_LENGTH,
+    SEARCH_PAGE_SIZE,
+    THROTTLED,
+    UNAVAILABLE,
+    DadataThrottledError,
+    DadataUnavailableError,
+    fetch_branches_page,
+    fetch_companies_many,
+    format_branches_list,
+    format_search_results,
+    normalize_search_query,
+    request_scope,
+    search_companies,
+    search_companies_page,
+)
 from keyboards import (
     BTN_CHECK_INN,
     CB_ACT_CRM,
     CB_ACT_EXPORT,
     CB_ACT_MENU,
     CB_ACT_NEW_INN,
+    CB_BRANCHES_PAGE_PREFIX,
     CB_NAV_BACK,
     CB_NAV_HOME,
     CB_PAGE_AUTHORITIES,
+    CB_PAGE_BRANCHES,
     CB_PAGE_CASES,
     CB_PAGE_CONTACTS,
     CB_PAGE_CONTRACTS,
@@ -35,13 +57,40 @@ from keyboards import (
     CB_PAGE_SUCCESSOR,
     CB_PAGE_TAXES,
     CB_PAGE_DOCUMENTS,
+    CB_SEARCH_OPEN_PREFIX,
+    CB_SEARCH_PAGE_PREFIX,
+    branches_pager_kb,
     inline_actions_kb,
     reply_main_menu_kb,
+    search_results_kb,
 )
+from deadline import deadline_scope
 from validators import parse_inns, validate_company_id
+from warmup import record_access
 
 logger = logging.getLogger(__name__)
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """Срок обработки апдейта: флаг ``deadline`` обработчика (секунды) или срок по умолчанию."""
+
+    def __init__(self, default_seconds: float) -> None:
+        self.default_seconds = default_seconds
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any],
+    ) -> Any:
+        with deadline_scope(get_flag(data, "deadline", default=self.default_seconds)):
+            return await handler(event, data)
+
+
 router = Router()
+# Внутренние middleware: флаги обработчика уже известны.
+router.message.middleware(DeadlineMiddleware(BOT_HANDLER_DEADLINE_SECONDS))
+router.callback_query.middleware(DeadlineMiddleware(BOT_HANDLER_DEADLINE_SECONDS))
 
 START_TEXT = (
     "🕵️ Агент на связи. Работаем тихо и без лишнего шума.\n"
@@ -53,11 +102,16 @@ HELP_TEXT = (
     "/start — приветствие\n"
     "/help — это сообщение\n"
     "/find — ввести ИНН/ОГРН для проверки\n\n"
+    "Вместо ИНН можно написать название компании — бот предложит варианты.\n"
     "Также можно нажать кнопку «🔎 Проверить ИНН»."
 )
-ASK_INN_TEXT = "Введите ИНН/ОГРН: 10/12 (ИНН) или 13/15 (ОГРН) цифр.\nПример: 3525405517"
+ASK_INN_TEXT = (
+    "Введите ИНН/ОГРН: 10/12 (ИНН) или 13/15 (ОГРН) цифр.\nПример: 3525405517\n"
+    "Или название компании, например: Ромашка Москва"
+)
 ERR_DIGITS_TEXT = "Упс 🙂 Нужны только цифры без пробелов. Попробуйте ещё раз."
 ERR_LEN_TEXT = "ИНН/ОГРН должен быть 10/12/13/15 цифр. Пример: 3525405517"
+ERR_UNAVAILABLE_TEXT = "DaData временно недоступна, попробуйте через пару минут."
 TELEGRAM_TEXT_LIMIT = 4096
 
 
@@ -101,8 +155,18 @@ async def _edit_text_chunks(message: Message, text: str, *, reply_markup=None) -
         await message.answer(part)
 
 
-def _build_result_totals(found: int, not_found: int, invalid: list[str]) -> str:
+def _build_result_totals(
+    found: int,
+    not_found: int,
+    invalid: list[str],
+    throttled: list[str] | None = None,
+    unavailable: list[str] | None = None,
+) -> str:
     lines = [f"Итог: найдено {found}, не найдено {not_found}."]
+    if throttled:
+        lines.append(f"Не проверено (лимит запросов DaData, повторите позже): {', '.join(throttled)}")
+    if unavailable:
+        lines.append(f"Не проверено (DaData недоступна, повторите позже): {', '.join(unavailable)}")
     if invalid:
         digits_error = [value for value in invalid if not value.isdigit()]
         length_error = [value for value in invalid if value.isdigit()]
@@ -151,33 +215,25 @@ def _money(value: int | float | str | None) -> str:
     return f"{amount:,.0f} ₽".replace(",", " ")
 
 
-def _d(company: dict) -> dict:
-    return company.get("data", {}) if isinstance(company, dict) else {}
+def _build_main_card(company: Company | dict) -> str:
+    c = Company.coerce(company)
+    manager = c.manager or Person()
 
+    short_name = _v(c.short_name or c.value)
+    reg_date = _date_from_ms(c.registration_date)
+    inn = _v(c.inn)
+    kpp = _v(c.kpp)
+    ogrn = _v(c.ogrn)
+    manager_post = _v(manager.post, default="руководитель")
+    manager_name = _v(manager.name)
 
-def _build_main_card(company: dict) -> str:
-    d = _d(company)
-    name = d.get("name", {}) or {}
-    state = d.get("state", {}) or {}
-    management = d.get("management", {}) or {}
-    finance = d.get("finance", {}) or {}
-    address = d.get("address", {}) or {}
+    employees = _v(c.employee_count)
+    fin_year = c.finance_year
+    avg_salary = _money(c.salary)
+    status = _v(c.status)
 
-    short_name = _v(name.get("short_with_opf") or company.get("value"))
-    reg_date = _date_from_ms(state.get("registration_date"))
-    inn = _v(d.get("inn"))
-    kpp = _v(d.get("kpp"))
-    ogrn = _v(d.get("ogrn"))
-    manager_post = _v(management.get("post"), default="руководитель")
-    manager_name = _v(management.get("name"))
-
-    employees = _v(d.get("employee_count"))
-    fin_year = finance.get("year")
-    avg_salary = _money(finance.get("salary"))
-    status = _v(state.get("status"))
-
-    addr = _v(address.get("value"))
-    okved = _v(d.get("okved"))
+    addr = _v(c.address)
+    okved = _v(c.okved)
 
     year_suffix = f" ({fin_year})" if fin_year else ""
 
@@ -228,8 +284,12 @@ def _iter_data_paths(value: object, prefix: str = ""):
     yield prefix, _normalize_dump_value(value)
 
 
-def _build_all_fields_block(company: dict, max_lines: int | None = None) -> str:
-    d = _d(company)
+def _build_all_fields_block(company: Company | dict, max_lines: int | None = None) -> str:
+    # Полный дамп нужен редко, поэтому сырой ответ разбирается только здесь.
+    if isinstance(company, Company):
+        d = company.data
+    else:
+        d = company.get("data", {}) if isinstance(company, dict) else {}
     if not isinstance(d, dict) or not d:
         return "Все поля DaData: нет данных."
 
@@ -247,67 +307,49 @@ def _build_all_fields_block(company: dict, max_lines: int | None = None) -> str:
     if total == 0:
         lines.append("• нет непустых полей")
     return "\n".join(lines)
-def _build_details_card(company: dict) -> str:
-    d = _d(company)
-    name = d.get("name", {}) or {}
-    state = d.get("state", {}) or {}
-    capital = d.get("capital", {}) or {}
-    management = d.get("management", {}) or {}
-    finance = d.get("finance", {}) or {}
-    address = d.get("address", {}) or {}
-
-    short_name = _v(name.get("short_with_opf") or company.get("value"))
-    full_name = _v(name.get("full_with_opf"))
-    reg_date = _date_from_ms(state.get("registration_date"))
-    inn = _v(d.get("inn"))
-    kpp = _v(d.get("kpp"))
-    ogrn = _v(d.get("ogrn"))
-    ogrn_date = _date_from_ms(d.get("ogrn_date"))
-    manager_post = _v(management.get("post"), default="руководитель")
-    manager_date = _date_from_ms(management.get("start_date"))
-    manager_name = _v(management.get("name"))
-
-    employees = _v(d.get("employee_count"))
-    fin_year = finance.get("year")
-    avg_salary = _money(finance.get("salary"))
-    status = _v(state.get("status"))
-
-    successor = d.get("successors") or []
-    successor_name = _v(successor[0].get("value")) if successor and isinstance(successor[0], dict) else "—"
-
-    addr = _v(address.get("unrestricted_value") or address.get("value"))
-
-    okved = _v(d.get("okved"))
-    okveds = d.get("okveds") or []
-    okved_name = "—"
-    if okveds and isinstance(okveds[0], dict):
-        okved_name = _v(okveds[0].get("name"))
-    okved_count = str(len(okveds)) if isinstance(okveds, list) and okveds else "1"
-
-    tax = d.get("authorities", {}).get("fts_registration") if isinstance(d.get("authorities"), dict) else {}
-    tax_name = _v((tax or {}).get("name"))
-    tax_date = _date_from_ms((tax or {}).get("date"))
+def _build_details_card(company: Company | dict) -> str:
+    c = Company.coerce(company)
+    manager = c.manager or Person()
+
+    short_name = _v(c.short_name or c.value)
+    full_name = _v(c.full_name)
+    reg_date = _date_from_ms(c.registration_date)
+    inn = _v(c.inn)
+    kpp = _v(c.kpp)
+    ogrn = _v(c.ogrn)
+    ogrn_date = _date_from_ms(c.ogrn_date)
+    manager_post = _v(manager.post, default="руководитель")
+    manager_date = _date_from_ms(manager.start_date)
+    manager_name = _v(manager.name)
+
+    employees = _v(c.employee_count)
+    fin_year = c.finance_year
+    avg_salary = _money(c.salary)
+    status = _v(c.status)
+
+    successor_name = _v(c.successors[0]) if c.successors else "—"
+
+    addr = _v(c.address_full or c.address)
+
+    okved = _v(c.okved)
+    okved_name = _v(c.okved_name)
+    okved_count = str(c.okveds_count) if c.okveds_count else "1"
+
+    tax_name = _v(c.tax_authority_name)
+    tax_date = _date_from_ms(c.tax_authority_date)
 
     codes = (
-        f"ОКПО {_v(d.get('okpo'))} • ОКАТО {_v(d.get('okato'))} • ОКТМО {_v(d.get('oktmo'))} • "
-        f"ОКФС {_v(d.get('okfs'))} • ОКОГУ {_v(d.get('okogu'))} • ОКОПФ {_v(d.get('okopf'))}"
+        f"ОКПО {_v(c.okpo)} • ОКАТО {_v(c.okato)} • ОКТМО {_v(c.oktmo)} • "
+        f"ОКФС {_v(c.okfs)} • ОКОГУ {_v(c.okogu)} • ОКОПФ {_v(c.okopf)}"
     )
 
-    phones = [p.get("value") for p in (d.get("phones") or []) if isinstance(p, dict) and p.get("value")]
-    emails = [e.get("value") for e in (d.get("emails") or []) if isinstance(e, dict) and e.get("value")]
-    websites = [w.get("value") for w in (d.get("websites") or []) if isinstance(w, dict) and w.get("value")]
-
+    phones, emails, websites = c.phones, c.emails, c.websites
     phones_line = ", ".join(phones[:2]) + (" (+ ещё)" if len(phones) > 2 else "") if phones else "—"
     emails_line = ", ".join(emails[:2]) + (" (+ ещё)" if len(emails) > 2 else "") if emails else "—"
     site_line = websites[0] if websites else "—"
 
     year_suffix = f" ({fin_year})" if fin_year else ""
 
-    founders = d.get("founders") if isinstance(d.get("founders"), list) else []
-    managers = d.get("managers") if isinstance(d.get("managers"), list) else []
-    licenses = d.get("licenses") if isinstance(d.get("licenses"), list) else []
-    documents = d.get("documents") if isinstance(d.get("documents"), list) else []
-
     return "\n".join(
         [
             "Подробнее 📄",
@@ -315,14 +357,14 @@ def _build_details_card(company: dict) -> str:
             f"📅 Регистрация: {reg_date}",
             f"🆔 ИНН/КПП: {inn} / {kpp}",
             f"🧾 ОГРН: {ogrn} от {ogrn_date}",
-            f"💰 Уставный капитал: {_money(capital.get('value'))}",
+            f"💰 Уставный капитал: {_money(c.capital_value)}",
             f"👤 {manager_post} с {manager_date}: {manager_name}",
             f"👥 Штат: {employees}{year_suffix} • 💵 Ср. зарплата: {avg_salary}{year_suffix}",
             f"❌️ Статус: {status}",
             f"✅️Правопреемник: {successor_name}",
-            f"👥 Учредителей в карточке: {len(founders)}",
-            f"🧑‍💼 Руководителей в истории: {len(managers)}",
-            f"📜 Лицензии/документы: {len(licenses)}/{len(documents)}",
+            f"👥 Учредителей в карточке: {len(c.founders)}",
+            f"🧑‍💼 Руководителей в истории: {len(c.managers)}",
+            f"📜 Лицензии/документы: {len(c.licenses)}/{len(c.documents)}",
             "📍 Юридический адрес",
             f"{addr}",
             "🏷️ Деятельность",
@@ -336,52 +378,46 @@ def _build_details_card(company: dict) -> str:
             f"Email: {_v(emails_line)}",
             f"Сайт: {_v(site_line)}",
             "",
-            _build_all_fields_block(company),
+            _build_all_fields_block(c),
         ]
     )
 
 
-def _build_export_text(company: dict) -> str:
-    d = _d(company)
-    name = d.get("name", {}) or {}
-    management = d.get("management", {}) or {}
-    address = d.get("address", {}) or {}
+def _build_export_text(company: Company | dict) -> str:
+    c = Company.coerce(company)
     return "\n".join(
         [
             "Экспорт реквизитов 📤",
-            f"Наименование: {_v(name.get('full_with_opf') or company.get('value'))}",
-            f"ИНН: {_v(d.get('inn'))}",
-            f"КПП: {_v(d.get('kpp'))}",
-            f"ОГРН: {_v(d.get('ogrn'))}",
-            f"Адрес: {_v(address.get('unrestricted_value') or address.get('value'))}",
-            f"Руководитель: {_v(management.get('name'))}",
+            f"Наименование: {_v(c.full_name or c.value)}",
+            f"ИНН: {_v(c.inn)}",
+            f"КПП: {_v(c.kpp)}",
+            f"ОГРН: {_v(c.ogrn)}",
+            f"Адрес: {_v(c.address_full or c.address)}",
+            f"Руководитель: {_v((c.manager or Person()).name)}",
         ]
     )
 
 
-def _build_crm_text(company: dict) -> str:
-    d = _d(company)
-    name = d.get("name", {}) or {}
-    management = d.get("management", {}) or {}
-    address = d.get("address", {}) or {}
+def _build_crm_text(company: Company | dict) -> str:
+    c = Company.coerce(company)
     return "\n".join(
         [
             "CRM-блок 🧩",
-            f"company_name={_v(name.get('full_with_opf') or company.get('value'))}",
-            f"inn={_v(d.get('inn'))}",
-            f"kpp={_v(d.get('kpp'))}",
-            f"ogrn={_v(d.get('ogrn'))}",
-            f"manager={_v(management.get('name'))}",
-            f"address={_v(address.get('unrestricted_value') or address.get('value'))}",
+            f"company_name={_v(c.full_name or c.value)}",
+            f"inn={_v(c.inn)}",
+            f"kpp={_v(c.kpp)}",
+            f"ogrn={_v(c.ogrn)}",
+            f"manager={_v((c.manager or Person()).name)}",
+            f"address={_v(c.address_full or c.address)}",
         ]
     )
 
 
-def _full_contacts(company: dict) -> str:
-    d = _d(company)
-    phones = sorted({p.get("value") for p in (d.get("phones") or []) if isinstance(p, dict) and p.get("value")})
-    emails = sorted({e.get("value") for e in (d.get("emails") or []) if isinstance(e, dict) and e.get("value")})
-    websites = sorted({w.get("value") for w in (d.get("websites") or []) if isinstance(w, dict) and w.get("value")})
+def _full_contacts(company: Company | dict) -> str:
+    c = Company.coerce(company)
+    phones = sorted(set(c.phones))
+    emails = sorted(set(c.emails))
+    websites = sorted(set(c.websites))
 
     lines = ["📞 Все контакты"]
     lines.append("Тел.: " + (", ".join(phones) if phones else "—"))
@@ -390,23 +426,20 @@ def _full_contacts(company: dict) -> str:
     return "\n".join(lines)
 
 
-def _format_people(items: list[dict], *, with_share: bool = False) -> str:
+def _format_people(items: tuple[Person, ...], *, with_share: bool = False) -> str:
     if not items:
         return "данные не предоставлены"
 
     lines: list[str] = []
     for item in items:
-        if not isinstance(item, dict):
-            continue
-        person_name = _v(item.get("name") or item.get("fio") or item.get("value"))
+        person_name = _v(item.name)
         if person_name == "—":
             continue
-        role = _v(item.get("post"), default="")
+        role = _v(item.post, default="")
         share_text = ""
         if with_share:
-            share_obj = item.get("share") if isinstance(item.get("share"), dict) else {}
-            share_type = _v(share_obj.get("type"), default="")
-            share_value = share_obj.get("value")
+            share_type = _v(item.share_type, default="")
+            share_value = item.share_value
             if share_value is not None:
                 share_text = f" — доля: {_money(share_value)}"
                 if share_type:
@@ -419,21 +452,17 @@ def _format_people(items: list[dict], *, with_share: bool = False) -> str:
     return "\n".join(lines) if lines else "данные не предоставлены"
 
 
-def _format_documents(company: dict) -> str:
-    d = _d(company)
-    documents = d.get("documents") if isinstance(d.get("documents"), list) else []
-    licenses = d.get("licenses") if isinstance(d.get("licenses"), list) else []
+def _format_documents(company: Company | dict) -> str:
+    c = Company.coerce(company)
+    documents = c.documents
+    licenses = c.licenses
 
     lines = ["📜 Лицензии и документы"]
 
     if licenses:
         lines.append(f"Лицензии: {len(licenses)}")
         for item in licenses[:5]:
-            if not isinstance(item, dict):
-                continue
-            lines.append(
-                f"- {_v(item.get('series'))} {_v(item.get('number'))}, выдана {_date_from_ms(item.get('issue_date'))}"
-            )
+            lines.append(f"- {_v(item.kind)} {_v(item.number)}, выдана {_date_from_ms(item.issue_date)}")
         if len(licenses) > 5:
             lines.append(f"… и ещё {len(licenses) - 5}")
     else:
@@ -443,9 +472,7 @@ def _format_documents(company: dict) -> str:
         lines.append("")
         lines.append(f"Документы: {len(documents)}")
         for item in documents[:5]:
-            if not isinstance(item, dict):
-                continue
-            lines.append(f"- {_v(item.get('type'))} № {_v(item.get('number'))} от {_date_from_ms(item.get('issue_date'))}")
+            lines.append(f"- {_v(item.kind)} № {_v(item.number)} от {_date_from_ms(item.issue_date)}")
         if len(documents) > 5:
             lines.append(f"… и ещё {len(documents) - 5}")
     else:
@@ -455,19 +482,18 @@ def _format_documents(company: dict) -> str:
     return "\n".join(lines)
 
 
-def _format_page(company: dict, page: str) -> str:
-    d = _d(company)
-    finance = d.get("finance", {}) or {}
+def _format_page(company: Company | dict, page: str) -> str:
+    c = Company.coerce(company)
     if page == CB_PAGE_FINANCE:
-        year = finance.get("year") or "—"
-        revenue = _money(finance.get("revenue"))
-        profit = _money(finance.get("profit"))
+        year = c.finance_year or "—"
+        revenue = _money(c.revenue)
+        profit = _money(c.profit)
         return "\n".join(
             [
                 f"📊 Финансы ({year})",
                 f"💰 Выручка: {revenue}",
                 f"📉 Прибыль: {profit}",
-                f"🏢 Стоимость: {_money(finance.get('value'))}",
+                f"🏢 Стоимость: {_money(c.finance_value)}",
                 "",
                 "📈 Динамика выручки:",
                 "данные не предоставлены",
@@ -529,66 +555,57 @@ def _format_page(company: dict, page: str) -> str:
         ])
 
     if page == CB_PAGE_AUTHORITIES:
-        auth = d.get("authorities", {}) if isinstance(d.get("authorities"), dict) else {}
         return "\n".join([
             "🏛️ ФНС/ПФР/ФСС/Росстат",
-            f"ФНС: {_v((auth.get('fts_registration') or {}).get('name'))}",
-            f"ПФР: {_v((auth.get('pf') or {}).get('name'))}",
-            f"ФСС: {_v((auth.get('sif') or {}).get('name'))}",
-            f"Росстат: {_v((auth.get('rosstat') or {}).get('name'))}",
+            f"ФНС: {_v(c.tax_authority_name)}",
+            f"ПФР: {_v(c.pf_name)}",
+            f"ФСС: {_v(c.sif_name)}",
+            f"Росстат: {_v(c.rosstat_name)}",
         ])
 
     if page == CB_PAGE_FOUNDERS:
-        founders = d.get("founders") if isinstance(d.get("founders"), list) else []
-        return "\n".join(["👥 Учредители", _format_people(founders, with_share=True)])
+        return "\n".join(["👥 Учредители", _format_people(c.founders, with_share=True)])
 
     if page == CB_PAGE_MANAGEMENT:
-        managers = d.get("managers") if isinstance(d.get("managers"), list) else []
-        management = d.get("management") if isinstance(d.get("management"), dict) else {}
         lines = ["🧑‍💼 Руководство"]
-        if management:
+        if c.manager:
             lines.append(
-                f"Текущий руководитель: {_v(management.get('post'), default='руководитель')} — {_v(management.get('name'))}"
+                f"Текущий руководитель: {_v(c.manager.post, default='руководитель')} — {_v(c.manager.name)}"
             )
-            lines.append(f"С {_date_from_ms(management.get('start_date'))}")
+            lines.append(f"С {_date_from_ms(c.manager.start_date)}")
             lines.append("")
         lines.append("История руководителей:")
-        lines.append(_format_people(managers))
+        lines.append(_format_people(c.managers))
         return "\n".join(lines)
 
     if page == CB_PAGE_TAXES:
-        auth = d.get("authorities", {}) if isinstance(d.get("authorities"), dict) else {}
-        fts = auth.get("fts_registration") if isinstance(auth.get("fts_registration"), dict) else {}
-        debts = d.get("fns_debt") if isinstance(d.get("fns_debt"), dict) else {}
-        tax_system = d.get("tax_system") if isinstance(d.get("tax_system"), dict) else {}
         return "\n".join(
             [
                 "🧾 Налогообложение",
-                f"Налоговый орган: {_v(fts.get('name'))}",
-                f"Постановка на учёт: {_date_from_ms(fts.get('date'))}",
-                f"Система налогообложения: {_v(tax_system.get('name') or tax_system.get('code'))}",
-                f"Недоимка/пени/штрафы: {_money(debts.get('debt'))}",
+                f"Налоговый орган: {_v(c.tax_authority_name)}",
+                f"Постановка на учёт: {_date_from_ms(c.tax_authority_date)}",
+                f"Система налогообложения: {_v(c.tax_system)}",
+                f"Недоимка/пени/штрафы: {_money(c.fns_debt)}",
             ]
         )
 
     if page == CB_PAGE_DOCUMENTS:
-        return _format_documents(company)
+        return _format_documents(c)
 
     if page == CB_PAGE_SUCCESSOR:
-        succ = d.get("successors") or []
-        if succ and isinstance(succ[0], dict):
-            succ_text = "\n".join(f"- {_v(item.get('value'))}" for item in succ if isinstance(item, dict))
+        if c.successors:
+            succ_text = "\n".join(f"- {_v(value)}" for value in c.successors)
         else:
             succ_text = "данные не предоставлены"
         return "\n".join(["✅️Правопреемник", succ_text])
 
     if page == CB_PAGE_CONTACTS:
-        return _full_contacts(company)
+        return _full_contacts(c)
 
     if page == CB_PAGE_DETAILS:
-        return _build_details_card(company)
+        return _build_details_card(c)
 
-    return _build_main_card(company)
+    return _build_main_card(c)
 
 
 async def _go_input_inn(message: Message, state: FSMContext) -> None:
@@ -618,8 +635,8 @@ async def cmd_check_inn(message: Message, state: FSMContext):
     await _go_input_inn(message, state)
 
 
-@router.message(CheckINN.waiting_inn)
-@router.message(F.text)
+@router.message(CheckINN.waiting_inn, flags={"deadline": BOT_BATCH_DEADLINE_SECONDS})
+@router.message(F.text, flags={"deadline": BOT_BATCH_DEADLINE_SECONDS})
 async def handle_inn(message: Message, state: FSMContext):
     text = (message.text or "").strip()
 
@@ -634,6 +651,9 @@ async def handle_inn(message: Message, state: FSMContext):
     invalid_values = [value for value in values if not validate_company_id(value)[0]]
     valid_values = [value for value in values if value not in invalid_values]
     if not valid_values:
+        if _is_name_query(text):
+            await _start_name_search(message, state, text)
+            return
         has_non_digit = any(not value.isdigit() for value in invalid_values)
         await message.answer(
             ERR_DIGITS_TEXT if has_non_digit else ERR_LEN_TEXT,
@@ -645,24 +665,47 @@ async def handle_inn(message: Message, state: FSMContext):
 
     found_companies: list[tuple[str, dict]] = []
     not_found = 0
-    for value in valid_values:
-        company = await fetch_company(value)
+    throttled: list[str] = []
+    unavailable: list[str] = []
+    record_access(valid_values)
+    companies = await fetch_companies_many(valid_values, client_id=message.chat.id)
+    for value, company in zip(valid_values, companies):
+        if company is THROTTLED:
+            throttled.append(value)
+            continue
+        if company is UNAVAILABLE:
+            unavailable.append(value)
+            continue
         if company is None:
             not_found += 1
             continue
         found_companies.append((value, company))
 
     if not found_companies:
-        summary = _build_result_totals(found=0, not_found=not_found, invalid=invalid_values)
+        summary = _build_result_totals(
+            found=0, not_found=not_found, invalid=invalid_values, throttled=throttled, unavailable=unavailable
+        )
+        if not_found or not (throttled or unavailable):
+            headline = "По указанным ИНН/ОГРН данные не найдены.\n"
+        elif unavailable:
+            headline = ERR_UNAVAILABLE_TEXT + "\n"
+        else:
+            headline = "DaData временно ограничила запросы, попробуйте через минуту.\n"
         await _edit_text_chunks(
             wait_msg,
-            "По указанным ИНН/ОГРН данные не найдены.\n" + summary,
+            headline + summary,
             reply_markup=inline_actions_kb(),
         )
         return
 
     first_value, first_company = found_companies[0]
-    summary = _build_result_totals(found=len(found_companies), not_found=not_found, invalid=invalid_values)
+    summary = _build_result_totals(
+        found=len(found_companies),
+        not_found=not_found,
+        invalid=invalid_values,
+        throttled=throttled,
+        unavailable=unavailable,
+    )
 
     await state.update_data(
         current_inn=first_value,
@@ -678,6 +721,110 @@ async def handle_inn(message: Message, state: FSMContext):
     )
 
 
+def _is_name_query(text: str) -> bool:
+    """Похоже на название компании, а не на опечатку в ИНН."""
+    return any(char.isalpha() for char in text) and len(normalize_search_query(text)) >= SEARCH_MIN_LENGTH
+
+
+def _search_button_label(index: int, item: dict) -> str:
+    company = Company.coerce(item)
+    name = str(company.short_name or company.value or "—")
+    if len(name) > 40:
+        name = name[:39] + "…"
+    return f"{index}. {name}"
+
+
+def _callback_chat_id(callback: CallbackQuery) -> int:
+    """Чат нажатой кнопки; если сообщение уже недоступно — чат с пользователем."""
+    return callback.message.chat.id if callback.message is not None else callback.from_user.id
+
+
+async def _search_page_view(query: str, page: int) -> tuple[str, InlineKeyboardMarkup]:
+    items, has_more = await search_companies_page(query, page)
+    start = page * SEARCH_PAGE_SIZE
+    text = format_search_results(items, start=start + 1)
+    if items and (page or has_more):
+        text += f"\n\nСтраница {page + 1}"
+    labels = [_search_button_label(start + offset + 1, item) for offset, item in enumerate(items)]
+    return text, search_results_kb(labels, start, page, has_more)
+
+
+async def _start_name_search(message: Message, state: FSMContext, text: str) -> None:
+    query = normalize_search_query(text)
+    wait_msg = await message.answer("Ищу по названию…", reply_markup=reply_main_menu_kb())
+    try:
+        with request_scope(message.chat.id):
+            view_text, markup = await _search_page_view(query, 0)
+    except DadataThrottledError:
+        await wait_msg.edit_text("DaData временно ограничила запросы, попробуйте через минуту.")
+        return
+    except DadataUnavailableError:
+        await wait_msg.edit_text(ERR_UNAVAILABLE_TEXT)
+        return
+    await state.update_data(search_query=query)
+    await _edit_text_chunks(wait_msg, view_text, reply_markup=markup)
+
+
+@router.callback_query(F.data.startswith(CB_SEARCH_PAGE_PREFIX))
+async def on_search_page(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    page_text = (callback.data or "").removeprefix(CB_SEARCH_PAGE_PREFIX)
+    query = data.get("search_query")
+    if not query or not page_text.isdigit():
+        await callback.answer("Введите название компании ещё раз", show_alert=True)
+        return
+
+    try:
+        with request_scope(_callback_chat_id(callback)):
+            view_text, markup = await _search_page_view(query, int(page_text))
+    except DadataThrottledError:
+        await callback.answer("DaData временно ограничила запросы, попробуйте через минуту.", show_alert=True)
+        return
+    except DadataUnavailableError:
+        await callback.answer(ERR_UNAVAILABLE_TEXT, show_alert=True)
+        return
+    await _edit_text_chunks(callback.message, view_text, reply_markup=markup)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith(CB_SEARCH_OPEN_PREFIX))
+async def on_search_open(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    index_text = (callback.data or "").removeprefix(CB_SEARCH_OPEN_PREFIX)
+    query = data.get("search_query")
+    if not query or not index_text.isdigit():
+        await callback.answer("Введите название компании ещё раз", show_alert=True)
+        return
+
+    try:
+        with request_scope(_callback_chat_id(callback)):
+            items = await search_companies(query)
+    except DadataThrottledError:
+        await callback.answer("DaData временно ограничила запросы, попробуйте через минуту.", show_alert=True)
+        return
+    except DadataUnavailableError:
+        await callback.answer(ERR_UNAVAILABLE_TEXT, show_alert=True)
+        return
+    index = int(index_text)
+    if index >= len(items):
+        await callback.answer("Результаты поиска устарели, введите название ещё раз", show_alert=True)
+        return
+
+    # Подсказка suggest/party содержит те же поля, что findById/party, — карточку
+    # открываем без второго запроса к DaData.
+    company = Company.from_suggestion(items[index])
+    if company.inn:
+        record_access([company.inn])
+    await state.update_data(
+        current_inn=company.inn,
+        current_company=company,
+        current_page="page:card",
+        history=[],
+    )
+    await _edit_text_chunks(callback.message, _build_main_card(company), reply_markup=inline_actions_kb())
+    await callback.answer()
+
+
 @router.callback_query(F.data == CB_NAV_HOME)
 async def on_home(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
@@ -785,3 +932,48 @@ async def on_page(callback: CallbackQuery, state: FSMContext):
 
     await _edit_text_chunks(callback.message, _format_page(company, page), reply_markup=inline_actions_kb())
     await callback.answer()
+
+
+@router.callback_query(F.data == CB_PAGE_BRANCHES)
+async def on_branches(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    if not data.get("current_company"):
+        await callback.answer("Сначала введите ИНН", show_alert=True)
+        return
+
+    history = data.get("history") or []
+    history.append(data.get("current_page", "page:card"))
+    await state.update_data(history=history, current_page=CB_PAGE_BRANCHES)
+    await _show_branches_page(callback, data, 0)
+
+
+@router.callback_query(F.data.startswith(CB_BRANCHES_PAGE_PREFIX))
+async def on_branches_page(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    page_text = (callback.data or "").removeprefix(CB_BRANCHES_PAGE_PREFIX)
+    if not data.get("current_company") or not page_text.isdigit():
+        await callback.answer("Сначала введите ИНН", show_alert=True)
+        return
+
+    await _show_branches_page(callback, data, int(page_text))
+
+
+async def _show_branches_page(callback: CallbackQuery, data: dict, page: int) -> None:
+    """Экран одной страницы филиалов: в DaData идёт только эта страница (или кэш)."""
+    company = Company.coerce(data["current_company"])
+    query = company.inn or data.get("current_inn")
+    try:
+        with request_scope(_callback_chat_id(callback)):
+            items, has_more = await fetch_branches_page(query, page)
+    except DadataThrottledError:
+        await callback.answer("DaData временно ограничила запросы, попробуйте через минуту.", show_alert=True)
+        return
+    except DadataUnavailableError:
+        await callback.answer(ERR_UNAVAILABLE_TEXT, show_alert=True)
+        return
+
+    text = format_branches_list(items, start=page * BRANCHES_PAGE_SIZE + 1, total=company.branch_count)
+    if items and (page or has_more):
+        text += f"\n\nСтраница {page + 1}"
+    await _edit_text_chunks(callback.message, text, reply_markup=branches_pager_kb(page, has_more))
+    await callback.answer()
@@ -4,46 +4,254 @@
 - не создавать ClientSession на каждый запрос (это дорого и иногда приводит к ResourceWarning);
 - централизованно управлять таймаутами/коннектором/закрытием.
 
+У каждого upstream-а свой именованный пул (``HTTP_POOLS`` в ``config.py``):
+своя сессия, лимит соединений, keepalive, таймауты и кэш DNS. Медленный
+источник занимает только свои соединения, запросы к DaData его не ждут.
+
 Использование:
     from http_client import get_session
-    session = get_session()
+    session = get_session("dadata")
+
+С ``DADATA_HTTP_CASSETTE`` вместо сессии отдаётся транспорт из ``transport.py``:
+запись обменов в кассету (поверх настоящей сессии) или воспроизведение без сети.
+Тесты и бенчмарки могут подставить свой транспорт через ``set_transport()``;
+он действует на все пулы.
 """
 
 from __future__ import annotations
 
+import asyncio
+import time
+
 import aiohttp
 import logging
-from typing import Optional
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import json_codec
+from config import DADATA_HTTP_CASSETTE, DADATA_HTTP_CASSETTE_MODE, HTTP_POOLS
+from transport import Cassette, RecordingSession, ReplaySession
 
 logger = logging.getLogger(__name__)
 
-_session: Optional[aiohttp.ClientSession] = None
+DEFAULT_POOL = "default"
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    limit: int = 20
+    limit_per_host: int = 0
+    keepalive_seconds: float = 15.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 15.0
+    total_timeout: float = 15.0
+    dns_ttl_seconds: int = 300
+
+    @property
+    def timeout(self) -> aiohttp.ClientTimeout:
+        # sock_connect — только TCP/TLS; ожидание свободного соединения в пуле ограничено total.
+        return aiohttp.ClientTimeout(
+            total=self.total_timeout, sock_connect=self.connect_timeout, sock_read=self.read_timeout
+        )
+
+
+class _PoolCounters:
+    """Счётчики пула по событиям трассировки aiohttp."""
+
+    def __init__(self) -> None:
+        self.waiting = 0
+        self.queued = 0
+        self.created = 0
+        self.reused = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def _queued_start(session, ctx, params) -> None:
+            self.waiting += 1
+            self.queued += 1
+
+        async def _queued_end(session, ctx, params) -> None:
+            self.waiting -= 1
+
+        async def _created(session, ctx, params) -> None:
+            self.created += 1
+
+        async def _reused(session, ctx, params) -> None:
+            self.reused += 1
+
+        trace.on_connection_queued_start.append(_queued_start)
+        trace.on_connection_queued_end.append(_queued_end)
+        trace.on_connection_create_end.append(_created)
+        trace.on_connection_reuseconn.append(_reused)
+        return trace
+
+
+POOLS: dict[str, PoolConfig] = {name: PoolConfig(**settings) for name, settings in HTTP_POOLS.items()}
+
+_sessions: dict[str, aiohttp.ClientSession] = {}
+_counters: dict[str, _PoolCounters] = {}
+# RecordingSession/ReplaySession или любой объект с тем же post(); имеет приоритет над пулами.
+_transport: Any = None
+
 
-DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15)
+def _pool_config(pool: str) -> PoolConfig:
+    return POOLS.get(pool) or POOLS.get(DEFAULT_POOL) or PoolConfig()
 
 
-def init_session() -> None:
-    global _session
-    if _session and not _session.closed:
+def _create_session(pool: str) -> aiohttp.ClientSession:
+    config = _pool_config(pool)
+    counters = _counters[pool] = _PoolCounters()
+    # Ограничиваем количество одновременных соединений, чтобы не убивать сеть/upstream
+    connector = aiohttp.TCPConnector(
+        limit=config.limit,
+        limit_per_host=config.limit_per_host,
+        keepalive_timeout=config.keepalive_seconds,
+        use_dns_cache=config.dns_ttl_seconds > 0,
+        ttl_dns_cache=config.dns_ttl_seconds or None,
+    )
+    session = aiohttp.ClientSession(
+        timeout=config.timeout,
+        connector=connector,
+        json_serialize=json_codec.dumps,
+        trace_configs=[counters.trace_config()],
+    )
+    logger.info("aiohttp session for pool %r initialized (limit=%s)", pool, config.limit)
+    return session
+
+
+def init_session(pool: str = DEFAULT_POOL) -> None:
+    global _transport
+    if _transport is not None:
+        return
+    session = _sessions.get(pool)
+    if session is not None and not session.closed:
+        return
+
+    if DADATA_HTTP_CASSETTE and DADATA_HTTP_CASSETTE_MODE == "replay":
+        _transport = ReplaySession(Cassette.load(DADATA_HTTP_CASSETTE))
+        logger.info("HTTP replay from cassette %s", DADATA_HTTP_CASSETTE)
         return
 
-    # Ограничиваем количество одновременных соединений, чтобы не убивать сеть/DaData
-    connector = aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
-    _session = aiohttp.ClientSession(timeout=DEFAULT_TIMEOUT, connector=connector)
-    logger.info("aiohttp session initialized")
+    _sessions[pool] = _create_session(pool)
+    if DADATA_HTTP_CASSETTE and DADATA_HTTP_CASSETTE_MODE == "record" and pool == "dadata":
+        _transport = RecordingSession(_sessions[pool], Cassette(path=DADATA_HTTP_CASSETTE))
+        logger.info("HTTP exchanges are recorded to cassette %s", DADATA_HTTP_CASSETTE)
+
+
+def set_transport(transport: Any) -> None:
+    """Подменить транспорт (``None`` — вернуть обычные сессии)."""
+    global _transport
+    _transport = transport
+
+
+def get_session(pool: str = DEFAULT_POOL) -> aiohttp.ClientSession:
+    """Сессия именованного пула; неизвестное имя получает настройки ``default``."""
+    if _transport is not None:
+        return _transport
+    session = _sessions.get(pool)
+    if session is None or session.closed:
+        init_session(pool)
+        if _transport is not None:
+            return _transport
+        session = _sessions[pool]
+    return session
+
+
+def request_timeout(pool: str, budget: Optional[float]) -> Optional[aiohttp.ClientTimeout]:
+    """Таймаут одного запроса пула, урезанный до ``budget`` секунд (остаток срока
+    обработки); ``None`` — таймаута пула хватает."""
+    config = _pool_config(pool)
+    if budget is None or budget >= config.total_timeout:
+        return None
+    # total=0 у aiohttp означает «без таймаута», поэтому не опускаемся до нуля.
+    budget = max(budget, 0.001)
+    return aiohttp.ClientTimeout(
+        total=budget,
+        sock_connect=min(config.connect_timeout, budget),
+        sock_read=min(config.read_timeout, budget),
+    )
+
+
+def pool_stats() -> dict[str, dict]:
+    """Загрузка пулов: соединения в работе и простаивающие, ожидающие свободного соединения."""
+    stats: dict[str, dict] = {}
+    for name, session in _sessions.items():
+        config = _pool_config(name)
+        counters = _counters.get(name) or _PoolCounters()
+        connector = session.connector
+        # Занятые/свободные соединения aiohttp публично не отдаёт — читаем внутренние поля осторожно.
+        acquired = getattr(connector, "_acquired", None)
+        idle = getattr(connector, "_conns", None)
+        stats[name] = {
+            "limit": config.limit,
+            "limit_per_host": config.limit_per_host,
+            "closed": session.closed,
+            "in_use": len(acquired) if acquired is not None else None,
+            "idle": sum(len(conns) for conns in idle.values()) if idle is not None else None,
+            "waiting": counters.waiting,
+            "queued_total": counters.queued,
+            "created": counters.created,
+            "reused": counters.reused,
+        }
+    return stats
+
+
+async def prewarm(pool: str, url: str, connections: int) -> int:
+    """Открыть до ``connections`` keepalive-соединений пула к хосту ``url``.
+
+    DNS, TCP и TLS оплачиваются заранее, а не первым запросом пользователя.
+    Соединения открывает ``GET`` к ``url`` (корень хоста — без расхода квоты API);
+    запросы идут одновременно, поэтому каждый получает своё соединение. Возвращает
+    число удачных запросов; ошибки только логируются.
+    """
+    if _transport is not None or connections <= 0:
+        return 0
+    session = get_session(pool)
+
+    async def _touch() -> bool:
+        try:
+            async with session.get(url, allow_redirects=False) as resp:
+                await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            logger.debug("Pool %r prewarm request to %s failed: %r", pool, url, exc)
+            return False
+        return True
+
+    started = time.monotonic()
+    warmed = sum(await asyncio.gather(*(_touch() for _ in range(connections))))
+    logger.info(
+        "Pool %r: %s/%s connections to %s warmed in %.3f s", pool, warmed, connections, url, time.monotonic() - started
+    )
+    return warmed
+
 
+async def keep_warm(pool: str, url: str, connections: int, interval: float) -> None:
+    """Держать пул прогретым: раз в ``interval`` секунд повторять ``prewarm``.
 
-def get_session() -> aiohttp.ClientSession:
-    global _session
-    if _session is None or _session.closed:
-        init_session()
-    assert _session is not None
-    return _session
+    Если с прошлой проверки пул обслуживал настоящие запросы, соединения и так
+    живы — пинг пропускается. ``interval`` должен быть меньше keepalive пула.
+    """
+    seen = -1
+    while True:
+        await asyncio.sleep(interval)
+        counters = _counters.get(pool)
+        used = counters.created + counters.reused if counters else 0
+        if used == seen:
+            await prewarm(pool, url, connections)
+            counters = _counters.get(pool)
+            used = counters.created + counters.reused if counters else 0
+        seen = used
 
 
 async def close_session() -> None:
-    global _session
-    if _session and not _session.closed:
-        await _session.close()
-        logger.info("aiohttp session closed")
-    _session = None
+    global _transport
+    if _transport is not None:
+        # Запись сохраняет кассету и закрывает настоящую сессию под собой.
+        await _transport.close()
+        _transport = None
+    for name, session in list(_sessions.items()):
+        if not session.closed:
+            await session.close()
+            logger.info("aiohttp session for pool %r closed", name)
+    _sessions.clear()
@@ -0,0 +1,55 @@
+"""Быстрый JSON-кодек для ответов DaData, кэша и Telegram.
+
+Разбор ответов DaData (списки до 300 филиалов) и сериализация карточек в кэш —
+заметная доля CPU бота. Если установлен ``orjson`` (или ``msgspec``), используется
+он; иначе — стандартный ``json``. Интерфейс у всех вариантов один:
+
+- ``loads(data)`` принимает ``bytes`` или ``str`` — ответ HTTP можно разбирать
+  сразу из байтов, без промежуточного декодирования в строку;
+- ``dumps(value)`` возвращает ``str`` (UTF-8 без ``\\uXXXX``-экранирования);
+- ошибки разбора — ``ValueError``, как у ``json.loads``.
+
+Активный вариант — ``BACKEND``.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgspec = None
+
+
+def _stdlib_dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _select() -> tuple[str, Callable[[bytes | str], Any], Callable[[Any], str]]:
+    if orjson is not None:
+        # orjson.JSONDecodeError — подкласс ValueError.
+        return "orjson", orjson.loads, lambda value: orjson.dumps(value).decode("utf-8")
+
+    if msgspec is not None:
+        decoder = msgspec.json.Decoder()
+        encoder = msgspec.json.Encoder()
+
+        def _msgspec_loads(data: bytes | str) -> Any:
+            try:
+                return decoder.decode(data)
+            except msgspec.DecodeError as exc:
+                raise ValueError(str(exc)) from exc
+
+        return "msgspec", _msgspec_loads, lambda value: encoder.encode(value).decode("utf-8")
+
+    return "json", json.loads, _stdlib_dumps
+
+
+BACKEND, loads, dumps = _select()
@@ -0,0 +1,156 @@
+"""Пул API-ключей DaData с балансировкой нагрузки.
+
+Частота запросов и суточная квота DaData считаются по ключу, поэтому один ключ —
+потолок пропускной способности всего бота. ``KeyPool`` держит несколько ключей,
+у каждого свой ``AdaptiveRateLimiter``, и для очередного запроса выбирает
+наименее загруженный:
+
+- ключ не выведен из ротации и подходит вызывающему (например, по квоте);
+- меньше всего ждать своего слота по лимиту частоты (после 429 ключ стоит на
+  паузе до ``Retry-After`` и сам собой уходит в конец очереди);
+- меньше запросов в полёте;
+- при равенстве — по кругу (round-robin).
+
+Ключ, который DaData отвергла (401/403), выводится из ротации на
+``sideline_seconds``; последний доступный ключ не выводится — без него бот всё
+равно не работает, а ошибки и так видны в логах.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional
+
+from quota import key_fingerprint
+from rate_limit import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class ApiKey:
+    """Ключ DaData со своим лимитом частоты и счётчиками для мониторинга."""
+
+    __slots__ = (
+        "token",
+        "key_id",
+        "limiter",
+        "sidelined_until",
+        "sideline_reason",
+        "in_flight",
+        "requests",
+        "throttled",
+        "rejected",
+    )
+
+    def __init__(self, token: str, limiter: AdaptiveRateLimiter) -> None:
+        self.token = token
+        self.key_id = key_fingerprint(token)
+        self.limiter = limiter
+        self.sidelined_until = 0.0
+        self.sideline_reason = ""
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    @property
+    def auth_header(self) -> str:
+        return f"Token {self.token}"
+
+
+class KeyPool:
+    def __init__(
+        self,
+        keys: Iterable[ApiKey],
+        *,
+        sideline_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.keys = list(keys)
+        self.sideline_seconds = sideline_seconds
+        self._clock = clock
+        self._next = 0
+
+    @classmethod
+    def from_tokens(
+        cls,
+        tokens: Iterable[str],
+        *,
+        rate: float,
+        burst: Optional[float] = None,
+        min_rate: float = 0.5,
+        sideline_seconds: float = 3600.0,
+    ) -> "KeyPool":
+        # Повторы в списке не дают второго лимита — DaData считает по ключу.
+        unique = dict.fromkeys(token for token in tokens if token)
+        return cls(
+            (ApiKey(token, AdaptiveRateLimiter(rate, burst, min_rate=min_rate)) for token in unique),
+            sideline_seconds=sideline_seconds,
+        )
+
+    def available(self) -> list[ApiKey]:
+        """Ключи, не выведенные из ротации."""
+        now = self._clock()
+        return [key for key in self.keys if key.sidelined_until <= now]
+
+    def pick(self, accept: Callable[[ApiKey], bool] = lambda key: True) -> Optional[ApiKey]:
+        """Наименее загруженный доступный ключ, для которого ``accept`` истинно; ``None`` — такого нет."""
+        candidates = [key for key in self.available() if accept(key)]
+        if not candidates:
+            return None
+        # Сдвигаем начало перебора: min() берёт первый из равных, так равные ключи идут по кругу.
+        start = self._next % len(candidates)
+        rotated = candidates[start:] + candidates[:start]
+        self._next += 1
+        return min(rotated, key=lambda key: (key.limiter.delay(), key.in_flight))
+
+    @contextmanager
+    def use(self, key: ApiKey) -> Iterator[ApiKey]:
+        """Учитывает запрос с ключом как выполняющийся."""
+        key.in_flight += 1
+        key.requests += 1
+        try:
+            yield key
+        finally:
+            key.in_flight -= 1
+
+    def on_throttled(self, key: ApiKey, retry_after: Optional[float] = None) -> None:
+        """HTTP 429: ключ встаёт на паузу в своём лимитере, остальные продолжают работать."""
+        key.throttled += 1
+        key.limiter.on_throttled(retry_after)
+
+    def sideline(self, key: ApiKey, reason: str, seconds: Optional[float] = None) -> bool:
+        """Вывести ключ из ротации. ``False`` — не выведен, потому что он последний доступный."""
+        key.rejected += 1
+        now = self._clock()
+        if not any(other is not key and other.sidelined_until <= now for other in self.keys):
+            return False
+        key.sidelined_until = now + (self.sideline_seconds if seconds is None else seconds)
+        key.sideline_reason = reason
+        logger.error("Ключ DaData %s выведен из ротации на %.0f с: %s", key.key_id, key.sidelined_until - now, reason)
+        return True
+
+    def reset(self) -> None:
+        """Вернуть все ключи в ротацию (например, после замены ключей в тарифе)."""
+        for key in self.keys:
+            key.sidelined_until = 0.0
+            key.sideline_reason = ""
+
+    def snapshot(self) -> list[dict]:
+        """Состояние ключей для мониторинга (сами ключи не раскрываются)."""
+        now = self._clock()
+        return [
+            {
+                "key_id": key.key_id,
+                "rate_limit_rps": key.limiter.rate,
+                "in_flight": key.in_flight,
+                "requests": key.requests,
+                "throttled": key.throttled,
+                "rejected": key.rejected,
+                "sidelined_for": max(0.0, key.sidelined_until - now),
+                "sideline_reason": key.sideline_reason if key.sidelined_until > now else "",
+            }
+            for key in self.keys
+        ]
@@ -37,6 +37,13 @@ CB_ACT_MENU = "act:menu"
 CB_ACT_EXPORT = "act:export"
 CB_ACT_CRM = "act:crm"
 CB_PAGE_DETAILS = "page:details"
+CB_PAGE_BRANCHES = "page:branches"
+# Страница списка филиалов: "branches:<номер с нуля>".
+CB_BRANCHES_PAGE_PREFIX = "branches:"
+# Поиск по названию: страница результатов "search:page:<номер с нуля>"
+# и выбор организации "search:open:<номер результата с нуля>".
+CB_SEARCH_PAGE_PREFIX = "search:page:"
+CB_SEARCH_OPEN_PREFIX = "search:open:"
 
 
 def reply_main_menu_kb() -> ReplyKeyboardMarkup:
@@ -79,6 +86,9 @@ def inline_actions_kb() -> InlineKeyboardMarkup:
                 InlineKeyboardButton(text="🏛️ Органы", callback_data=CB_PAGE_AUTHORITIES),
                 InlineKeyboardButton(text="📦 Госконтракты", callback_data=CB_PAGE_CONTRACTS),
             ],
+            [
+                InlineKeyboardButton(text="🏢 Филиалы", callback_data=CB_PAGE_BRANCHES),
+            ],
             [
                 InlineKeyboardButton(text="Новый ИНН", callback_data=CB_ACT_NEW_INN),
                 InlineKeyboardButton(text="Меню", callback_data=CB_ACT_MENU),
@@ -89,3 +99,42 @@ def inline_actions_kb() -> InlineKeyboardMarkup:
             ],
         ]
     )
+
+
+def branches_pager_kb(page: int, has_more: bool) -> InlineKeyboardMarkup:
+    """Листание списка филиалов и возврат к карточке."""
+    pager = []
+    if page > 0:
+        pager.append(InlineKeyboardButton(text="◀️ Пред.", callback_data=f"{CB_BRANCHES_PAGE_PREFIX}{page - 1}"))
+    if has_more:
+        pager.append(InlineKeyboardButton(text="След. ▶️", callback_data=f"{CB_BRANCHES_PAGE_PREFIX}{page + 1}"))
+    rows = [pager] if pager else []
+    rows.append(
+        [
+            InlineKeyboardButton(text="назад", callback_data=CB_NAV_BACK),
+            InlineKeyboardButton(text="домой", callback_data=CB_NAV_HOME),
+        ]
+    )
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def search_results_kb(labels: list[str], start: int, page: int, has_more: bool) -> InlineKeyboardMarkup:
+    """Кнопки результатов поиска на странице (``start`` — номер первого с нуля) и листание."""
+    rows = [
+        [InlineKeyboardButton(text=label, callback_data=f"{CB_SEARCH_OPEN_PREFIX}{start + offset}")]
+        for offset, label in enumerate(labels)
+    ]
+    pager = []
+    if page > 0:
+        pager.append(InlineKeyboardButton(text="◀️ Пред.", callback_data=f"{CB_SEARCH_PAGE_PREFIX}{page - 1}"))
+    if has_more:
+        pager.append(InlineKeyboardButton(text="След. ▶️", callback_data=f"{CB_SEARCH_PAGE_PREFIX}{page + 1}"))
+    if pager:
+        rows.append(pager)
+    rows.append(
+        [
+            InlineKeyboardButton(text="Новый ИНН", callback_data=CB_ACT_NEW_INN),
+            InlineKeyboardButton(text="Меню", callback_data=CB_ACT_MENU),
+        ]
+    )
+    return InlineKeyboardMarkup(inline_keyboard=rows)
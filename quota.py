@@ -0,0 +1,234 @@
+"""Учёт суточной квоты платных запросов к DaData.
+
+DaData считает запросы по ключу за календарные сутки (по московскому времени)
+и при исчерпании тарифа начинает отказывать. ``QuotaLedger`` считает исходящие
+запросы по ключу и дню, хранит счётчики в SQLite (переживают рестарт) и по
+настроенному бюджету сообщает режим работы:
+
+- ``ok`` — запросы идут как обычно;
+- ``soft`` — израсходовано ``soft_ratio`` бюджета: фоновые и пакетные запросы
+  (обновление устаревших карточек, прогрев, списки ИНН) больше не тратят квоту,
+  одиночные проверки пользователей ещё проходят;
+- ``hard`` — бюджет исчерпан: только кэш (в том числе устаревшие записи).
+
+Бюджет ``0`` — без ограничения (счётчики всё равно ведутся). Бюджет задаётся на
+один ключ: ``state(key_id)`` — режим конкретного ключа, ``state()`` — режим пула
+``key_ids``, то есть самого свободного из его ключей (пока хоть один ключ не
+исчерпан, запросы идут через него).
+
+Счётчик в памяти обновляется сразу, а запись в SQLite при запущенном цикле событий
+уходит в фоновый поток и копится там пачкой — ``record`` не ждёт диска.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+QUOTA_OK = "ok"
+QUOTA_SOFT = "soft"
+QUOTA_HARD = "hard"
+
+# Сутки DaData считаются по Москве.
+_DADATA_TZ = timezone(timedelta(hours=3))
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Короткий идентификатор ключа для счётчиков и логов (сам ключ не сохраняется)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class QuotaLedger:
+    def __init__(
+        self,
+        path: str = "",
+        *,
+        daily_budget: int = 0,
+        soft_ratio: float = 0.9,
+        key_ids: Iterable[str] = (),
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.daily_budget = max(0, daily_budget)
+        self.soft_ratio = min(max(soft_ratio, 0.0), 1.0)
+        self.key_ids = tuple(key_ids)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._day = self._today()
+        self._counts: Counter[str] = Counter()
+        self._warned: set[tuple[str, str]] = set()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        # Ещё не записанные в SQLite приращения: (день, ключ) -> число запросов.
+        self._pending: Counter[tuple[str, str]] = Counter()
+        # Отдельная блокировка, чтобы record не ждал идущей записи в SQLite.
+        self._pending_lock = threading.Lock()
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dadata_quota ("
+                " day TEXT NOT NULL,"
+                " key_id TEXT NOT NULL,"
+                " used INTEGER NOT NULL,"
+                " PRIMARY KEY (day, key_id))"
+            )
+            self._load_day()
+
+    def record(self, key_id: str, n: int = 1) -> None:
+        """Учесть ``n`` исходящих запросов с ключом ``key_id``."""
+        self._roll_day()
+        self._counts[key_id] += n
+        if self._conn is not None:
+            with self._pending_lock:
+                # Поток записи уже запланирован, если в очереди что-то есть — он заберёт и это.
+                scheduled = bool(self._pending)
+                self._pending[(self._day, key_id)] += n
+            if not scheduled:
+                self._schedule_write()
+        self._warn_on_threshold(key_id)
+
+    def flush(self) -> None:
+        """Дождаться записи накопленных счётчиков в SQLite (перед остановкой, в тестах)."""
+        if self._writer is not None:
+            self._writer.submit(lambda: None).result()
+        else:
+            self._write_pending()
+
+    def used(self, key_id: Optional[str] = None) -> int:
+        """Израсходовано за текущие сутки — по ключу или суммарно."""
+        self._roll_day()
+        if key_id is None:
+            return sum(self._counts.values())
+        return self._counts[key_id]
+
+    def state(self, key_id: Optional[str] = None) -> str:
+        """Режим ключа ``key_id`` или, без ключа, всего пула (см. ``pool_state``)."""
+        if key_id is None:
+            return self.pool_state(self._pool_keys())
+        if not self.daily_budget:
+            return QUOTA_OK
+        used = self.used(key_id)
+        if used >= self.daily_budget:
+            return QUOTA_HARD
+        if used >= self.daily_budget * self.soft_ratio:
+            return QUOTA_SOFT
+        return QUOTA_OK
+
+    def pool_state(self, key_ids: Iterable[str]) -> str:
+        """Режим пула — по самому свободному ключу: пустой пул считается свободным."""
+        states = {self.state(key_id) for key_id in key_ids} or {QUOTA_OK}
+        for state in (QUOTA_OK, QUOTA_SOFT):
+            if state in states:
+                return state
+        return QUOTA_HARD
+
+    def snapshot(self) -> dict:
+        """Расход квоты для мониторинга."""
+        used = self.used()
+        keys = self._pool_keys()
+        remaining = None
+        if self.daily_budget:
+            # Бюджет на ключ, поэтому остаток пула — сумма остатков его ключей.
+            remaining = sum(max(0, self.daily_budget - self.used(key_id)) for key_id in keys or ("",))
+        return {
+            "day": self._day,
+            "state": self.state(),
+            "used": used,
+            "budget": self.daily_budget,
+            "remaining": remaining,
+            "by_key": dict(self._counts),
+            "by_key_state": {key_id: self.state(key_id) for key_id in self._counts},
+        }
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        if self._conn is not None:
+            self._write_pending()
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    def _pool_keys(self) -> tuple[str, ...]:
+        # Без явного пула — ключи, по которым уже были запросы.
+        return self.key_ids or tuple(self._counts)
+
+    def _schedule_write(self) -> None:
+        """Записать накопленное: при запущенном цикле событий — в фоновом потоке, без цикла — сразу."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_pending()
+            return
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dadata-quota")
+        self._writer.submit(self._write_pending)
+
+    def _write_pending(self) -> None:
+        with self._pending_lock:
+            rows = [(day, key_id, n) for (day, key_id), n in self._pending.items()]
+            self._pending.clear()
+        if not rows:
+            return
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO dadata_quota (day, key_id, used) VALUES (?, ?, ?)"
+                    " ON CONFLICT (day, key_id) DO UPDATE SET used = used + excluded.used",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as exc:
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+                logger.warning("Не удалось сохранить счётчик квоты DaData: %s", exc)
+
+    def _today(self) -> str:
+        return datetime.fromtimestamp(self._clock(), _DADATA_TZ).date().isoformat()
+
+    def _roll_day(self) -> None:
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._counts.clear()
+            self._warned.clear()
+
+    def _load_day(self) -> None:
+        assert self._conn is not None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key_id, used FROM dadata_quota WHERE day = ?", (self._day,)
+            ).fetchall()
+            # Прошлые сутки для решений не нужны — оставляем только неделю для отчётов.
+            week_ago = (datetime.fromisoformat(self._day) - timedelta(days=7)).date().isoformat()
+            self._conn.execute("DELETE FROM dadata_quota WHERE day < ?", (week_ago,))
+        self._counts.update(dict(rows))
+
+    def _warn_on_threshold(self, key_id: str) -> None:
+        state = self.state(key_id)
+        if state == QUOTA_OK or (key_id, state) in self._warned:
+            return
+        self._warned.add((key_id, state))
+        logger.warning(
+            "Квота DaData по ключу %s: израсходовано %s из %s за %s — режим %s",
+            key_id,
+            self.used(key_id),
+            self.daily_budget,
+            self._day,
+            state,
+        )
@@ -0,0 +1,107 @@
+"""Адаптивный ограничитель частоты запросов к внешним API (token bucket + AIMD).
+
+Семафор ограничивает только число одновременных запросов, но не их частоту.
+Здесь — «ведро токенов»:
+- ``rate`` токенов в секунду, не больше ``burst`` в запасе;
+- каждый запрос забирает один токен, при пустом ведре ждёт пополнения;
+- на 429 частота уменьшается в ``decrease_factor`` раз (multiplicative decrease),
+  а все запросы ставятся на паузу до ``Retry-After``;
+- каждый успешный ответ добавляет ``increase_step`` к частоте (additive increase)
+  вплоть до исходного ``max_rate``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+
+def parse_retry_after(value: Optional[str], *, now: Optional[datetime] = None) -> Optional[float]:
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата) в секунды ожидания."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """Token bucket в форме GCRA: вместо счётчика токенов хранится «теоретическое
+    время прихода» следующего запроса (``_tat``). Это эквивалентно ведру ёмкостью
+    ``burst``, но не требует блокировок: каждый вызов ``acquire()`` сразу резервирует
+    себе слот и спит до него, поэтому ожидающие обслуживаются по порядку.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        *,
+        min_rate: float = 0.5,
+        increase_step: float = 0.1,
+        decrease_factor: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self.max_rate = max(rate, min_rate)
+        self.min_rate = min_rate
+        self.rate = self.max_rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self._clock = clock
+        self._sleep = sleep
+        self._tat = 0.0
+        self._blocked_until = 0.0
+
+    async def acquire(self, max_wait: Optional[float] = None) -> bool:
+        """Резервирует слот для запроса и ждёт его наступления.
+
+        Возвращает ``False`` без ожидания, если ждать пришлось бы дольше ``max_wait``.
+        """
+        now = self._clock()
+        tat, wait = self._next_slot(now)
+        if max_wait is not None and wait > max_wait:
+            return False
+        self._tat = tat + 1 / self.rate
+        while wait > 0:
+            await self._sleep(wait)
+            # Пока спали, мог прийти 429 — тогда дожидаемся конца паузы.
+            wait = self._blocked_until - self._clock()
+        return True
+
+    def delay(self) -> float:
+        """Сколько ``acquire()`` ждал бы сейчас (слот не резервируется)."""
+        return max(0.0, self._next_slot(self._clock())[1])
+
+    def _next_slot(self, now: float) -> tuple[float, float]:
+        interval = 1 / self.rate
+        tat = max(self._tat, now, self._blocked_until)
+        wait = tat - (self.burst - 1) * interval - now
+        if self._blocked_until > now:
+            wait = max(wait, self._blocked_until - now)
+        return tat, wait
+
+    def on_success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        now = self._clock()
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self._blocked_until = max(self._blocked_until, now + pause)
+        # Сбрасываем накопленный запас: после паузы снова начинаем с одного запроса.
+        self._tat = max(self._tat, self._blocked_until + (self.burst - 1) / self.rate)
@@ -0,0 +1,507 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import json_codec
+from cache import NOT_FOUND, CacheStoreError, RedisCacheStore, SQLiteCacheStore, TTLCache, serialized_size
+
+
+class _FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+
+    def test_get_returns_value_until_ttl_expires(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock)
+        cache.set("a", 1)
+        self.clock.now += 9
+        self.assertEqual(cache.get("a"), 1)
+        self.clock.now += 1
+        self.assertIsNone(cache.get("a"))
+
+    def test_evicts_least_recently_used_key(self):
+        cache = TTLCache(ttl_seconds=100, max_items=2, clock=self.clock)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # Обращение к "a" делает её свежей — вытесняться должна "b".
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_entries_are_purged_before_lru_eviction(self):
+        cache = TTLCache(ttl_seconds=100, max_items=2, clock=self.clock)
+        cache.set("short", 1, ttl_seconds=1)
+        cache.set("long", 2)
+        self.clock.now += 5
+        cache.set("new", 3)
+
+        self.assertEqual(cache.get("long"), 2)
+        self.assertEqual(cache.get("new"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_overwrite_keeps_latest_expiry(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock)
+        cache.set("a", 1)
+        self.clock.now += 8
+        cache.set("a", 2)
+        self.clock.now += 5
+        # Старая запись кучи (expires_at=1010) не должна удалить новое значение.
+        cache.set("b", 3)
+        self.assertEqual(cache.get("a"), 2)
+
+    def test_expiry_heap_stays_bounded_under_overwrites(self):
+        cache = TTLCache(ttl_seconds=100, max_items=10, clock=self.clock)
+        for i in range(10_000):
+            cache.set(f"k{i % 5}", i)
+        self.assertLessEqual(len(cache._expiry), 2 * len(cache) + 65)
+
+    def test_not_found_is_distinct_from_miss(self):
+        cache = TTLCache(ttl_seconds=100, max_items=10, clock=self.clock)
+        cache.set("absent", NOT_FOUND, ttl_seconds=5)
+        self.assertIs(cache.get("absent"), NOT_FOUND)
+        self.assertIsNone(cache.get("unknown"))
+        self.clock.now += 5
+        self.assertIsNone(cache.get("absent"))
+
+    def test_get_stale_serves_expired_value_within_grace(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock, stale_seconds=5)
+        cache.set("a", 1)
+        self.assertEqual(cache.get_stale("a"), (1, False))
+        self.clock.now += 12
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get_stale("a"), (1, True))
+        self.clock.now += 3
+        self.assertEqual(cache.get_stale("a"), (None, False))
+        self.assertEqual(len(cache), 0)
+
+    def test_clear_drops_everything(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock)
+        cache.set("a", 1)
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class TTLCacheStatsTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+
+    def test_counts_hits_misses_and_negative_hits(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock, name="party")
+        cache.set("a", {"inn": "7707083893"})
+        cache.set("b", NOT_FOUND)
+        cache.get("a")
+        cache.get("b")
+        cache.get("c")
+
+        stats = cache.stats()
+        self.assertEqual(stats["name"], "party")
+        self.assertEqual((stats["hits"], stats["negative_hits"], stats["misses"]), (1, 1, 1))
+        self.assertEqual(stats["sets"], 2)
+        self.assertAlmostEqual(stats["hit_ratio"], 2 / 3)
+
+    def test_counts_expirations_and_evictions_by_reason(self):
+        cache = TTLCache(ttl_seconds=10, max_items=2, clock=self.clock)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+        cache.delete("b")
+        self.clock.now += 10
+        cache.get("c")
+        cache.set("d", 4)
+        cache.clear()
+
+        stats = cache.stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["evictions"], {"capacity": 1, "delete": 1, "clear": 1})
+
+    def test_tracks_approximate_bytes(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock, max_bytes=10**9)
+        cache.set("small", {"inn": "1"})
+        small = cache.stats()["approx_bytes"]
+        cache.set("big", {"branches": [str(i) * 1000 for i in range(10)]})
+        self.assertGreater(cache.stats()["approx_bytes"], small + 10000)
+
+        cache.delete("big")
+        self.assertEqual(cache.stats()["approx_bytes"], small)
+        cache.clear()
+        self.assertEqual(cache.stats()["approx_bytes"], 0)
+
+    def test_stale_hits_are_counted_separately(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock, stale_seconds=5)
+        cache.set("a", 1)
+        self.clock.now += 12
+        cache.get_stale("a")
+        self.assertEqual(cache.stats()["stale_hits"], 1)
+        self.assertEqual(cache.stats()["hits"], 0)
+
+
+class TTLCacheByteBudgetTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+
+    def _cache(self, max_bytes):
+        return TTLCache(ttl_seconds=100, max_items=100, clock=self.clock, sizeof=len, max_bytes=max_bytes)
+
+    def test_evicts_lru_entries_until_under_budget(self):
+        cache = self._cache(10)
+        cache.set("a", "xxxx")
+        cache.set("b", "xxxx")
+        cache.get("a")
+        cache.set("c", "xxxx")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "xxxx")
+        self.assertEqual(cache.get("c"), "xxxx")
+        self.assertEqual(cache.stats()["approx_bytes"], 8)
+        self.assertEqual(cache.stats()["evictions"], {"bytes": 1})
+
+    def test_oversized_entry_is_not_kept_in_memory(self):
+        cache = self._cache(10)
+        cache.set("a", "xxxx")
+        cache.set("big", "x" * 11)
+
+        self.assertIsNone(cache.get("big"))
+        self.assertEqual(cache.get("a"), "xxxx")
+        self.assertEqual(cache.stats()["evictions"], {"oversize": 1})
+
+    def test_overwrite_replaces_previous_size(self):
+        cache = self._cache(10)
+        cache.set("a", "xxxxxxxx")
+        cache.set("a", "xx")
+        self.assertEqual(cache.stats()["approx_bytes"], 2)
+
+    def test_zero_budget_means_count_limit_only(self):
+        cache = self._cache(0)
+        cache.set("a", "x" * 1000)
+        self.assertEqual(cache.get("a"), "x" * 1000)
+
+    def test_budget_counts_branch_lists_by_json_length(self):
+        branches = [{"value": f"Филиал {i}", "data": {"kpp": str(i)}} for i in range(300)]
+        size = len(json_codec.dumps(branches))
+        cache = TTLCache(ttl_seconds=100, max_items=100, clock=self.clock, max_bytes=2 * size)
+        for key in ("a", "b", "c"):
+            cache.set(key, branches)
+
+        self.assertEqual(cache.stats()["approx_bytes"], 2 * size)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["evictions"], {"bytes": 1})
+
+    def test_size_is_not_estimated_without_budget(self):
+        sizes = []
+
+        def sizeof(value):
+            sizes.append(value)
+            return 1
+
+        cache = TTLCache(ttl_seconds=100, max_items=100, clock=self.clock, sizeof=sizeof)
+        cache.set("a", ["branch"] * 300)
+        self.assertEqual(sizes, [])
+        self.assertEqual(cache.stats()["approx_bytes"], 0)
+
+    def test_default_estimate_is_serialized_length(self):
+        class _Model:
+            def to_json(self):
+                return '{"inn": "7707083893"}'
+
+        self.assertEqual(serialized_size(_Model()), len('{"inn": "7707083893"}'))
+        self.assertEqual(serialized_size({"a": [1, 2]}), len(json_codec.dumps({"a": [1, 2]})))
+        cache = TTLCache(ttl_seconds=100, max_items=100, clock=self.clock, max_bytes=30)
+        cache.set("a", _Model())
+        cache.set("b", _Model())
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["evictions"], {"bytes": 1})
+
+
+class TTLCacheAliasTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+
+    def test_alias_serves_same_object_without_copy(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock)
+        value = {"inn": "7707083893"}
+        cache.set("7707083893", value)
+        bytes_before = cache.stats()["approx_bytes"]
+        cache.alias("1027700132195", "7707083893")
+
+        self.assertIs(cache.get("1027700132195"), value)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()["approx_bytes"], bytes_before)
+
+    def test_alias_replaces_duplicate_entry(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock)
+        cache.set("ogrn", {"copy": 1})
+        cache.set("inn", {"copy": 2})
+        cache.alias("ogrn", "inn")
+
+        self.assertEqual(cache.get("ogrn"), {"copy": 2})
+        self.assertEqual(len(cache), 1)
+
+    def test_alias_dies_with_target(self):
+        cache = TTLCache(ttl_seconds=10, max_items=1, clock=self.clock)
+        cache.set("inn", 1)
+        cache.alias("ogrn", "inn")
+        cache.set("other", 2)
+
+        self.assertIsNone(cache.get("ogrn"))
+        self.assertEqual(cache.stats()["aliases"], 0)
+
+    def test_set_on_alias_key_detaches_it(self):
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=self.clock)
+        cache.set("inn", 1)
+        cache.alias("ogrn", "inn")
+        cache.set("ogrn", 2)
+
+        self.assertEqual(cache.get("ogrn"), 2)
+        self.assertEqual(cache.get("inn"), 1)
+
+
+class SQLiteCacheStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+        self.wall = _FakeClock(now=1_700_000_000.0)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "cache.sqlite3")
+
+    def _store(self, namespace="party"):
+        store = SQLiteCacheStore(self.path, namespace, clock=self.wall)
+        self.addCleanup(store.close)
+        return store
+
+    def test_value_survives_restart(self):
+        cache = TTLCache(ttl_seconds=60, max_items=10, clock=self.clock, store=self._store())
+        cache.set("a", {"value": "ООО Тест"})
+
+        # «Рестарт»: новый кэш в памяти поверх того же файла.
+        restarted = TTLCache(ttl_seconds=60, max_items=10, clock=_FakeClock(0.0), store=self._store())
+        self.assertEqual(restarted.get("a"), {"value": "ООО Тест"})
+        self.assertEqual(len(restarted), 1)
+
+    def test_disk_entry_respects_original_ttl(self):
+        cache = TTLCache(ttl_seconds=60, max_items=10, clock=self.clock, store=self._store())
+        cache.set("a", 1)
+        self.wall.now += 50
+
+        restarted_clock = _FakeClock(0.0)
+        restarted = TTLCache(ttl_seconds=60, max_items=10, clock=restarted_clock, store=self._store())
+        self.assertEqual(restarted.get("a"), 1)
+        # В памяти запись живёт только остаток TTL (10 с), а не полный срок.
+        restarted_clock.now += 10
+        self.wall.now += 10
+        self.assertIsNone(restarted.get("a"))
+
+    def test_not_found_sentinel_roundtrips_through_disk(self):
+        self._store().set("a", NOT_FOUND, 60)
+        restarted = TTLCache(ttl_seconds=60, max_items=10, clock=self.clock, store=self._store())
+        self.assertIs(restarted.get("a"), NOT_FOUND)
+
+    def test_namespaces_are_isolated(self):
+        self._store("party").set("a", 1, 60)
+        self.assertIsNone(self._store("branches").get("a"))
+
+    def test_delete_and_clear_reach_disk(self):
+        store = self._store()
+        cache = TTLCache(ttl_seconds=60, max_items=10, clock=self.clock, store=store)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.delete("a")
+        self.assertIsNone(store.get("a"))
+        cache.clear()
+        self.assertIsNone(store.get("b"))
+
+    def test_get_many_reads_disk_misses_in_one_query(self):
+        store = self._store()
+        store.set("a", 1, 60)
+        store.set("b", NOT_FOUND, 60)
+        cache = TTLCache(ttl_seconds=60, max_items=10, clock=self.clock, store=store)
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get_many(["a", "b", "c", "missing"]), {"a": 1, "b": NOT_FOUND, "c": 3})
+        self.assertEqual(len(cache), 3)
+
+
+class _FakeRedis:
+    """Локальная замена сервера Redis: те же команды, время задаётся вручную."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+        self.round_trips = 0
+        self.fail = False
+        # Потоки, из которых шли сетевые вызовы.
+        self.threads = set()
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis is down")
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is None or entry[1] <= self.clock():
+            self.data.pop(key, None)
+            return None
+        return entry
+
+    def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    def pttl(self, key):
+        entry = self._live(key)
+        return int((entry[1] - self.clock()) * 1000) if entry else -2
+
+    def set(self, key, value, px):
+        self._check()
+        self.round_trips += 1
+        self.threads.add(threading.get_ident())
+        self.data[key] = (value.encode("utf-8"), self.clock() + px / 1000)
+
+    def delete(self, *keys):
+        self._check()
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match, count=None):
+        prefix = match.rstrip("*")
+        return [key for key in list(self.data) if key.startswith(prefix)]
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def close(self):
+        pass
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    def get(self, key):
+        self._commands.append((self._redis.get, key))
+
+    def pttl(self, key):
+        self._commands.append((self._redis.pttl, key))
+
+    def execute(self):
+        self._redis._check()
+        self._redis.round_trips += 1
+        self._redis.threads.add(threading.get_ident())
+        return [command(key) for command, key in self._commands]
+
+
+class RedisCacheStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+        self.redis = _FakeRedis(_FakeClock(now=1_700_000_000.0))
+
+    def _cache(self, namespace="party"):
+        store = RedisCacheStore(self.redis, namespace)
+        return TTLCache(ttl_seconds=60, max_items=10, clock=self.clock, store=store)
+
+    def test_replicas_share_entries(self):
+        self._cache().set("a", {"value": "ООО Тест"})
+        replica = self._cache()
+        self.assertEqual(replica.get("a"), {"value": "ООО Тест"})
+        self.assertEqual(replica.stats()["store_hits"], 1)
+
+    def test_remaining_ttl_comes_from_server(self):
+        self._cache().set("a", 1)
+        self.redis.clock.now += 50
+        replica = self._cache()
+        self.assertEqual(replica.get("a"), 1)
+        self.clock.now += 10
+        self.redis.clock.now += 10
+        self.assertIsNone(replica.get("a"))
+
+    def test_get_many_uses_single_pipeline(self):
+        writer = self._cache()
+        writer.set("a", 1)
+        writer.set("b", NOT_FOUND)
+        self.redis.round_trips = 0
+
+        replica = self._cache()
+        self.assertEqual(replica.get_many(["a", "b", "c"]), {"a": 1, "b": NOT_FOUND})
+        self.assertEqual(self.redis.round_trips, 1)
+        # Дальше — из near-cache в памяти, без обращений к серверу.
+        self.assertEqual(replica.get_many(["a", "b"]), {"a": 1, "b": NOT_FOUND})
+        self.assertEqual(self.redis.round_trips, 1)
+
+    def test_namespaces_are_isolated_and_clear_is_scoped(self):
+        self._cache("party").set("a", 1)
+        self._cache("branches").set("a", 2)
+        self._cache("party").clear()
+        self.assertIsNone(self._cache("party").get("a"))
+        self.assertEqual(self._cache("branches").get("a"), 2)
+
+    def test_server_errors_fall_back_to_memory(self):
+        cache = self._cache()
+        self.redis.fail = True
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        with self.assertRaises(CacheStoreError):
+            RedisCacheStore(self.redis, "party").get("b")
+
+    def test_store_is_skipped_for_cooldown_after_error(self):
+        cache = self._cache()
+        self.redis.fail = True
+        self.assertIsNone(cache.get("a"))
+        self.redis.fail = False
+        self.redis.round_trips = 0
+
+        # В период охлаждения сервер не опрашивается и не получает записи.
+        self.assertIsNone(cache.get("b"))
+        cache.set("c", 1)
+        self.assertEqual(self.redis.round_trips, 0)
+        self.assertEqual(cache.stats()["store_errors"], 1)
+
+        self.clock.now += cache.store_cooldown
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(self.redis.round_trips, 1)
+
+
+class RedisCacheStoreAsyncTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+        self.redis = _FakeRedis(_FakeClock(now=1_700_000_000.0))
+
+    def _cache(self):
+        return TTLCache(ttl_seconds=60, max_items=10, clock=self.clock, store=RedisCacheStore(self.redis, "party"))
+
+    async def test_network_calls_run_outside_event_loop(self):
+        writer = self._cache()
+        writer.set("a", 1)
+        writer.flush()
+        replica = self._cache()
+
+        self.assertEqual(await replica.aget_many(["a", "b"]), {"a": 1})
+        self.assertEqual(await replica.aget_stale("c"), (None, False))
+        self.assertEqual(self.redis.round_trips, 3)
+        self.assertNotIn(threading.get_ident(), self.redis.threads)
+
+    async def test_writes_keep_order(self):
+        cache = self._cache()
+        for value in range(5):
+            cache.set("a", value)
+        cache.delete("b")
+        cache.flush()
+
+        self.assertEqual(self._cache().get("a"), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
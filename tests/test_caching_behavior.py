@@ -1,14 +1,24 @@
+import json
 import unittest
 from unittest.mock import patch
 
 import dadata_direct
 
 
+class _FakeContent:
+    def __init__(self, data):
+        self._data = data
+
+    async def read(self, n=-1):
+        return self._data if n < 0 else self._data[:n]
+
+
 class _FakeResponse:
     def __init__(self, status=200, json_data=None, text_data=""):
         self.status = status
         self._json_data = json_data or {}
         self._text_data = text_data
+        self.content = _FakeContent(text_data.encode("utf-8"))
 
     async def __aenter__(self):
         return self
@@ -16,11 +26,8 @@ class _FakeResponse:
     async def __aexit__(self, exc_type, exc, tb):
         return None
 
-    async def json(self):
-        return self._json_data
-
-    async def text(self):
-        return self._text_data
+    async def read(self):
+        return json.dumps(self._json_data).encode("utf-8")
 
 
 class _FakeSession:
@@ -48,11 +55,11 @@ class CachingBehaviorTests(unittest.IsolatedAsyncioTestCase):
 
             # Должен быть сохранён одиночный элемент в _PARTY_CACHE под ключом query
             cached = dadata_direct._PARTY_CACHE.get("7707083893")
-            self.assertEqual(cached, {"value": "main-item"})
+            self.assertEqual(cached.raw, {"value": "main-item"})
 
             # Повторный вызов fetch_company должен вернуть значение из кэша и не инкрементировать вызовы сессии
             result = await dadata_direct.fetch_company("7707083893")
-            self.assertEqual(result, {"value": "main-item"})
+            self.assertEqual(result.raw, {"value": "main-item"})
             self.assertEqual(session.calls, 1)
 
     async def test_branch_search_caches_in_branches_cache(self):
@@ -0,0 +1,53 @@
+import unittest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class _FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_rate=0.5, window=4, min_calls=4, reset_timeout=10, clock=self.clock
+        )
+
+    def test_opens_when_failure_rate_reaches_threshold(self):
+        for ok in (True, False, True):
+            self.breaker.record_success() if ok else self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.snapshot()["rejected_count"], 1)
+
+    def test_half_open_allows_single_probe(self):
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now += 10
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_reopens(self):
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now += 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.snapshot()["opened_count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
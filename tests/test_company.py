@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from cache import SQLiteCacheStore, TTLCache
+from company import Company, Person
+
+
+SUGGESTION = {
+    "value": 'ООО "Тест"',
+    "data": {
+        "name": {"short_with_opf": 'ООО "Тест"', "full_with_opf": 'Общество "Тест"'},
+        "inn": "7707083893",
+        "state": {"status": "ACTIVE", "registration_date": 1672531200000},
+        "address": {"value": "г Москва", "unrestricted_value": "109000, г Москва"},
+        "management": {"name": "Петров П.П.", "post": "Директор"},
+        "founders": [{"name": "Иванов И.И.", "share": {"value": 5000, "type": "RUB"}}, "garbage"],
+        "phones": [{"value": "+7 900"}, {"value": ""}, {}],
+        "okveds": "not-a-list",
+        "authorities": {"fts_registration": None},
+    },
+}
+
+
+class CompanyModelTests(unittest.TestCase):
+    def test_projects_rendered_fields(self):
+        company = Company.from_suggestion(SUGGESTION)
+        self.assertEqual(company.short_name, 'ООО "Тест"')
+        self.assertEqual(company.address_full, "109000, г Москва")
+        self.assertEqual(company.manager, Person(name="Петров П.П.", post="Директор"))
+        self.assertEqual(company.founders, (Person(name="Иванов И.И.", share_value=5000, share_type="RUB"),))
+        self.assertEqual(company.phones, ("+7 900",))
+        self.assertEqual(company.okveds_count, 0)
+        self.assertIsNone(company.tax_authority_name)
+        self.assertEqual(company.state, {"status": "ACTIVE", "code": None})
+
+    def test_raw_payload_is_kept_for_full_dump(self):
+        company = Company.from_suggestion(SUGGESTION)
+        self.assertEqual(company.raw, SUGGESTION)
+        self.assertEqual(company.data["inn"], "7707083893")
+        self.assertEqual(Company.from_json(company.to_json()), company)
+
+    def test_coerce_accepts_model_dict_and_garbage(self):
+        company = Company.from_suggestion(SUGGESTION)
+        self.assertIs(Company.coerce(company), company)
+        self.assertEqual(Company.coerce(SUGGESTION), company)
+        self.assertIsNone(Company.coerce(None).inn)
+
+    def test_uses_slots(self):
+        company = Company.from_suggestion(SUGGESTION)
+        self.assertFalse(hasattr(company, "__dict__"))
+
+    def test_roundtrips_through_disk_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            store = SQLiteCacheStore(path, "party", dumps=Company.to_json, loads=Company.from_json)
+            try:
+                TTLCache(ttl_seconds=60, store=store).set("7707083893", Company.from_suggestion(SUGGESTION))
+                restarted = TTLCache(ttl_seconds=60, store=store)
+                self.assertEqual(restarted.get("7707083893"), Company.from_suggestion(SUGGESTION))
+            finally:
+                store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,9 @@
+import asyncio
+import gc
+import json
 import os
+import tempfile
+import time
 import unittest
 from unittest.mock import patch
 
@@ -6,13 +11,31 @@ os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
 os.environ.setdefault("DADATA_API_KEY", "test-dadata-api-key")
 
 import dadata_direct
+import deadline
+from cache import NOT_FOUND, TTLCache
+from company import Company
+from egrul_index import EgrulIndex, build_index
+from fair_scheduler import FairScheduler
+from quota import QuotaLedger
+from key_pool import ApiKey, KeyPool
+from rate_limit import AdaptiveRateLimiter
+
+
+class _FakeContent:
+    def __init__(self, data):
+        self._data = data
+
+    async def read(self, n=-1):
+        return self._data if n < 0 else self._data[:n]
 
 
 class _FakeResponse:
-    def __init__(self, status=200, json_data=None, text_data=""):
+    def __init__(self, status=200, json_data=None, text_data="", headers=None):
         self.status = status
         self._json_data = json_data if json_data is not None else {}
         self._text_data = text_data
+        self.content = _FakeContent(text_data.encode("utf-8"))
+        self.headers = headers or {}
 
     async def __aenter__(self):
         return self
@@ -20,11 +43,8 @@ class _FakeResponse:
     async def __aexit__(self, exc_type, exc, tb):
         return None
 
-    async def json(self):
-        return self._json_data
-
-    async def text(self):
-        return self._text_data
+    async def read(self):
+        return json.dumps(self._json_data).encode("utf-8")
 
 
 class _FakeSession:
@@ -37,6 +57,21 @@ class _FakeSession:
         return self._response
 
 
+class _CountingStore:
+    """Внешний уровень кэша, считающий обращения (как round-trip к Redis)."""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+
+    def get_many(self, keys):
+        self.reads += 1
+        return {}
+
+    def set(self, key, value, ttl_seconds):
+        self.writes += 1
+
+
 class DadataDirectFormattingTests(unittest.TestCase):
     def test_short_card_contains_key_fields(self):
         item = {
@@ -74,11 +109,41 @@ class DadataDirectFormattingTests(unittest.TestCase):
         self.assertIn("Реквизиты контрагента", reqs)
         self.assertIn("109000, г Москва", reqs)
 
+    def test_search_results_escape_unknown_status(self):
+        item = {"value": "ООО Тест", "data": {"inn": "7707083893", "state": {"status": "<B>&"}}}
+        text = dadata_direct.format_search_results([item])
+        self.assertIn("&lt;B&gt;&amp;", text)
+        self.assertNotIn("<B>", text)
+
     def test_format_branches_list_empty(self):
         self.assertEqual(dadata_direct.format_branches_list([]), "Филиалы не найдены.")
 
 
+class _SequenceSession:
+    def __init__(self, responses):
+        self._responses = list(responses)
+        self.calls = 0
+        self.auth = []
+        self.timeouts = []
+
+    def post(self, *args, **kwargs):
+        self.calls += 1
+        self.auth.append(kwargs["headers"]["Authorization"])
+        self.timeouts.append(kwargs.get("timeout"))
+        response = self._responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
 class DadataDirectCachingTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._CIRCUIT.reset()
+        # Повторы проверяются отдельно (DadataRetryAndCircuitTests).
+        retries = patch("dadata_direct.DADATA_RETRY_ATTEMPTS", 1)
+        retries.start()
+        self.addCleanup(retries.stop)
+
     async def test_fetch_company_uses_cache(self):
         dadata_direct._PARTY_CACHE._data.clear()
         dadata_direct._BRANCHES_CACHE._data.clear()
@@ -90,21 +155,62 @@ class DadataDirectCachingTests(unittest.IsolatedAsyncioTestCase):
             first = await dadata_direct.fetch_company("7707083893")
             second = await dadata_direct.fetch_company("7707083893")
 
-        self.assertEqual(first, {"value": "first"})
-        self.assertEqual(second, {"value": "first"})
+        self.assertEqual(first.raw, {"value": "first"})
+        self.assertEqual(second.raw, {"value": "first"})
         self.assertEqual(session.calls, 1)
 
+    async def test_company_fetched_by_inn_is_served_by_ogrn(self):
+        dadata_direct._PARTY_CACHE.clear()
+        dadata_direct._BRANCHES_CACHE.clear()
+
+        payload = {"suggestions": [{"value": "ООО", "data": {"inn": "7707083893", "ogrn": "1027700132195"}}]}
+        session = _FakeSession(response=_FakeResponse(status=200, json_data=payload))
+
+        with patch("dadata_direct.get_session", return_value=session):
+            by_inn = await dadata_direct.fetch_company("7707083893")
+            by_ogrn = await dadata_direct.fetch_company("1027700132195")
+            await dadata_direct.fetch_branches("7707083893")
+            branches = await dadata_direct.fetch_branches("1027700132195")
+
+        self.assertIs(by_ogrn, by_inn)
+        self.assertEqual(branches, payload["suggestions"])
+        self.assertEqual(session.calls, 2)
+        self.assertEqual(len(dadata_direct._PARTY_CACHE), 1)
+
 
     async def test_fetch_companies_handles_non_200(self):
         dadata_direct._BRANCHES_CACHE._data.clear()
-        session = _FakeSession(response=_FakeResponse(status=429, text_data="rate limit"))
+        session = _FakeSession(response=_FakeResponse(status=500, text_data="server error"))
 
         with patch("dadata_direct.get_session", return_value=session):
-            result = await dadata_direct.fetch_companies("7707083893")
+            with self.assertRaises(dadata_direct.DadataUnavailableError):
+                await dadata_direct.fetch_companies("7707083893")
 
-        self.assertEqual(result, [])
         self.assertEqual(session.calls, 1)
 
+    async def test_fetch_companies_raises_throttled_on_429(self):
+        dadata_direct._BRANCHES_CACHE._data.clear()
+        dadata_direct._PARTY_CACHE._data.clear()
+        limiter = AdaptiveRateLimiter(10, 10)
+        pool = KeyPool([ApiKey("test-dadata-api-key", limiter)])
+        session = _FakeSession(
+            response=_FakeResponse(status=429, text_data="rate limit", headers={"Retry-After": "30"})
+        )
+
+        with patch.object(dadata_direct, "_KEY_POOL", pool), patch(
+            "dadata_direct.get_session", return_value=session
+        ):
+            with self.assertRaises(dadata_direct.DadataThrottledError) as ctx:
+                await dadata_direct.fetch_companies("7707083893")
+            # Пока действует Retry-After, запрос даже не уходит в сеть.
+            result = await dadata_direct.fetch_companies_many(["7707083893"])
+
+        self.assertEqual(ctx.exception.retry_after, 30.0)
+        self.assertEqual(limiter.rate, 5)
+        self.assertIs(result[0], dadata_direct.THROTTLED)
+        self.assertEqual(session.calls, 1)
+        self.assertIsNone(dadata_direct._BRANCHES_CACHE.get(dadata_direct._cache_key("7707083893")))
+
     async def test_fetch_companies_uses_cache_for_same_key(self):
         dadata_direct._PARTY_CACHE._data.clear()
         dadata_direct._BRANCHES_CACHE._data.clear()
@@ -119,6 +225,726 @@ class DadataDirectCachingTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(second, [{"value": "branch"}])
         self.assertEqual(session.calls, 1)
 
+    async def test_fetch_company_caches_not_found(self):
+        dadata_direct._PARTY_CACHE._data.clear()
+        session = _FakeSession(response=_FakeResponse(status=200, json_data={"suggestions": []}))
+
+        with patch("dadata_direct.get_session", return_value=session):
+            first = await dadata_direct.fetch_company("0000000000")
+            second = await dadata_direct.fetch_company("0000000000")
+
+        self.assertIsNone(first)
+        self.assertIsNone(second)
+        self.assertEqual(session.calls, 1)
+
+    async def test_fetch_company_does_not_cache_http_errors(self):
+        dadata_direct._PARTY_CACHE._data.clear()
+        session = _FakeSession(response=_FakeResponse(status=500, text_data="oops"))
+
+        with patch("dadata_direct.get_session", return_value=session):
+            for _ in range(2):
+                with self.assertRaises(dadata_direct.DadataUnavailableError):
+                    await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(session.calls, 2)
+
+    async def test_fetch_branches_caches_empty_list(self):
+        dadata_direct._BRANCHES_CACHE._data.clear()
+        session = _FakeSession(response=_FakeResponse(status=200, json_data={"suggestions": []}))
+
+        with patch("dadata_direct.get_session", return_value=session):
+            first = await dadata_direct.fetch_branches("7707083893")
+            second = await dadata_direct.fetch_branches("7707083893")
+
+        self.assertEqual(first, [])
+        self.assertEqual(second, [])
+        self.assertEqual(session.calls, 1)
+
+    async def test_fetch_company_serves_stale_and_refreshes_once(self):
+        now = [1000.0]
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=lambda: now[0], stale_seconds=60)
+        cache.set("7707083893", Company.from_suggestion({"value": "old"}))
+        now[0] += 20
+        payload = {"suggestions": [{"value": "new"}]}
+        session = _FakeSession(response=_FakeResponse(status=200, json_data=payload))
+
+        with patch.object(dadata_direct, "_PARTY_CACHE", cache), patch(
+            "dadata_direct.get_session", return_value=session
+        ):
+            first = await dadata_direct.fetch_company("7707083893")
+            second = await dadata_direct.fetch_company("7707083893")
+            await asyncio.gather(*dadata_direct._REFRESH_TASKS.values())
+            third = await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(first.raw, {"value": "old"})
+        self.assertEqual(second.raw, {"value": "old"})
+        self.assertEqual(third.raw, {"value": "new"})
+        self.assertEqual(session.calls, 1)
+
+    async def test_concurrent_identical_requests_are_coalesced(self):
+        dadata_direct._PARTY_CACHE._data.clear()
+        payload = {"suggestions": [{"value": "shared"}]}
+        session = _FakeSession(response=_FakeResponse(status=200, json_data=payload))
+
+        with patch("dadata_direct.get_session", return_value=session):
+            results = await asyncio.gather(*(dadata_direct.fetch_company("7707083893") for _ in range(5)))
+
+        self.assertEqual([company.raw for company in results], [{"value": "shared"}] * 5)
+        self.assertEqual(session.calls, 1)
+        self.assertEqual(dadata_direct._INFLIGHT, {})
+
+    async def test_coalesced_error_is_shared_and_not_cached(self):
+        dadata_direct._BRANCHES_CACHE._data.clear()
+        session = _FakeSession(response=_FakeResponse(status=503, text_data="down"))
+
+        with patch("dadata_direct.get_session", return_value=session):
+            results = await asyncio.gather(
+                *(dadata_direct.fetch_branches("7707083893") for _ in range(3)), return_exceptions=True
+            )
+            self.assertEqual(session.calls, 1)
+            with self.assertRaises(dadata_direct.DadataUnavailableError):
+                await dadata_direct.fetch_branches("7707083893")
+
+        self.assertTrue(all(isinstance(result, dadata_direct.DadataUnavailableError) for result in results))
+        self.assertEqual(session.calls, 2)
+
+
+class _BranchesSession:
+    """Отдаёт первые ``count`` из ``total`` филиалов, как findById/party."""
+
+    def __init__(self, total):
+        self.total = total
+        self.counts = []
+
+    def post(self, *args, json=None, **kwargs):
+        self.counts.append(json["count"])
+        items = [{"value": f"branch-{i}", "data": {"kpp": str(i)}} for i in range(min(json["count"], self.total))]
+        return _FakeResponse(status=200, json_data={"suggestions": items})
+
+
+class DadataQuotaTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._CIRCUIT.reset()
+        dadata_direct._PARTY_CACHE.clear()
+        quota = patch("dadata_direct._QUOTA", QuotaLedger(daily_budget=10, soft_ratio=0.5))
+        self.quota = quota.start()
+        self.addCleanup(quota.stop)
+
+    async def test_requests_are_counted(self):
+        session = _FakeSession(response=_FakeResponse(status=200, json_data={"suggestions": []}))
+        with patch("dadata_direct.get_session", return_value=session):
+            await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(self.quota.used(dadata_direct._KEY_POOL.keys[0].key_id), 1)
+        self.assertEqual(dadata_direct.dadata_health()["quota"]["used"], 1)
+
+    async def test_hard_limit_serves_cache_only(self):
+        self.quota.record(dadata_direct._KEY_POOL.keys[0].key_id, 10)
+        cached = Company.from_suggestion({"value": "cached"})
+        dadata_direct._PARTY_CACHE.set("7707083893", cached)
+        session = _FakeSession(response=_FakeResponse(status=200, json_data={"suggestions": []}))
+
+        with patch("dadata_direct.get_session", return_value=session):
+            self.assertIs(await dadata_direct.fetch_company("7707083893"), cached)
+            with self.assertRaises(dadata_direct.DadataQuotaExceededError):
+                await dadata_direct.fetch_company("1027700132195")
+
+        self.assertEqual(session.calls, 0)
+
+    async def test_soft_limit_blocks_bulk_but_not_single_lookups(self):
+        self.quota.record(dadata_direct._KEY_POOL.keys[0].key_id, 5)
+        payload = {"suggestions": [{"value": "found"}]}
+        session = _FakeSession(response=_FakeResponse(status=200, json_data=payload))
+
+        with patch("dadata_direct.get_session", return_value=session):
+            bulk = await dadata_direct.fetch_companies_many(["1111111111", "2222222222"])
+            single = await dadata_direct.fetch_companies_many(["3333333333"])
+
+        self.assertEqual(bulk, [dadata_direct.THROTTLED, dadata_direct.THROTTLED])
+        self.assertEqual(single[0].value, "found")
+        self.assertEqual(session.calls, 1)
+
+
+class BranchesPagingTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._CIRCUIT.reset()
+        dadata_direct._BRANCHES_CACHE.clear()
+
+    async def test_page_requests_only_prefix_up_to_that_page(self):
+        session = _BranchesSession(total=25)
+        with patch("dadata_direct.get_session", return_value=session):
+            items, has_more = await dadata_direct.fetch_branches_page("7707083893", 1, page_size=10)
+
+        self.assertEqual([item["value"] for item in items], [f"branch-{i}" for i in range(10, 20)])
+        self.assertTrue(has_more)
+        self.assertEqual(session.counts, [21])
+
+    async def test_pages_are_cached_independently(self):
+        session = _BranchesSession(total=25)
+        with patch("dadata_direct.get_session", return_value=session):
+            await dadata_direct.fetch_branches_page("7707083893", 1, page_size=10)
+            first, has_more = await dadata_direct.fetch_branches_page("7707083893", 0, page_size=10)
+
+        self.assertEqual(len(first), 10)
+        self.assertTrue(has_more)
+        self.assertEqual(session.counts, [21])
+
+    async def test_iter_branches_stops_at_last_page(self):
+        session = _BranchesSession(total=25)
+        pages = []
+        with patch("dadata_direct.get_session", return_value=session):
+            async for page in dadata_direct.iter_branches("7707083893", page_size=10):
+                pages.append(len(page))
+
+        self.assertEqual(pages, [10, 10, 5])
+        self.assertEqual(session.counts, [11, 21, 31])
+
+    async def test_iterator_is_lazy(self):
+        session = _BranchesSession(total=1000)
+        with patch("dadata_direct.get_session", return_value=session):
+            async for _page in dadata_direct.iter_branches("7707083893", page_size=10):
+                break
+
+        self.assertEqual(session.counts, [11])
+
+    async def test_list_cut_at_dadata_cap_is_marked_incomplete(self):
+        session = _BranchesSession(total=1000)
+        with patch("dadata_direct.get_session", return_value=session):
+            last, has_more = await dadata_direct.fetch_branches_page("7707083893", 29, page_size=10)
+            beyond, _ = await dadata_direct.fetch_branches_page("7707083893", 30, page_size=10)
+
+        self.assertEqual(len(last), 10)
+        self.assertFalse(has_more)
+        self.assertEqual(beyond, [])
+        # Конец списка — это предел DaData, а не последний филиал: по branch_count их 1000.
+        text = dadata_direct.format_branches_list(last, start=291, total=1000)
+        self.assertIn("Показаны первые 300 из 1000 филиалов", text)
+        self.assertNotIn("Показаны первые", dadata_direct.format_branches_list(last, start=291, total=300))
+        self.assertNotIn("Показаны первые", dadata_direct.format_branches_list(last, start=281, total=1000))
+
+
+class FetchCompaniesManyTests(unittest.IsolatedAsyncioTestCase):
+    async def test_results_follow_input_order_and_duplicates_are_fetched_once(self):
+        calls = []
+
+        async def fake_fetch_company(query, store=True):
+            calls.append(query)
+            await asyncio.sleep(0.01 if query == "1111111111" else 0)
+            return None if query == "0000000000" else {"value": query}
+
+        with patch("dadata_direct.fetch_company", side_effect=fake_fetch_company):
+            result = await dadata_direct.fetch_companies_many(
+                ["1111111111", "2222222222", "1111111111", "0000000000"], concurrency=2
+            )
+
+        self.assertEqual(
+            result,
+            [{"value": "1111111111"}, {"value": "2222222222"}, {"value": "1111111111"}, None],
+        )
+        self.assertEqual(sorted(calls), ["0000000000", "1111111111", "2222222222"])
+
+    async def test_item_timeout_only_affects_that_item(self):
+        async def fake_fetch_company(query, store=True):
+            if query == "slow":
+                await asyncio.sleep(1)
+            return {"value": query}
+
+        with patch("dadata_direct.fetch_company", side_effect=fake_fetch_company):
+            result = await dadata_direct.fetch_companies_many(["slow", "fast"], item_timeout=0.05)
+
+        # Не дождались ответа — «DaData недоступна», а не «не найдено».
+        self.assertEqual(result, [dadata_direct.UNAVAILABLE, {"value": "fast"}])
+
+    async def test_unexpected_error_is_unavailable_not_missing(self):
+        async def fake_fetch_company(query, store=True):
+            if query == "broken":
+                raise RuntimeError("boom")
+            return None
+
+        with patch("dadata_direct.fetch_company", side_effect=fake_fetch_company):
+            result = await dadata_direct.fetch_companies_many(["broken", "missing"])
+
+        self.assertEqual(result, [dadata_direct.UNAVAILABLE, None])
+
+    async def test_cached_ids_are_served_without_fetching(self):
+        dadata_direct._PARTY_CACHE.clear()
+        company = Company.from_suggestion({"value": "cached"})
+        dadata_direct._PARTY_CACHE.set("3333333333", company)
+        dadata_direct._PARTY_CACHE.set("4444444444", NOT_FOUND)
+        calls = []
+
+        async def fake_fetch_company(query, store=True):
+            calls.append(query)
+            return {"value": query}
+
+        with patch("dadata_direct.fetch_company", side_effect=fake_fetch_company):
+            result = await dadata_direct.fetch_companies_many(["3333333333", "4444444444", "5555555555"])
+
+        self.assertEqual(result, [company, None, {"value": "5555555555"}])
+        self.assertEqual(calls, ["5555555555"])
+
+    async def test_misses_go_to_dadata_without_rereading_store(self):
+        store = _CountingStore()
+        cache = TTLCache(ttl_seconds=60, max_items=100, store=store)
+        queries = [str(7707083800 + index) for index in range(10)]
+        session = _FakeSession(_FakeResponse(status=200, json_data={"suggestions": [{"value": "ok"}]}))
+
+        with patch.object(dadata_direct, "_PARTY_CACHE", cache), patch(
+            "dadata_direct.get_session", return_value=session
+        ):
+            result = await dadata_direct.fetch_companies_many(queries)
+        cache.flush()
+
+        self.assertTrue(all(isinstance(item, Company) for item in result))
+        self.assertEqual(session.calls, 10)
+        # Один пакетный запрос к внешнему уровню и по записи на карточку.
+        self.assertEqual(store.reads, 1)
+        self.assertEqual(store.writes, 10)
+
+
+class DadataRetryAndCircuitTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._PARTY_CACHE._data.clear()
+        dadata_direct._CIRCUIT.reset()
+        for target, value in (
+            ("dadata_direct.DADATA_RETRY_ATTEMPTS", 3),
+            ("dadata_direct._retry_delay", lambda attempt: 0),
+        ):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_transient_errors_are_retried(self):
+        payload = {"suggestions": [{"value": "ok"}]}
+        session = _SequenceSession(
+            [
+                asyncio.TimeoutError(),
+                _FakeResponse(status=502, text_data="bad gateway"),
+                _FakeResponse(status=200, json_data=payload),
+            ]
+        )
+
+        with patch("dadata_direct.get_session", return_value=session):
+            result = await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(result.raw, {"value": "ok"})
+        self.assertEqual(session.calls, 3)
+
+    async def test_client_errors_are_not_retried(self):
+        session = _SequenceSession([_FakeResponse(status=403, text_data="forbidden")])
+
+        with patch("dadata_direct.get_session", return_value=session):
+            result = await dadata_direct.fetch_company("7707083893")
+
+        self.assertIsNone(result)
+        self.assertEqual(session.calls, 1)
+
+    async def test_open_circuit_fails_fast_and_serves_stale(self):
+        now = [1000.0]
+        cache = TTLCache(ttl_seconds=10, max_items=10, clock=lambda: now[0], stale_seconds=60)
+        cache.set("7707083893", Company.from_suggestion({"value": "old"}))
+        now[0] += 20
+        for _ in range(dadata_direct._CIRCUIT.min_calls):
+            dadata_direct._CIRCUIT.record_failure()
+        session = _SequenceSession([])
+
+        with patch.object(dadata_direct, "_PARTY_CACHE", cache), patch(
+            "dadata_direct.get_session", return_value=session
+        ):
+            stale = await dadata_direct.fetch_company("7707083893")
+            # Без устаревшей записи — «DaData недоступна», а не «не найдено».
+            with self.assertRaises(dadata_direct.DadataUnavailableError):
+                await dadata_direct.fetch_company("1027700132195")
+            batch = await dadata_direct.fetch_companies_many(["1027700132195"])
+
+        self.assertEqual(stale.raw, {"value": "old"})
+        self.assertEqual(batch, [dadata_direct.UNAVAILABLE])
+        self.assertEqual(session.calls, 0)
+        self.assertEqual(dadata_direct.dadata_health()["circuit"]["state"], "open")
+
+    async def test_exhausted_retries_are_reported_as_unavailable(self):
+        session = _SequenceSession([_FakeResponse(status=502, text_data="bad gateway")] * 3)
+
+        with patch("dadata_direct.get_session", return_value=session):
+            with self.assertRaises(dadata_direct.DadataUnavailableError):
+                await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(session.calls, 3)
+        self.assertIsNone(dadata_direct._PARTY_CACHE.get("7707083893"))
+
+
+class DadataDeadlineTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._PARTY_CACHE.clear()
+        dadata_direct._CIRCUIT.reset()
+        for target, value in (
+            ("dadata_direct.DADATA_RETRY_ATTEMPTS", 3),
+            ("dadata_direct._retry_delay", lambda attempt: 5.0),
+        ):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_expired_deadline_drops_request_before_dadata(self):
+        session = _SequenceSession([])
+
+        with patch("dadata_direct.get_session", return_value=session), deadline.deadline_scope(1e-9):
+            with self.assertRaises(dadata_direct.DadataDeadlineExceededError):
+                await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(session.calls, 0)
+
+    async def test_waiting_for_slot_is_bounded_by_deadline(self):
+        scheduler = FairScheduler(1)
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("other"):
+                await gate.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        session = _SequenceSession([])
+        with patch.object(dadata_direct, "_DADATA_SCHEDULER", scheduler), patch(
+            "dadata_direct.get_session", return_value=session
+        ), deadline.deadline_scope(0.05):
+            with self.assertRaises(dadata_direct.DadataDeadlineExceededError):
+                await dadata_direct.fetch_company("7707083893")
+
+        gate.set()
+        await holder
+        self.assertEqual(session.calls, 0)
+        self.assertEqual(scheduler.queued(), 0)
+        self.assertEqual(dadata_direct._CIRCUIT.snapshot()["window_calls"], 0)
+
+    async def test_retry_is_skipped_when_deadline_is_too_close(self):
+        session = _SequenceSession([asyncio.TimeoutError(), _FakeResponse(status=200, json_data={"suggestions": []})])
+
+        with patch("dadata_direct.get_session", return_value=session), deadline.deadline_scope(2):
+            with self.assertRaises(dadata_direct.DadataDeadlineExceededError):
+                await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(session.calls, 1)
+
+    async def test_http_timeout_is_capped_by_deadline(self):
+        payload = {"suggestions": [{"value": "ok"}]}
+        session = _SequenceSession([_FakeResponse(status=200, json_data=payload)] * 2)
+
+        with patch("dadata_direct.get_session", return_value=session):
+            with deadline.deadline_scope(2):
+                await dadata_direct.fetch_company("7707083893")
+            dadata_direct._PARTY_CACHE.clear()
+            await dadata_direct.fetch_company("7707083893")
+
+        self.assertLessEqual(session.timeouts[0].total, 2)
+        self.assertIsNone(session.timeouts[1])
+
+    async def test_deadline_truncated_timeout_does_not_trip_circuit(self):
+        class _SlowSession:
+            """DaData отвечает дольше срока: как aiohttp, ждём не дольше переданного таймаута."""
+
+            calls = 0
+            timeout = None
+
+            def post(self, *args, timeout=None, **kwargs):
+                self.calls += 1
+                self.timeout = timeout
+                return self
+
+            async def __aenter__(self):
+                await asyncio.sleep(self.timeout.total)
+                raise asyncio.TimeoutError()
+
+            async def __aexit__(self, *exc):
+                return None
+
+        session = _SlowSession()
+        with patch("dadata_direct.get_session", return_value=session):
+            for index in range(11):
+                with deadline.deadline_scope(0.05):
+                    with self.assertRaises(dadata_direct.DadataDeadlineExceededError):
+                        await dadata_direct.fetch_company(f"77070838{index:02d}")
+
+        snapshot = dadata_direct._CIRCUIT.snapshot()
+        self.assertEqual(snapshot["window_failures"], 0)
+        self.assertEqual(snapshot["state"], "closed")
+        self.assertEqual(session.calls, 11)
+
+    async def test_abandoned_single_flight_failure_is_not_logged_as_unretrieved(self):
+        async def failing_request(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            raise dadata_direct.DadataUnavailableError("down")
+
+        loop = asyncio.get_running_loop()
+        errors = []
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        self.addCleanup(loop.set_exception_handler, None)
+        with patch("dadata_direct._request_suggestions", side_effect=failing_request):
+            with deadline.deadline_scope(0.01):
+                with self.assertRaises(dadata_direct.DadataDeadlineExceededError):
+                    await dadata_direct.fetch_company("7707083893")
+            # Ожидающих не осталось — задача single-flight завершается ошибкой сама по себе.
+            task = dadata_direct._INFLIGHT["7707083893:MAIN"]
+            await asyncio.wait([task])
+        del task
+        gc.collect()
+
+        self.assertEqual(errors, [])
+
+    async def test_batch_reports_expired_items_as_throttled(self):
+        session = _SequenceSession([])
+
+        with patch("dadata_direct.get_session", return_value=session), deadline.deadline_scope(1e-9):
+            results = await dadata_direct.fetch_companies_many(["7707083893", "7736207543"])
+
+        self.assertEqual(results, [dadata_direct.THROTTLED, dadata_direct.THROTTLED])
+        self.assertEqual(session.calls, 0)
+
+
+class DadataKeyPoolTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._CIRCUIT.reset()
+        dadata_direct._PARTY_CACHE.clear()
+        self.pool = KeyPool([ApiKey(token, AdaptiveRateLimiter(10, 10)) for token in ("key-a", "key-b")])
+        for target, value in (
+            ("dadata_direct._KEY_POOL", self.pool),
+            ("dadata_direct._QUOTA", QuotaLedger(daily_budget=10)),
+        ):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _ok(self, value):
+        return _FakeResponse(status=200, json_data={"suggestions": [{"value": value}]})
+
+    async def test_requests_alternate_between_keys(self):
+        session = _SequenceSession([self._ok("1"), self._ok("2")])
+        with patch("dadata_direct.get_session", return_value=session):
+            await dadata_direct.fetch_company("7707083893")
+            await dadata_direct.fetch_company("1027700132195")
+
+        self.assertEqual(session.auth, ["Token key-a", "Token key-b"])
+        self.assertEqual([key["requests"] for key in dadata_direct.dadata_health()["keys"]], [1, 1])
+
+    async def test_rejected_key_is_sidelined_and_request_retried(self):
+        session = _SequenceSession([_FakeResponse(status=403, text_data="forbidden"), self._ok("1"), self._ok("2")])
+        with patch("dadata_direct.get_session", return_value=session):
+            first = await dadata_direct.fetch_company("7707083893")
+            second = await dadata_direct.fetch_company("1027700132195")
+
+        self.assertEqual((first.value, second.value), ("1", "2"))
+        self.assertEqual(session.auth, ["Token key-a", "Token key-b", "Token key-b"])
+        self.assertEqual(dadata_direct.dadata_health()["keys"][0]["sideline_reason"], "HTTP 403")
+
+    async def test_unavailable_when_every_key_is_rejected(self):
+        for key in self.pool.keys:
+            key.sidelined_until = float("inf")
+            key.sideline_reason = "HTTP 401"
+        session = _SequenceSession([])
+        with patch("dadata_direct.get_session", return_value=session):
+            with self.assertLogs("dadata_direct", level="ERROR") as logs:
+                with self.assertRaises(dadata_direct.DadataUnavailableError):
+                    await dadata_direct.fetch_company("7707083893")
+
+        self.assertIn("отклонила все ключи", logs.output[0])
+        self.assertEqual(session.auth, [])
+
+    async def test_throttled_key_is_bypassed(self):
+        session = _SequenceSession(
+            [
+                _FakeResponse(status=429, text_data="slow down", headers={"Retry-After": "60"}),
+                self._ok("1"),
+                self._ok("2"),
+            ]
+        )
+        with patch("dadata_direct.get_session", return_value=session):
+            first = await dadata_direct.fetch_company("7707083893")
+            second = await dadata_direct.fetch_company("1027700132195")
+
+        # 429 по ключу A не доходит до пользователя: запрос сразу повторён с ключом B,
+        # и следующий запрос тоже идёт через B, пока A на паузе.
+        self.assertEqual((first.value, second.value), ("1", "2"))
+        self.assertEqual(session.auth, ["Token key-a", "Token key-b", "Token key-b"])
+        self.assertEqual(dadata_direct._CIRCUIT.snapshot()["window_failures"], 0)
+
+    async def test_throttled_when_every_key_is_throttled(self):
+        slow_down = {"status": 429, "text_data": "slow down", "headers": {"Retry-After": "30"}}
+        session = _SequenceSession([_FakeResponse(**slow_down), _FakeResponse(**slow_down)])
+        with patch("dadata_direct.get_session", return_value=session):
+            with self.assertRaises(dadata_direct.DadataThrottledError) as ctx:
+                await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(ctx.exception.retry_after, 30)
+        self.assertEqual(session.auth, ["Token key-a", "Token key-b"])
+
+    async def test_exhausted_key_quota_moves_traffic_to_other_key(self):
+        dadata_direct._QUOTA.record(self.pool.keys[0].key_id, 10)
+        session = _SequenceSession([self._ok("1")])
+        with patch("dadata_direct.get_session", return_value=session):
+            await dadata_direct.fetch_company("7707083893")
+
+        self.assertEqual(session.auth, ["Token key-b"])
+        dadata_direct._QUOTA.record(self.pool.keys[1].key_id, 10)
+        with self.assertRaises(dadata_direct.DadataQuotaExceededError):
+            await dadata_direct.fetch_company("1027700132195")
+
+
+class _MergedIndex:
+    def __init__(self, *indexes):
+        self.indexes = indexes
+        self.built_at = max(index.built_at for index in indexes)
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes)
+
+    def get(self, query):
+        return next((entry for index in self.indexes if (entry := index.get(query)) is not None), None)
+
+
+class EgrulResolverTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._CIRCUIT.reset()
+        dadata_direct._PARTY_CACHE.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        day = 86400
+        # Компания не менялась в реестре годами — это не делает запись устаревшей.
+        unchanged_ms = int((time.time() - 5 * 365 * day) * 1000)
+        fresh = self._index("fresh.idx", time.time() - day, "свежая", "7707083893", unchanged_ms)
+        stale = self._index("stale.idx", time.time() - 400 * day, "старая", "1027700132195", unchanged_ms)
+        # Один индекс с записями из свежей и старой выгрузки.
+        self.index = _MergedIndex(fresh, stale)
+        patcher = patch("dadata_direct._EGRUL", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _index(self, name, as_of, value, query, actuality_ms):
+        path = os.path.join(self.dir, name)
+        build_index([{"value": value, "data": {"inn": query, "state": {"actuality_date": actuality_ms}}}], path, as_of=as_of)
+        index = EgrulIndex(path)
+        self.addCleanup(index.close)
+        return index
+
+    async def test_fresh_entry_needs_no_request(self):
+        session = _FakeSession()
+        with patch("dadata_direct.get_session", return_value=session):
+            results = await dadata_direct.fetch_companies_many(["7707083893"])
+
+        self.assertEqual(results[0].value, "свежая")
+        self.assertEqual(session.calls, 0)
+
+    async def test_stale_or_missing_entry_goes_to_dadata(self):
+        payload = {"suggestions": [{"value": "из DaData"}]}
+        session = _FakeSession(response=_FakeResponse(status=200, json_data=payload))
+        with patch("dadata_direct.get_session", return_value=session):
+            stale = await dadata_direct.resolve_company("1027700132195")
+            missing = await dadata_direct.resolve_company("500100732259")
+
+        self.assertEqual((stale.value, missing.value), ("из DaData", "из DaData"))
+        self.assertEqual(session.calls, 2)
+        self.assertEqual(dadata_direct.dadata_health()["egrul"]["entries"], 2)
+
+    async def test_stale_entry_is_served_when_dadata_is_throttled(self):
+        session = _FakeSession(
+            response=_FakeResponse(status=429, text_data="rate limit", headers={"Retry-After": "1"})
+        )
+        pool = KeyPool([ApiKey("test-dadata-api-key", AdaptiveRateLimiter(10, 10))])
+        with patch.object(dadata_direct, "_KEY_POOL", pool), patch("dadata_direct.get_session", return_value=session):
+            company = await dadata_direct.resolve_company("1027700132195")
+
+        self.assertEqual(company.value, "старая")
+
+
+def _suggestion(name, inn):
+    return {"value": name, "data": {"inn": inn, "name": {"short_with_opf": name}, "address": {"value": "г Москва"}}}
+
+
+class _SuggestSession:
+    """suggest/party: отдаёт заранее заданные подсказки и запоминает запросы."""
+
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    def post(self, url, *, json=None, headers=None):
+        self.queries.append((url, json["query"]))
+        return _FakeResponse(status=200, json_data={"suggestions": self.results.get(json["query"], [])})
+
+
+class NameSearchTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._CIRCUIT.reset()
+        dadata_direct._SUGGEST_CACHE.clear()
+
+    async def test_search_uses_suggest_endpoint_and_normalized_query(self):
+        session = _SuggestSession({"ромашка москва": [_suggestion('ООО "Ромашка"', "7707083893")]})
+        with patch("dadata_direct.get_session", return_value=session):
+            first = await dadata_direct.search_companies('  "Ромашка",  МОСКВА ')
+            second = await dadata_direct.search_companies("ромашка москва")
+
+        self.assertEqual(first, second)
+        self.assertEqual(session.queries, [(dadata_direct.DADATA_SUGGEST_URL, "ромашка москва")])
+
+    async def test_longer_query_is_filtered_from_complete_prefix_result(self):
+        results = [_suggestion('ООО "Ромашка"', "7707083893"), _suggestion('ООО "Рога и копыта"', "7707083894")]
+        session = _SuggestSession({"ром": results})
+        with patch("dadata_direct.get_session", return_value=session):
+            await dadata_direct.search_companies("ром")
+            narrowed = await dadata_direct.search_companies("ромаш")
+            empty = await dadata_direct.search_companies("ромашки нет")
+            after_empty = await dadata_direct.search_companies("ромашки нет совсем")
+
+        self.assertEqual([item["value"] for item in narrowed], ['ООО "Ромашка"'])
+        self.assertEqual((empty, after_empty), ([], []))
+        self.assertEqual(len(session.queries), 1)
+
+    async def test_truncated_prefix_result_is_not_reused(self):
+        full = [_suggestion(f"ООО Ромашка {i}", f"77070838{i:02d}") for i in range(20)]
+        session = _SuggestSession({"ром": full, "ромашка 3": [full[3]]})
+        with patch("dadata_direct.get_session", return_value=session):
+            await dadata_direct.search_companies("ром")
+            result = await dadata_direct.search_companies("ромашка 3")
+
+        self.assertEqual([item["value"] for item in result], ["ООО Ромашка 3"])
+        self.assertEqual([query for _url, query in session.queries], ["ром", "ромашка 3"])
+
+    async def test_short_query_does_not_spend_quota(self):
+        session = _SuggestSession({})
+        with patch("dadata_direct.get_session", return_value=session):
+            self.assertEqual(await dadata_direct.search_companies("ро"), [])
+        self.assertEqual(session.queries, [])
+
+    async def test_pages(self):
+        full = [_suggestion(f"ООО {i}", f"77070838{i:02d}") for i in range(7)]
+        session = _SuggestSession({"ооо": full})
+        with patch("dadata_direct.get_session", return_value=session):
+            first, first_more = await dadata_direct.search_companies_page("ООО", 0, page_size=5)
+            second, second_more = await dadata_direct.search_companies_page("ООО", 1, page_size=5)
+
+        self.assertEqual((len(first), first_more, len(second), second_more), (5, True, 2, False))
+        self.assertEqual(len(session.queries), 1)
+        self.assertIn("ИНН: <code>7707083805</code>", dadata_direct.format_search_results(second, start=6))
+
+    async def test_request_scope_reaches_scheduler(self):
+        scheduler = FairScheduler(1)
+        clients = []
+        slot = scheduler.slot
+
+        def recording_slot(client_id=None, priority=dadata_direct.INTERACTIVE, timeout=None):
+            clients.append((client_id, priority))
+            return slot(client_id, priority, timeout)
+
+        session = _SuggestSession({"ромашка": [_suggestion('ООО "Ромашка"', "7707083893")]})
+        with patch.object(scheduler, "slot", recording_slot), patch.object(
+            dadata_direct, "_DADATA_SCHEDULER", scheduler
+        ), patch("dadata_direct.get_session", return_value=session):
+            with dadata_direct.request_scope(42):
+                await dadata_direct.search_companies("Ромашка")
+
+        self.assertEqual(clients, [(42, dadata_direct.INTERACTIVE)])
+        self.assertEqual(dadata_direct._REQUEST_SCOPE.get(), (None, dadata_direct.INTERACTIVE))
+
 
 if __name__ == "__main__":
     unittest.main()
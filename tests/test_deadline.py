@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+
+import deadline
+
+
+class DeadlineTests(unittest.IsolatedAsyncioTestCase):
+    def test_no_deadline_by_default(self):
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.expired())
+        self.assertEqual(deadline.clamp(5.0), 5.0)
+        self.assertIsNone(deadline.clamp(None))
+
+    def test_scope_sets_and_restores_deadline(self):
+        with deadline.deadline_scope(10):
+            self.assertAlmostEqual(deadline.remaining(), 10, delta=0.5)
+            self.assertEqual(deadline.clamp(3.0), 3.0)
+            self.assertAlmostEqual(deadline.clamp(30.0), 10, delta=0.5)
+        self.assertIsNone(deadline.remaining())
+
+    def test_nested_scope_cannot_extend_outer(self):
+        with deadline.deadline_scope(1):
+            with deadline.deadline_scope(60):
+                self.assertLessEqual(deadline.remaining(), 1)
+            with deadline.deadline_scope(0):
+                self.assertIsNotNone(deadline.remaining())
+            with deadline.detached():
+                self.assertIsNone(deadline.remaining())
+
+    def test_expired_deadline_clamps_to_zero(self):
+        with deadline.deadline_scope(1e-9):
+            self.assertTrue(deadline.expired())
+            self.assertEqual(deadline.clamp(5.0), 0.0)
+
+    async def test_deadline_reaches_child_tasks(self):
+        async def child():
+            return deadline.remaining()
+
+        with deadline.deadline_scope(10):
+            left = await asyncio.create_task(child())
+        self.assertIsNotNone(left)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import unittest
+
+from egrul_index import EgrulIndex, build_index, main, read_records, to_suggestion
+
+_NOW = 1_700_000_000
+
+
+def _party(inn, ogrn, value, actuality_ms=None):
+    state = {"status": "ACTIVE"}
+    if actuality_ms is not None:
+        state["actuality_date"] = actuality_ms
+    return {"value": value, "data": {"inn": inn, "ogrn": ogrn, "state": state}}
+
+
+class EgrulIndexTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(tmp.name, "egrul.idx")
+
+    def _open(self):
+        index = EgrulIndex(self.path)
+        self.addCleanup(index.close)
+        return index
+
+    def test_lookup_by_inn_and_ogrn(self):
+        records = [_party(f"77{i:08d}", f"10277{i:08d}", f"ООО {i}") for i in range(200)]
+        self.assertEqual(build_index(records, self.path, now=_NOW), 400)
+        index = self._open()
+
+        suggestion, updated = index.get("7700000042")
+        self.assertEqual(suggestion["value"], "ООО 42")
+        self.assertEqual(updated, _NOW)
+        self.assertEqual(index.get("1027700000199")[0]["value"], "ООО 199")
+        self.assertEqual(len(index), 400)
+        self.assertEqual(index.built_at, _NOW)
+
+    def test_missing_and_invalid_keys(self):
+        build_index([_party("7707083893", "1027700132195", "ПАО")], self.path, now=_NOW)
+        index = self._open()
+        self.assertIsNone(index.get("7707083894"))
+        self.assertIsNone(index.get("77070838"))
+        self.assertIsNone(index.get("abc"))
+
+    def test_last_duplicate_wins_and_freshness_is_dump_date(self):
+        records = [
+            _party("7707083893", "1027700132195", "старая"),
+            _party("7707083893", "1027700132195", "новая", actuality_ms=1_500_000_000_000),
+        ]
+        build_index(records, self.path, now=_NOW, as_of=_NOW - 3600)
+        suggestion, captured_at = self._open().get("7707083893")
+        self.assertEqual(suggestion["value"], "новая")
+        # Дата последнего изменения в реестре остаётся только в данных.
+        self.assertEqual(captured_at, _NOW - 3600)
+        self.assertEqual(suggestion["data"]["state"]["actuality_date"], 1_500_000_000_000)
+
+    def test_empty_index(self):
+        self.assertEqual(build_index([], self.path, now=_NOW), 0)
+        self.assertIsNone(self._open().get("7707083893"))
+
+    def test_rejects_foreign_file(self):
+        with open(self.path, "wb") as fh:
+            fh.write(b"not an index at all, definitely")
+        with self.assertRaises(ValueError):
+            EgrulIndex(self.path)
+
+    def test_flat_records_become_suggestions(self):
+        suggestion = to_suggestion(
+            {"inn": "7707083893", "ogrn": "", "name": 'ПАО "Сбербанк"', "status": "active", "updated": "2024-01-01"}
+        )
+        self.assertEqual(suggestion["value"], 'ПАО "Сбербанк"')
+        self.assertEqual(suggestion["data"]["state"], {"status": "ACTIVE", "actuality_date": 1704067200000})
+        self.assertIsNone(suggestion["data"]["ogrn"])
+
+    def test_cli_builds_from_jsonl_and_csv(self):
+        jsonl = os.path.join(self.dir, "dump.jsonl")
+        with open(jsonl, "w", encoding="utf-8") as fh:
+            fh.write(json.dumps(_party("7707083893", "1027700132195", "из json"), ensure_ascii=False) + "\n\n")
+        dump_csv = os.path.join(self.dir, "dump.csv")
+        with open(dump_csv, "w", encoding="utf-8") as fh:
+            fh.write("inn,ogrn,name,status\n500100732259,304500116000157,ИП Иванов,ACTIVE\n")
+
+        os.utime(jsonl, (_NOW, _NOW))
+        os.utime(dump_csv, (_NOW + 100, _NOW + 100))
+
+        self.assertEqual(len(list(read_records(dump_csv))), 1)
+        main([jsonl, dump_csv, "-o", self.path])
+        index = self._open()
+        self.assertEqual(index.get("1027700132195")[0]["value"], "из json")
+        self.assertEqual(index.get("304500116000157")[0]["value"], "ИП Иванов")
+        # Без --as-of свежесть — по самому старому файлу выгрузки.
+        self.assertEqual(index.get("304500116000157")[1], _NOW)
+
+    def test_cli_as_of_sets_dump_date(self):
+        jsonl = os.path.join(self.dir, "dump.jsonl")
+        with open(jsonl, "w", encoding="utf-8") as fh:
+            fh.write(json.dumps(_party("7707083893", "1027700132195", "ПАО"), ensure_ascii=False) + "\n")
+
+        main([jsonl, "-o", self.path, "--as-of", "2024-01-01"])
+        self.assertEqual(self._open().get("7707083893")[1], 1704067200)
+
+
+if __name__ == "__main__":
+    unittest.main()
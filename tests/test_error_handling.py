@@ -1,3 +1,4 @@
+import json
 import os
 import unittest
 from unittest.mock import patch
@@ -12,11 +13,20 @@ import dadata_direct
 import dadata_mcp
 
 
+class _FakeContent:
+    def __init__(self, data):
+        self._data = data
+
+    async def read(self, n=-1):
+        return self._data if n < 0 else self._data[:n]
+
+
 class _FakeResponse:
     def __init__(self, status=200, json_data=None, text_data=""):
         self.status = status
         self._json_data = json_data if json_data is not None else {}
         self._text_data = text_data
+        self.content = _FakeContent(text_data.encode("utf-8"))
 
     async def __aenter__(self):
         return self
@@ -24,11 +34,8 @@ class _FakeResponse:
     async def __aexit__(self, exc_type, exc, tb):
         return None
 
-    async def json(self):
-        return self._json_data
-
-    async def text(self):
-        return self._text_data
+    async def read(self):
+        return json.dumps(self._json_data).encode("utf-8")
 
 
 class _FakeSession:
@@ -42,7 +49,7 @@ class _FakeSession:
         return self._response
 
 
-class _FakeContent:
+class _FakeOutputContent:
     def __init__(self, text):
         self.text = text
 
@@ -73,6 +80,7 @@ class DadataDirectErrorHandlingTests(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         dadata_direct._PARTY_CACHE._data.clear()
         dadata_direct._BRANCHES_CACHE._data.clear()
+        dadata_direct._CIRCUIT.reset()
 
     async def test_fetch_company_returns_none_on_non_200(self):
         session = _FakeSession(response=_FakeResponse(status=403, text_data="forbidden"))
@@ -80,11 +88,11 @@ class DadataDirectErrorHandlingTests(unittest.IsolatedAsyncioTestCase):
             result = await dadata_direct.fetch_company("7707083893")
         self.assertIsNone(result)
 
-    async def test_fetch_company_returns_none_on_exception(self):
+    async def test_fetch_company_raises_unavailable_on_exception(self):
         session = _FakeSession(should_raise=True)
         with patch("dadata_direct.get_session", return_value=session):
-            result = await dadata_direct.fetch_company("7707083893")
-        self.assertIsNone(result)
+            with self.assertRaises(dadata_direct.DadataUnavailableError):
+                await dadata_direct.fetch_company("7707083893")
 
 
     async def test_fetch_company_returns_none_when_dadata_key_missing(self):
@@ -97,7 +105,7 @@ class DadataDirectErrorHandlingTests(unittest.IsolatedAsyncioTestCase):
         session = _FakeSession(response=_FakeResponse(status=200, json_data=payload))
         with patch("dadata_direct.get_session", return_value=session):
             result = await dadata_direct.fetch_company("7707083893")
-        self.assertEqual(result, {"value": "first"})
+        self.assertEqual(result.raw, {"value": "first"})
 
 
 class DadataMcpErrorHandlingTests(unittest.IsolatedAsyncioTestCase):
@@ -117,7 +125,7 @@ class DadataMcpErrorHandlingTests(unittest.IsolatedAsyncioTestCase):
 
     async def test_fetch_company_via_mcp_extracts_text(self):
         response = _FakeOpenAIResponse(
-            output=[_FakeOutputItem([_FakeContent("Часть 1 "), _FakeContent("Часть 2")])]
+            output=[_FakeOutputItem([_FakeOutputContent("Часть 1 "), _FakeOutputContent("Часть 2")])]
         )
         fake_client = _FakeOpenAIClient(response=response)
         with patch("dadata_mcp.OpenAI", return_value=fake_client):
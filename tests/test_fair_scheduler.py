@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+
+from fair_scheduler import BULK, INTERACTIVE, FairScheduler
+
+
+class FairSchedulerTests(unittest.IsolatedAsyncioTestCase):
+    async def _run(self, scheduler, jobs):
+        """Запускает jobs=[(client, priority, name)] пока слот занят и возвращает порядок обслуживания."""
+        order = []
+        gate = asyncio.Event()
+
+        async def job(client_id, priority, name):
+            async with scheduler.slot(client_id, priority):
+                order.append(name)
+                await gate.wait()
+
+        async def blocker():
+            async with scheduler.slot("blocker", INTERACTIVE):
+                await gate.wait()
+
+        blocking = asyncio.create_task(blocker())
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(job(*spec)) for spec in jobs]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocking, *tasks)
+        return order
+
+    async def test_round_robin_between_clients(self):
+        scheduler = FairScheduler(concurrency=1)
+        jobs = [("bulk-chat", BULK, f"a{i}") for i in range(3)] + [("other-chat", BULK, "b0")]
+        order = await self._run(scheduler, jobs)
+        self.assertEqual(order, ["a0", "b0", "a1", "a2"])
+
+    async def test_interactive_served_before_bulk(self):
+        scheduler = FairScheduler(concurrency=1)
+        jobs = [("bulk-chat", BULK, f"a{i}") for i in range(3)] + [("manager", INTERACTIVE, "single")]
+        order = await self._run(scheduler, jobs)
+        self.assertEqual(order[0], "single")
+        self.assertEqual(scheduler.snapshot()["max_queue_depth"], 4)
+
+    async def test_cancelled_waiter_releases_its_place(self):
+        scheduler = FairScheduler(concurrency=1)
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a"):
+                await gate.wait()
+
+        async def wait_slot():
+            async with scheduler.slot("b"):
+                pass
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(wait_slot())
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.snapshot()["queued_interactive"], 1)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(scheduler.queued(), 0)
+
+        gate.set()
+        await holder
+        self.assertEqual(scheduler.snapshot()["active"], 0)
+
+    async def test_waiter_gives_up_after_timeout(self):
+        scheduler = FairScheduler(concurrency=1)
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a"):
+                await gate.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with self.assertRaises(asyncio.TimeoutError):
+            async with scheduler.slot("b", timeout=0.01):
+                self.fail("слот не должен быть выдан")
+        self.assertEqual(scheduler.queued(), 0)
+
+        gate.set()
+        await holder
+        self.assertEqual(scheduler.snapshot()["active"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
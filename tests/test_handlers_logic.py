@@ -1,18 +1,22 @@
 import os
 import unittest
+from types import SimpleNamespace
 
 os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
 os.environ.setdefault("DADATA_API_KEY", "test-dadata-api-key")
 
 
 from keyboards import CB_PAGE_DOCUMENTS, CB_PAGE_FOUNDERS, CB_PAGE_MANAGEMENT, CB_PAGE_TAXES
+import deadline
 from handlers import (
     HELP_TEXT,
+    DeadlineMiddleware,
     START_TEXT,
     _build_all_fields_block,
     _build_details_card,
     _build_result_totals,
     _format_page,
+    _is_name_query,
     _money,
     _split_for_telegram,
 )
@@ -29,6 +33,19 @@ class HandlerSummaryTests(unittest.TestCase):
         self.assertIn("не только цифры: 12AB", text)
         self.assertIn("неверная длина: 123", text)
 
+    def test_build_result_totals_separates_unavailable_from_throttled(self):
+        text = _build_result_totals(
+            found=0, not_found=0, invalid=[], throttled=["7707083893"], unavailable=["500100732259"]
+        )
+        self.assertIn("лимит запросов DaData, повторите позже): 7707083893", text)
+        self.assertIn("DaData недоступна, повторите позже): 500100732259", text)
+
+    def test_name_query_detection(self):
+        self.assertTrue(_is_name_query("Ромашка"))
+        self.assertFalse(_is_name_query("12"))
+        self.assertFalse(_is_name_query("ип"))
+        self.assertFalse(_is_name_query("123456"))
+
     def test_help_text_mentions_supported_commands(self):
         self.assertIn("/start", HELP_TEXT)
         self.assertIn("/help", HELP_TEXT)
@@ -132,5 +149,26 @@ class DadataAllFieldsDumpTests(unittest.TestCase):
         self.assertIn("… и ещё", text)
 
 
+class DeadlineMiddlewareTests(unittest.IsolatedAsyncioTestCase):
+    async def _remaining(self, middleware, data):
+        async def handler(event, data):
+            return deadline.remaining()
+
+        return await middleware(handler, object(), data)
+
+    async def test_default_deadline_applies_to_handler(self):
+        left = await self._remaining(DeadlineMiddleware(20), {})
+        self.assertAlmostEqual(left, 20, delta=1)
+        self.assertIsNone(deadline.remaining())
+
+    async def test_handler_flag_overrides_default(self):
+        data = {"handler": SimpleNamespace(flags={"deadline": 60})}
+        left = await self._remaining(DeadlineMiddleware(20), data)
+        self.assertAlmostEqual(left, 60, delta=1)
+
+    async def test_zero_means_no_deadline(self):
+        self.assertIsNone(await self._remaining(DeadlineMiddleware(0), {}))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("DADATA_API_KEY", "test-dadata-api-key")
+
+from aiohttp import web
+
+import http_client
+from http_client import PoolConfig
+
+
+class HttpPoolTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+
+        async def _slow(request):
+            await self.release.wait()
+            return web.json_response({"ok": True})
+
+        self.pings = 0
+
+        async def _root(request):
+            self.pings += 1
+            return web.Response(status=404)
+
+        app = web.Application()
+        app.router.add_post("/slow", _slow)
+        app.router.add_get("/", _root)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}/slow"
+        self.origin = f"http://127.0.0.1:{port}/"
+
+        pools = {
+            "dadata": PoolConfig(limit=1, total_timeout=5.0),
+            "default": PoolConfig(limit=3, limit_per_host=2, dns_ttl_seconds=0),
+        }
+        patcher = patch.object(http_client, "POOLS", pools)
+        patcher.start()
+        self.addAsyncCleanup(self.runner.cleanup)
+        self.addAsyncCleanup(http_client.close_session)
+        self.addCleanup(patcher.stop)
+
+    async def _post(self, pool):
+        async with http_client.get_session(pool).post(self.url, json={}) as resp:
+            return await resp.json()
+
+    async def test_pools_get_separate_sessions_with_own_settings(self):
+        dadata = http_client.get_session("dadata")
+        default = http_client.get_session("default")
+
+        self.assertIsNot(dadata, default)
+        self.assertIs(http_client.get_session("dadata"), dadata)
+        self.assertEqual(dadata.connector.limit, 1)
+        self.assertEqual(default.connector.limit, 3)
+        self.assertEqual(default.connector.limit_per_host, 2)
+        self.assertEqual(dadata.timeout.total, 5.0)
+
+    async def test_unknown_pool_uses_default_settings(self):
+        session = http_client.get_session("egrul-mirror")
+
+        self.assertEqual(session.connector.limit, 3)
+        self.assertIsNot(session, http_client.get_session("default"))
+
+    async def test_slow_upstream_does_not_block_other_pool(self):
+        blocked = [asyncio.create_task(self._post("default")) for _ in range(3)]
+        waiting = asyncio.create_task(self._post("dadata"))
+        queued = asyncio.create_task(self._post("dadata"))
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            stats = http_client.pool_stats()
+            if stats.get("dadata", {}).get("waiting") == 1 and stats["default"]["in_use"] == 2:
+                break
+
+        stats = http_client.pool_stats()
+        self.assertEqual(stats["dadata"]["in_use"], 1)
+        self.assertEqual(stats["dadata"]["waiting"], 1)
+        # limit_per_host=2: третий запрос к тому же хосту ждёт в своём пуле.
+        self.assertEqual(stats["default"]["in_use"], 2)
+        self.assertEqual(stats["default"]["waiting"], 1)
+
+        self.release.set()
+        await asyncio.gather(waiting, queued, *blocked)
+        stats = http_client.pool_stats()
+        self.assertEqual(stats["dadata"]["waiting"], 0)
+        self.assertEqual(stats["dadata"]["in_use"], 0)
+        self.assertEqual(stats["dadata"]["queued_total"], 1)
+
+    async def test_prewarm_opens_keepalive_connections(self):
+        warmed = await http_client.prewarm("default", self.origin, 2)
+
+        self.assertEqual(warmed, 2)
+        stats = http_client.pool_stats()["default"]
+        self.assertEqual(stats["created"], 2)
+        self.assertEqual(stats["idle"], 2)
+
+    async def test_prewarm_is_skipped_with_transport(self):
+        http_client.set_transport(object())
+        self.addCleanup(http_client.set_transport, None)
+
+        self.assertEqual(await http_client.prewarm("default", self.origin, 2), 0)
+
+    async def test_prewarm_tolerates_unreachable_host(self):
+        await self.runner.cleanup()
+
+        self.assertEqual(await http_client.prewarm("default", self.origin, 2), 0)
+
+    async def test_keep_warm_pings_only_idle_pool(self):
+        task = asyncio.create_task(http_client.keep_warm("default", self.origin, 1, 0.1))
+        self.addCleanup(task.cancel)
+        # Первый тик только запоминает счётчики, второй пингует простаивающий пул.
+        await asyncio.sleep(0.25)
+        self.assertEqual(self.pings, 1)
+
+        # Настоящий трафик между тиками — пинг не нужен.
+        self.release.set()
+        await self._post("default")
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.pings, 1)
+
+    async def test_close_session_closes_all_pools(self):
+        sessions = [http_client.get_session(name) for name in ("dadata", "default")]
+
+        await http_client.close_session()
+
+        self.assertTrue(all(session.closed for session in sessions))
+        self.assertEqual(http_client.pool_stats(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+import json_codec
+
+
+class JsonCodecTests(unittest.TestCase):
+    def test_loads_accepts_bytes_and_str(self):
+        payload = '{"suggestions": [{"value": "ООО Тест"}]}'
+        expected = {"suggestions": [{"value": "ООО Тест"}]}
+        self.assertEqual(json_codec.loads(payload), expected)
+        self.assertEqual(json_codec.loads(payload.encode("utf-8")), expected)
+
+    def test_dumps_returns_unescaped_str(self):
+        dumped = json_codec.dumps({"value": "ООО Тест", "branches": (1, 2)})
+        self.assertIsInstance(dumped, str)
+        self.assertIn("ООО Тест", dumped)
+        self.assertEqual(json_codec.loads(dumped), {"value": "ООО Тест", "branches": [1, 2]})
+
+    def test_invalid_json_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            json_codec.loads(b"<html>502 Bad Gateway</html>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from key_pool import ApiKey, KeyPool
+from quota import key_fingerprint
+from rate_limit import AdaptiveRateLimiter
+
+
+class _FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class KeyPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock(100.0)
+
+    def _pool(self, *tokens):
+        keys = [ApiKey(token, AdaptiveRateLimiter(10, 10, clock=self.clock)) for token in tokens]
+        return KeyPool(keys, sideline_seconds=60, clock=self.clock)
+
+    def test_from_tokens_skips_empty_and_duplicate_keys(self):
+        pool = KeyPool.from_tokens(["a", "", "b", "a"], rate=5)
+        self.assertEqual([key.token for key in pool.keys], ["a", "b"])
+        self.assertEqual(pool.keys[0].key_id, key_fingerprint("a"))
+
+    def test_equal_keys_are_picked_round_robin(self):
+        pool = self._pool("a", "b", "c")
+        self.assertEqual([pool.pick().token for _ in range(4)], ["a", "b", "c", "a"])
+
+    def test_prefers_key_with_fewer_requests_in_flight(self):
+        pool = self._pool("a", "b")
+        with pool.use(pool.keys[0]):
+            self.assertEqual([pool.pick().token for _ in range(2)], ["b", "b"])
+        self.assertEqual(pool.keys[0].requests, 1)
+        self.assertEqual(pool.keys[0].in_flight, 0)
+
+    def test_throttled_key_goes_last(self):
+        pool = self._pool("a", "b")
+        pool.on_throttled(pool.keys[0], 30)
+        self.assertEqual([pool.pick().token for _ in range(2)], ["b", "b"])
+        self.assertEqual(pool.snapshot()[0]["throttled"], 1)
+
+    def test_accept_filters_keys(self):
+        pool = self._pool("a", "b")
+        self.assertEqual(pool.pick(lambda key: key.token == "b").token, "b")
+        self.assertIsNone(pool.pick(lambda key: False))
+
+    def test_sidelined_key_returns_after_timeout(self):
+        pool = self._pool("a", "b")
+        self.assertTrue(pool.sideline(pool.keys[0], "HTTP 401"))
+        self.assertEqual([key.token for key in pool.available()], ["b"])
+        self.assertEqual(pool.snapshot()[0]["sideline_reason"], "HTTP 401")
+        self.clock.now += 61
+        self.assertEqual(len(pool.available()), 2)
+        self.assertEqual(pool.snapshot()[0]["sideline_reason"], "")
+
+    def test_last_available_key_is_not_sidelined(self):
+        pool = self._pool("a", "b")
+        pool.sideline(pool.keys[0], "HTTP 403")
+        self.assertFalse(pool.sideline(pool.keys[1], "HTTP 403"))
+        self.assertEqual(pool.pick().token, "b")
+        self.assertEqual(pool.keys[1].rejected, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
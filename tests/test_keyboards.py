@@ -15,10 +15,14 @@ from keyboards import (
     CB_PAGE_MANAGEMENT,
     CB_PAGE_CONTRACTS,
     CB_PAGE_AUTHORITIES,
+    CB_PAGE_BRANCHES,
     CB_PAGE_TAXES,
     BTN_CHECK_INN,
+    CB_ACT_NEW_INN,
+    branches_pager_kb,
     inline_actions_kb,
     reply_main_menu_kb,
+    search_results_kb,
 )
 
 
@@ -70,6 +74,39 @@ class InlineKeyboardTests(unittest.TestCase):
         self.assertEqual(authorities_row[0].callback_data, CB_PAGE_AUTHORITIES)
         self.assertEqual(authorities_row[1].callback_data, CB_PAGE_CONTRACTS)
 
+    def test_branches_button_present(self):
+        kb = inline_actions_kb()
+        buttons = [button.callback_data for row in kb.inline_keyboard for button in row]
+        self.assertIn(CB_PAGE_BRANCHES, buttons)
+
+
+class BranchesPagerKeyboardTests(unittest.TestCase):
+    def test_first_page_has_only_next(self):
+        kb = branches_pager_kb(0, has_more=True)
+        self.assertEqual([b.callback_data for b in kb.inline_keyboard[0]], ["branches:1"])
+        self.assertEqual(kb.inline_keyboard[-1][0].callback_data, CB_NAV_BACK)
+
+    def test_middle_page_has_prev_and_next(self):
+        kb = branches_pager_kb(2, has_more=True)
+        self.assertEqual([b.callback_data for b in kb.inline_keyboard[0]], ["branches:1", "branches:3"])
+
+    def test_single_page_has_only_navigation(self):
+        kb = branches_pager_kb(0, has_more=False)
+        self.assertEqual(len(kb.inline_keyboard), 1)
+
+
+class SearchResultsKeyboardTests(unittest.TestCase):
+    def test_result_buttons_use_global_indexes(self):
+        kb = search_results_kb(["6. ООО А", "7. ООО Б"], start=5, page=1, has_more=False)
+        self.assertEqual(kb.inline_keyboard[0][0].callback_data, "search:open:5")
+        self.assertEqual(kb.inline_keyboard[1][0].callback_data, "search:open:6")
+        self.assertEqual([b.callback_data for b in kb.inline_keyboard[2]], ["search:page:0"])
+        self.assertEqual(kb.inline_keyboard[-1][0].callback_data, CB_ACT_NEW_INN)
+
+    def test_single_page_has_no_pager(self):
+        kb = search_results_kb(["1. ООО А"], start=0, page=0, has_more=False)
+        self.assertEqual(len(kb.inline_keyboard), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from quota import QUOTA_HARD, QUOTA_OK, QUOTA_SOFT, QuotaLedger, key_fingerprint
+
+
+class _FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+# 2024-01-01 12:00 по Москве.
+_NOON_MSK = 1704099600.0
+
+
+class QuotaLedgerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _FakeClock(_NOON_MSK)
+
+    def test_counts_per_key_and_in_total(self):
+        ledger = QuotaLedger(clock=self.clock)
+        ledger.record("a")
+        ledger.record("a")
+        ledger.record("b")
+        self.assertEqual(ledger.used("a"), 2)
+        self.assertEqual(ledger.used(), 3)
+        self.assertEqual(ledger.snapshot()["by_key"], {"a": 2, "b": 1})
+
+    def test_soft_and_hard_thresholds(self):
+        ledger = QuotaLedger(daily_budget=10, soft_ratio=0.8, clock=self.clock)
+        ledger.record("a", 7)
+        self.assertEqual(ledger.state(), QUOTA_OK)
+        ledger.record("a")
+        self.assertEqual(ledger.state(), QUOTA_SOFT)
+        ledger.record("a", 2)
+        self.assertEqual(ledger.state(), QUOTA_HARD)
+        self.assertEqual(ledger.snapshot()["remaining"], 0)
+
+    def test_budget_applies_per_key(self):
+        ledger = QuotaLedger(daily_budget=4, soft_ratio=0.5, clock=self.clock)
+        ledger.record("a", 4)
+        ledger.record("b", 2)
+        self.assertEqual(ledger.state("a"), QUOTA_HARD)
+        self.assertEqual(ledger.state("b"), QUOTA_SOFT)
+        self.assertEqual(ledger.state("c"), QUOTA_OK)
+        self.assertEqual(ledger.snapshot()["by_key_state"], {"a": QUOTA_HARD, "b": QUOTA_SOFT})
+
+    def test_pool_state_follows_freest_key(self):
+        ledger = QuotaLedger(daily_budget=4, soft_ratio=0.5, key_ids=["a", "b"], clock=self.clock)
+        ledger.record("a", 4)
+        ledger.record("b", 1)
+        self.assertEqual(ledger.state(), QUOTA_OK)
+        self.assertEqual(ledger.snapshot()["remaining"], 3)
+        ledger.record("b", 1)
+        self.assertEqual(ledger.snapshot()["state"], QUOTA_SOFT)
+        ledger.record("b", 2)
+        self.assertEqual(ledger.state(), QUOTA_HARD)
+        self.assertEqual(ledger.pool_state(["a", "b", "c"]), QUOTA_OK)
+
+    def test_zero_budget_is_unlimited(self):
+        ledger = QuotaLedger(clock=self.clock)
+        ledger.record("a", 10**6)
+        self.assertEqual(ledger.state(), QUOTA_OK)
+
+    def test_counters_reset_at_moscow_midnight(self):
+        ledger = QuotaLedger(daily_budget=1, clock=self.clock)
+        ledger.record("a")
+        self.assertEqual(ledger.state(), QUOTA_HARD)
+        self.clock.now += 11 * 3600  # 23:00 МСК — те же сутки
+        self.assertEqual(ledger.used(), 1)
+        self.clock.now += 3600  # 00:00 МСК
+        self.assertEqual(ledger.used(), 0)
+        self.assertEqual(ledger.state(), QUOTA_OK)
+
+    def test_counters_survive_restart(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "quota.sqlite3")
+
+        ledger = QuotaLedger(path, clock=self.clock)
+        ledger.record("a", 3)
+        ledger.close()
+
+        restarted = QuotaLedger(path, clock=self.clock)
+        self.addCleanup(restarted.close)
+        restarted.record("a")
+        self.assertEqual(restarted.used("a"), 4)
+
+    def test_writes_under_event_loop_are_batched_in_background(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "quota.sqlite3")
+        ledger = QuotaLedger(path, clock=self.clock)
+
+        async def record_many():
+            for _ in range(50):
+                ledger.record("a")
+            ledger.record("b", 2)
+
+        asyncio.run(record_many())
+        self.assertEqual(ledger.used(), 52)
+        ledger.flush()
+        ledger.close()
+
+        restarted = QuotaLedger(path, clock=self.clock)
+        self.addCleanup(restarted.close)
+        self.assertEqual(restarted.snapshot()["by_key"], {"a": 50, "b": 2})
+
+    def test_fingerprint_hides_key(self):
+        fingerprint = key_fingerprint("secret-api-key")
+        self.assertEqual(len(fingerprint), 8)
+        self.assertNotIn("secret", fingerprint)
+
+
+if __name__ == "__main__":
+    unittest.main()
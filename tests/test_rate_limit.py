@@ -0,0 +1,75 @@
+import unittest
+from datetime import datetime, timezone
+
+from rate_limit import AdaptiveRateLimiter, parse_retry_after
+
+
+class _FakeTime:
+    def __init__(self, now=100.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ParseRetryAfterTests(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("7"), 7.0)
+
+    def test_http_date(self):
+        now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+        self.assertEqual(parse_retry_after("Mon, 01 Jan 2024 12:00:05 GMT", now=now), 5.0)
+
+    def test_garbage_and_empty(self):
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class AdaptiveRateLimiterTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.time = _FakeTime()
+
+    def _limiter(self, rate=10, burst=2):
+        return AdaptiveRateLimiter(rate, burst, min_rate=1, clock=self.time, sleep=self.time.sleep)
+
+    async def test_burst_then_steady_rate(self):
+        limiter = self._limiter(rate=10, burst=2)
+        for _ in range(4):
+            self.assertTrue(await limiter.acquire())
+        # Первые два запроса — из запаса, дальше по одному раз в 0.1 с.
+        self.assertEqual(len(self.time.sleeps), 2)
+        self.assertAlmostEqual(self.time.now, 100.2)
+
+    async def test_delay_reports_wait_without_reserving(self):
+        limiter = self._limiter(rate=10, burst=1)
+        self.assertEqual(limiter.delay(), 0.0)
+        await limiter.acquire()
+        self.assertAlmostEqual(limiter.delay(), 0.1)
+        self.assertAlmostEqual(limiter.delay(), 0.1)
+        limiter.on_throttled(retry_after=3)
+        self.assertAlmostEqual(limiter.delay(), 3.0)
+
+    async def test_throttled_halves_rate_and_pauses_for_retry_after(self):
+        limiter = self._limiter(rate=10, burst=5)
+        limiter.on_throttled(retry_after=3)
+        self.assertEqual(limiter.rate, 5)
+        self.assertFalse(await limiter.acquire(max_wait=1))
+        self.assertTrue(await limiter.acquire())
+        self.assertAlmostEqual(self.time.now, 103.0)
+
+    async def test_success_increases_rate_up_to_max(self):
+        limiter = self._limiter(rate=2, burst=1)
+        limiter.on_throttled(retry_after=0)
+        self.assertEqual(limiter.rate, 1)
+        for _ in range(20):
+            limiter.on_success()
+        self.assertEqual(limiter.rate, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
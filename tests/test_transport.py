@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("DADATA_API_KEY", "test-dadata-api-key")
+
+import aiohttp
+
+import dadata_direct
+import http_client
+from config import DADATA_FIND_URL
+from transport import Cassette, CassetteMissError, RecordingSession, ReplaySession
+
+_URL = "https://example.test/findById/party"
+
+
+def _interaction(query, status=200, body=None, elapsed=0.0, **extra):
+    item = {
+        "method": "POST",
+        "url": _URL,
+        "json": {"query": query, "count": 1},
+        "status": status,
+        "headers": {},
+        "body": json.dumps(body if body is not None else {"suggestions": []}),
+        "elapsed": elapsed,
+    }
+    item.update(extra)
+    return item
+
+
+class _FakeSleep:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, seconds):
+        self.calls.append(seconds)
+
+
+class _InnerResponse:
+    def __init__(self, status, body, headers):
+        self.status = status
+        self.headers = headers
+        self._body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return None
+
+    async def read(self):
+        return self._body
+
+
+class _InnerSession:
+    closed = False
+
+    def __init__(self, *responses):
+        self._responses = list(responses)
+        self.kwargs = []
+
+    def post(self, url, **kwargs):
+        self.kwargs.append(kwargs)
+        response = self._responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def close(self):
+        self.closed = True
+
+
+class ReplaySessionTests(unittest.IsolatedAsyncioTestCase):
+    async def test_same_request_gets_recorded_responses_in_order(self):
+        cassette = Cassette([_interaction("1", status=503), _interaction("1", body={"suggestions": [1]})])
+        session = ReplaySession(cassette)
+
+        statuses = []
+        for _ in range(3):
+            async with session.post(_URL, json={"count": 1, "query": "1"}) as resp:
+                statuses.append(resp.status)
+
+        self.assertEqual(statuses, [503, 200, 200])
+        self.assertEqual(session.calls, 3)
+
+    async def test_unknown_request_raises(self):
+        session = ReplaySession(Cassette([_interaction("1")]))
+        with self.assertRaises(CassetteMissError):
+            async with session.post(_URL, json={"query": "2", "count": 1}):
+                pass
+
+    async def test_latency_is_recorded_scaled_or_fixed(self):
+        sleep = _FakeSleep()
+        cassette = Cassette([_interaction("1", elapsed=0.2)])
+        async with ReplaySession(cassette, latency_scale=0.5, sleep=sleep).post(_URL, json={"query": "1", "count": 1}):
+            pass
+        async with ReplaySession(cassette, latency=1.5, sleep=sleep).post(_URL, json={"query": "1", "count": 1}):
+            pass
+        self.assertEqual(sleep.calls, [0.1, 1.5])
+
+    async def test_error_injection_is_deterministic(self):
+        async def run(seed):
+            session = ReplaySession(Cassette([_interaction("1")]), error_rate=0.3, seed=seed)
+            statuses = []
+            for _ in range(50):
+                async with session.post(_URL, json={"query": "1", "count": 1}) as resp:
+                    statuses.append(resp.status)
+            return statuses
+
+        first = await run(7)
+        self.assertEqual(first, await run(7))
+        self.assertIn(503, first)
+        self.assertIn(200, first)
+
+    async def test_injected_exception(self):
+        session = ReplaySession(Cassette([_interaction("1")]), error_rate=1.0, error=asyncio.TimeoutError)
+        with self.assertRaises(asyncio.TimeoutError):
+            async with session.post(_URL, json={"query": "1", "count": 1}):
+                pass
+        self.assertEqual(session.injected_errors, 1)
+
+    async def test_recorded_network_error_is_replayed(self):
+        session = ReplaySession(Cassette([_interaction("1", error="ServerDisconnectedError")]))
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            async with session.post(_URL, json={"query": "1", "count": 1}):
+                pass
+
+
+class RecordingSessionTests(unittest.IsolatedAsyncioTestCase):
+    async def test_records_exchange_without_request_headers(self):
+        inner = _InnerSession(_InnerResponse(429, b"slow down", {"Retry-After": "5", "X-Trace": "abc"}))
+        cassette = Cassette()
+        session = RecordingSession(inner, cassette)
+
+        async with session.post(_URL, json={"query": "1"}, headers={"Authorization": "Token secret"}) as resp:
+            self.assertEqual(resp.status, 429)
+            self.assertEqual(await resp.content.read(4), b"slow")
+
+        (item,) = cassette.interactions
+        self.assertEqual(inner.kwargs[0]["headers"], {"Authorization": "Token secret"})
+        self.assertEqual((item["status"], item["body"], item["headers"]), (429, "slow down", {"Retry-After": "5"}))
+        self.assertNotIn("secret", json.dumps(cassette.interactions))
+
+    async def test_records_network_errors(self):
+        cassette = Cassette()
+        session = RecordingSession(_InnerSession(asyncio.TimeoutError()), cassette)
+        with self.assertRaises(asyncio.TimeoutError):
+            async with session.post(_URL, json={"query": "1"}):
+                pass
+        self.assertEqual(cassette.interactions[0]["error"], "TimeoutError")
+
+    async def test_cassette_round_trip(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "cassette.json")
+        inner = _InnerSession(_InnerResponse(200, '{"suggestions": [{"value": "ООО"}]}'.encode("utf-8"), {}))
+        session = RecordingSession(inner, Cassette(path=path))
+        async with session.post(_URL, json={"query": "1", "count": 1}):
+            pass
+        await session.close()
+
+        replay = ReplaySession(Cassette.load(path))
+        async with replay.post(_URL, json={"query": "1", "count": 1}) as resp:
+            self.assertEqual(await resp.json(), {"suggestions": [{"value": "ООО"}]})
+        self.assertTrue(inner.closed)
+
+
+class DadataReplayTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dadata_direct._CIRCUIT.reset()
+        dadata_direct._PARTY_CACHE.clear()
+        self.addCleanup(http_client.set_transport, None)
+
+    async def test_client_runs_against_replayed_cassette(self):
+        cassette = Cassette(
+            [
+                {
+                    "method": "POST",
+                    "url": DADATA_FIND_URL,
+                    "json": {"query": "7707083893", "count": 1, "branch_type": "MAIN"},
+                    "status": 200,
+                    "body": json.dumps({"suggestions": [{"value": "ПАО СБЕРБАНК"}]}),
+                }
+            ]
+        )
+        session = ReplaySession(cassette)
+        http_client.set_transport(session)
+
+        results = await asyncio.gather(*(dadata_direct.fetch_company("7707083893") for _ in range(5)))
+
+        self.assertEqual({company.value for company in results}, {"ПАО СБЕРБАНК"})
+        self.assertEqual(session.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("DADATA_API_KEY", "test-dadata-api-key")
+
+import warmup
+from dadata_direct import THROTTLED
+from fair_scheduler import BULK
+
+
+class HotIdsFileTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "hot_inns.txt")
+        warmup._ACCESS_COUNTS.clear()
+        self.addCleanup(warmup._ACCESS_COUNTS.clear)
+
+    def test_missing_file_gives_empty_list(self):
+        self.assertEqual(warmup.load_hot_ids(self.path, 10), [])
+
+    def test_load_orders_by_count_and_skips_invalid_lines(self):
+        with open(self.path, "w", encoding="utf-8") as fh:
+            fh.write("7707083893 5\nnot-an-inn 100\n\n1027700132195 9\n500100732259\n")
+
+        self.assertEqual(
+            warmup.load_hot_ids(self.path, 10),
+            ["1027700132195", "7707083893", "500100732259"],
+        )
+        self.assertEqual(warmup.load_hot_ids(self.path, 1), ["1027700132195"])
+
+    def test_save_merges_with_decayed_file_counts(self):
+        with open(self.path, "w", encoding="utf-8") as fh:
+            fh.write("7707083893 10\n1027700132195 1\n")
+        warmup.record_access(["500100732259"] * 6)
+
+        saved_at = os.path.getmtime(self.path)
+
+        warmup.save_hot_ids(self.path, 2, half_life=3600, now=saved_at + 3600)
+
+        with open(self.path, encoding="utf-8") as fh:
+            self.assertEqual(fh.read(), "500100732259 6\n7707083893 5\n")
+        self.assertFalse(warmup._ACCESS_COUNTS)
+
+    def test_frequent_saves_do_not_decay_counts(self):
+        with open(self.path, "w", encoding="utf-8") as fh:
+            fh.write("7707083893 10\n")
+        saved_at = os.path.getmtime(self.path)
+
+        for _ in range(5):
+            warmup.record_access(["500100732259"])
+            warmup.save_hot_ids(self.path, 10, half_life=86400, now=saved_at)
+
+        self.assertEqual(warmup._read_counts(self.path), {"7707083893": 10.0, "500100732259": 5.0})
+
+
+class WarmUpTests(unittest.IsolatedAsyncioTestCase):
+    async def test_warm_up_fetches_ids_with_bulk_priority(self):
+        calls = []
+
+        async def fake_fetch_many(ids, **kwargs):
+            calls.append((ids, kwargs))
+            return [object(), None, THROTTLED]
+
+        with patch("warmup.fetch_companies_many", side_effect=fake_fetch_many):
+            await warmup.warm_up(["1", "2", "3"], concurrency=2)
+
+        self.assertEqual(
+            calls,
+            [(["1", "2", "3"], {"concurrency": 2, "client_id": warmup.WARMUP_CLIENT_ID, "priority": BULK})],
+        )
+
+    async def test_warm_up_with_empty_list_does_nothing(self):
+        with patch("warmup.fetch_companies_many") as fetch_many:
+            await warmup.warm_up([], concurrency=2)
+        fetch_many.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
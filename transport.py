@@ -0,0 +1,241 @@
+"""Запись и воспроизведение HTTP-обменов с DaData («кассеты»).
+
+Подменяет сессию, которую отдаёт ``http_client.get_session()``, поэтому клиент
+DaData работает без изменений:
+
+- ``RecordingSession`` проксирует запросы в настоящую ``aiohttp``-сессию и
+  записывает каждый обмен в ``Cassette``: запрос (URL, JSON-тело), ответ (статус,
+  ``Retry-After``, тело), время ответа и момент запроса от начала записи.
+  Сетевые ошибки тоже записываются. Заголовки запроса (в том числе ключ DaData)
+  в кассету не попадают.
+- ``ReplaySession`` отвечает из кассеты без сети. Одинаковые запросы получают
+  записанные ответы по порядку, последний повторяется. Задержку можно взять из
+  записи (с множителем) или задать фиксированной, а ошибки — подмешивать с
+  заданной долей и seed, чтобы прогоны были воспроизводимыми.
+
+Кассета — JSON-файл, его удобно читать глазами и класть в тесты/бенчмарки.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import aiohttp
+
+import json_codec
+
+CASSETTE_VERSION = 1
+# Из заголовков ответа клиенту DaData нужен только Retry-After.
+_RECORDED_HEADERS = ("Retry-After", "Content-Type")
+
+
+class CassetteMissError(LookupError):
+    """В кассете нет ответа на такой запрос."""
+
+
+def _match_key(method: str, url: str, payload: Any) -> str:
+    # Порядок ключей в JSON-теле не важен — сравниваем канонический вид.
+    return f"{method.upper()} {url} {json.dumps(payload, sort_keys=True, ensure_ascii=False)}"
+
+
+class Cassette:
+    def __init__(self, interactions: Optional[list[dict]] = None, path: str = "") -> None:
+        self.interactions: list[dict] = list(interactions or [])
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        return cls(data.get("interactions", []), path)
+
+    def save(self, path: str = "") -> None:
+        path = path or self.path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"version": CASSETTE_VERSION, "interactions": self.interactions}, fh, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def append(self, interaction: dict) -> None:
+        self.interactions.append(interaction)
+
+    def by_request(self) -> dict[str, list[dict]]:
+        """Записанные ответы, сгруппированные по запросу, в порядке записи."""
+        grouped: dict[str, list[dict]] = {}
+        for item in self.interactions:
+            grouped.setdefault(_match_key(item["method"], item["url"], item.get("json")), []).append(item)
+        return grouped
+
+
+class _Content:
+    def __init__(self, body: bytes) -> None:
+        self._body = body
+
+    async def read(self, n: int = -1) -> bytes:
+        return self._body if n < 0 else self._body[:n]
+
+
+class CassetteResponse:
+    """Ответ из кассеты с тем же интерфейсом, что использует клиент DaData у ``aiohttp``."""
+
+    def __init__(self, status: int, headers: Optional[dict] = None, body: bytes = b"") -> None:
+        self.status = status
+        self.headers = dict(headers or {})
+        self.content = _Content(body)
+        self._body = body
+
+    async def __aenter__(self) -> "CassetteResponse":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self) -> str:
+        return self._body.decode("utf-8", "replace")
+
+    async def json(self) -> Any:
+        return json_codec.loads(self._body)
+
+
+class _Request:
+    """``session.post(...)``: как у ``aiohttp``, запрос выполняется при входе в ``async with``."""
+
+    def __init__(self, perform: Callable[[], Awaitable[CassetteResponse]]) -> None:
+        self._perform = perform
+
+    async def __aenter__(self) -> CassetteResponse:
+        return await self._perform()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+def _raise_recorded_error(name: str) -> None:
+    if name in ("TimeoutError", "ServerTimeoutError"):
+        raise asyncio.TimeoutError()
+    raise aiohttp.ClientConnectionError(name)
+
+
+class RecordingSession:
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        cassette: Cassette,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.session = session
+        self.cassette = cassette
+        self._clock = clock
+        self._started = clock()
+
+    @property
+    def closed(self) -> bool:
+        return self.session.closed
+
+    def post(self, url: str, *, json: Any = None, **kwargs: Any) -> _Request:
+        async def _perform() -> CassetteResponse:
+            started = self._clock()
+            interaction: dict[str, Any] = {
+                "method": "POST",
+                "url": url,
+                "json": json,
+                "at": round(started - self._started, 4),
+            }
+            try:
+                async with self.session.post(url, json=json, **kwargs) as resp:
+                    body = await resp.read()
+                    headers = {name: resp.headers[name] for name in _RECORDED_HEADERS if name in resp.headers}
+                    status = resp.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                interaction.update(error=type(exc).__name__, elapsed=round(self._clock() - started, 4))
+                self.cassette.append(interaction)
+                raise
+            interaction.update(
+                status=status,
+                headers=headers,
+                body=body.decode("utf-8", "replace"),
+                elapsed=round(self._clock() - started, 4),
+            )
+            self.cassette.append(interaction)
+            return CassetteResponse(status, headers, body)
+
+        return _Request(_perform)
+
+    async def close(self) -> None:
+        if self.cassette.path:
+            self.cassette.save()
+        await self.session.close()
+
+
+class ReplaySession:
+    """Воспроизведение кассеты.
+
+    ``latency`` — фиксированная задержка ответа; без неё берётся записанная,
+    умноженная на ``latency_scale`` (``0`` — мгновенно). С вероятностью
+    ``error_rate`` вместо записанного ответа отдаётся ``error``: HTTP-статус
+    (``int``) или класс исключения (например, ``asyncio.TimeoutError``).
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        *,
+        latency: Optional[float] = None,
+        latency_scale: float = 1.0,
+        error_rate: float = 0.0,
+        error: int | type[BaseException] = 503,
+        seed: Optional[int] = None,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self.cassette = cassette
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.error = error
+        self._random = random.Random(seed)
+        self._sleep = sleep
+        self._responses = cassette.by_request()
+        self._served: dict[str, int] = {}
+        self.calls = 0
+        self.injected_errors = 0
+        self.closed = False
+
+    def post(self, url: str, *, json: Any = None, **kwargs: Any) -> _Request:
+        return _Request(lambda: self._replay("POST", url, json))
+
+    async def _replay(self, method: str, url: str, payload: Any) -> CassetteResponse:
+        self.calls += 1
+        key = _match_key(method, url, payload)
+        recorded = self._responses.get(key)
+        if not recorded:
+            raise CassetteMissError(f"нет записи для {key[:200]}")
+        index = self._served.get(key, 0)
+        self._served[key] = index + 1
+        interaction = recorded[min(index, len(recorded) - 1)]
+
+        delay = self.latency if self.latency is not None else interaction.get("elapsed", 0.0) * self.latency_scale
+        if delay > 0:
+            await self._sleep(delay)
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.injected_errors += 1
+            if isinstance(self.error, int):
+                return CassetteResponse(self.error, {}, b"injected error")
+            raise self.error()
+        if "error" in interaction:
+            _raise_recorded_error(interaction["error"])
+        return CassetteResponse(
+            interaction["status"], interaction.get("headers"), interaction.get("body", "").encode("utf-8")
+        )
+
+    async def close(self) -> None:
+        self.closed = True
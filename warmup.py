@@ -0,0 +1,127 @@
+"""Прогрев кэша карточек после рестарта по списку «горячих» ИНН/ОГРН.
+
+После рестарта кэш в памяти пуст, и первая волна пользователей платит промахами.
+Бот считает, какие идентификаторы у него спрашивают (``record_access``), и
+периодически сохраняет самые частые в файл (``save_hot_ids``). При старте этот же
+файл читается (``load_hot_ids``) и карточки подтягиваются в кэш фоновой задачей
+(``warm_up``) — через общие лимиты DaData с пакетным приоритетом, поэтому прогрев
+не задерживает ``start_polling`` и не вытесняет запросы пользователей.
+
+Формат файла — по идентификатору на строку, через пробел/табуляцию можно указать
+число обращений: ``7707083893 42``. Файл можно подготовить и вручную. Сохранённые
+счётчики затухают по времени с момента прошлой записи файла (его mtime), поэтому
+частота сохранений на них не влияет.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter
+from typing import Iterable
+
+from config import DADATA_WARMUP_HALF_LIFE_HOURS
+from dadata_direct import THROTTLED, UNAVAILABLE, fetch_companies_many
+from fair_scheduler import BULK
+from validators import validate_company_id
+
+logger = logging.getLogger(__name__)
+
+# Под этим «клиентом» прогрев делит слоты планировщика с чатами.
+WARMUP_CLIENT_ID = "warmup"
+
+_ACCESS_COUNTS: Counter[str] = Counter()
+
+
+def record_access(ids: Iterable[str]) -> None:
+    """Учесть запрошенные пользователем идентификаторы."""
+    _ACCESS_COUNTS.update(ids)
+
+
+def load_hot_ids(path: str, limit: int) -> list[str]:
+    """До ``limit`` самых частых корректных идентификаторов из файла (нет файла — пусто)."""
+    return [value for value, _count in _read_counts(path).most_common(limit)]
+
+
+def save_hot_ids(
+    path: str,
+    limit: int,
+    *,
+    half_life: float = DADATA_WARMUP_HALF_LIFE_HOURS * 3600,
+    now: float | None = None,
+) -> None:
+    """Слить накопленные обращения с файлом и сохранить топ-``limit``.
+
+    Старые счётчики затухают вдвое за каждые ``half_life`` секунд с прошлой записи
+    файла, чтобы список следовал за текущим спросом, а не копил исторических лидеров.
+    """
+    if not _ACCESS_COUNTS:
+        return
+    if now is None:
+        now = time.time()
+    try:
+        elapsed = max(0.0, now - os.path.getmtime(path))
+    except OSError:
+        elapsed = 0.0
+    decay = 0.5 ** (elapsed / half_life)
+    merged: Counter[str] = Counter({value: count * decay for value, count in _read_counts(path).items()})
+    merged.update(_ACCESS_COUNTS)
+    top = [(value, round(count, 3)) for value, count in merged.most_common(limit)]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.writelines(f"{value} {count:g}\n" for value, count in top if count > 0)
+    os.replace(tmp_path, path)
+    _ACCESS_COUNTS.clear()
+
+
+def _read_counts(path: str) -> Counter[str]:
+    counts: Counter[str] = Counter()  # значения — float: затухшие счётчики дробные
+    try:
+        with open(path, encoding="utf-8") as fh:
+            lines = fh.readlines()
+    except FileNotFoundError:
+        return counts
+    for line in lines:
+        parts = line.split()
+        if not parts or not validate_company_id(parts[0])[0]:
+            continue
+        try:
+            count = float(parts[1]) if len(parts) > 1 else 1.0
+        except ValueError:
+            count = 1.0
+        if not math.isfinite(count) or count < 0:
+            count = 1.0
+        counts[parts[0]] += count
+    return counts
+
+
+async def warm_up(ids: list[str], *, concurrency: int) -> None:
+    """Подтянуть карточки в кэш; уже закэшированные идентификаторы DaData не стоят."""
+    if not ids:
+        return
+    results = await fetch_companies_many(
+        ids, concurrency=concurrency, client_id=WARMUP_CLIENT_ID, priority=BULK
+    )
+    found = sum(1 for result in results if result is not None and result not in (THROTTLED, UNAVAILABLE))
+    throttled = sum(1 for result in results if result is THROTTLED)
+    unavailable = sum(1 for result in results if result is UNAVAILABLE)
+    logger.info(
+        "Прогрев кэша: %s из %s карточек, упёрлись в лимит: %s, DaData недоступна: %s",
+        found,
+        len(ids),
+        throttled,
+        unavailable,
+    )
+
+
+async def persist_hot_ids(path: str, limit: int, interval: float) -> None:
+    """Периодически сохранять топ идентификаторов (файл переживает аварийный рестарт)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            save_hot_ids(path, limit)
+        except OSError as exc:
+            logger.warning("Не удалось сохранить список горячих ИНН в %s: %s", path, exc)